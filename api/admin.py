@@ -1,13 +1,217 @@
+from django.conf import settings
 from django.contrib import admin
-from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth import admin as auth_admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from .dedup import dedup_stats
+from .deletion import delete_objects
+from .jobs import process_in_batches, submit_job
 from .models import AccountTier, ExpiringLink, Image, Thumbnail, User
 
-fields = list(UserAdmin.fieldsets)
-fields[0] = (None, {"fields": ("username", "password", "accountTier")})
-UserAdmin.fieldsets = tuple(fields)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which counts at most ADMIN_COUNT_LIMIT objects. Bigger
+    unfiltered tables are estimated from PostgreSQL statistics (or the
+    highest id elsewhere), bigger filtered results are cut at the limit
+    and have to be narrowed down by search or filters.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        """Returns exact number of objects up to the limit, or estimate."""
+        queryset = self.object_list
+        limit = settings.ADMIN_COUNT_LIMIT
+        count = queryset[: limit + 1].count()
+        if count <= limit or queryset.query.where:
+            return count
+        return max(self.estimate(queryset), count)
+
+    @staticmethod
+    def estimate(queryset: object) -> int:
+        """Returns estimated number of rows of queryset's table."""
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            return int(row[0]) if row else 0
+        return queryset.aggregate(last=Max("pk"))["last"] or 0
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Admin of tables with millions of rows.
+
+    Counts are estimated, search matches case-sensitive prefixes of
+    search_fields (answered from the varchar_pattern_ops indexes Django
+    makes for unique fields on PostgreSQL) instead of scanning for
+    substrings, and owners are matched by username prefix first. Objects
+    are deleted in batches in the background instead of on a confirmation
+    page listing all of them.
+
+    Attributes:
+        search_owner_field(str): Path of the owner's foreign key searched
+                                 by username, e.g. "owner".
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_owner_field = None
+    actions = ["delete_in_background"]
+
+    def get_actions(self, request: object) -> dict:
+        """Removes delete action which loads all selected objects."""
+        actions = super(ScalableAdmin, self).get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def get_search_results(
+        self, request: object, queryset: object, search_term: str
+    ) -> tuple:
+        """Filters objects by prefixes of searched fields and owners."""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        condition = Q()
+        for field in self.search_fields:
+            condition |= Q(**{f"{field}__startswith": search_term})
+        if self.search_owner_field:
+            owners = list(
+                User.objects.filter(
+                    username__startswith=search_term
+                ).values_list("pk", flat=True)[
+                    : settings.ADMIN_SEARCH_MAX_OWNERS
+                ]
+            )
+            if owners:
+                condition |= Q(**{f"{self.search_owner_field}__in": owners})
+        return queryset.filter(condition), False
+
+    @admin.action(
+        description="Delete selected %(verbose_name_plural)s in background",
+        permissions=["delete"],
+    )
+    def delete_in_background(self, request: object, queryset: object):
+        """Deletes selected objects in batches in the background."""
+        submit_job(
+            process_in_batches,
+            queryset,
+            delete_objects,
+            settings.ADMIN_ACTION_BATCH_SIZE,
+        )
+        self.message_user(
+            request,
+            f"Selected {self.model._meta.verbose_name_plural} are being "
+            "deleted in the background.",
+        )
+
+
+class UserAdmin(ScalableAdmin, auth_admin.UserAdmin):
+    """User admin with account tier, searched by username prefix."""
+
+    fieldsets = (
+        (None, {"fields": ("username", "password", "accountTier")}),
+        *auth_admin.UserAdmin.fieldsets[1:],
+    )
+    list_display = ("username", "email", "accountTier", "is_staff")
+    list_filter = ("accountTier", "is_staff", "is_superuser", "is_active")
+    list_select_related = ("accountTier",)
+    search_fields = ("username",)
+
+
+class AccountTierAdmin(admin.ModelAdmin):
+    """AccountTier admin with permissions and load limits."""
+
+    list_display = (
+        "name",
+        "original_size",
+        "fetch_url",
+        "image_quality",
+        "requests_per_minute",
+        "concurrent_uploads",
+        "daily_upload_bytes",
+    )
+    fieldsets = (
+        (
+            None,
+            {
+                "fields": (
+                    "name",
+                    "thumbnail_sizes",
+                    "original_size",
+                    "fetch_url",
+                    "image_quality",
+                )
+            },
+        ),
+        (
+            "Limits",
+            {
+                "fields": (
+                    "requests_per_minute",
+                    "concurrent_uploads",
+                    "daily_upload_bytes",
+                )
+            },
+        ),
+    )
+
+
+class ImageAdmin(ScalableAdmin):
+    """Image admin with statistics of deduplicated uploads."""
+
+    list_display = ("name", "owner", "status", "size")
+    list_filter = ("status",)
+    list_select_related = ("owner",)
+    autocomplete_fields = ("owner",)
+    search_fields = ("name",)
+    search_owner_field = "owner"
+
+    def get_urls(self) -> list:
+        """Adds dedup_stats view to admin URLs."""
+        urls = [
+            path(
+                "dedup-stats/",
+                self.admin_site.admin_view(self.dedup_stats),
+                name="api_image_dedup_stats",
+            )
+        ]
+        return urls + super(ImageAdmin, self).get_urls()
+
+    def dedup_stats(self, request: object) -> TemplateResponse:
+        """Shows upload calls and bytes saved by reusing stored files."""
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Deduplication statistics",
+            "opts": self.model._meta,
+            "stats": dedup_stats(),
+        }
+        return TemplateResponse(
+            request, "admin/api/image/dedup_stats.html", context
+        )
+
+
+class ExpiringLinkAdmin(ScalableAdmin):
+    """ExpiringLink admin browsed by expiry date."""
+
+    list_display = ("id", "image", "created_time", "expires_at")
+    list_select_related = ("image",)
+    raw_id_fields = ("image",)
+    search_fields = ("image__name",)
+    search_owner_field = "image__owner"
+    date_hierarchy = "expires_at"
+
 
 admin.site.register(Thumbnail)
-admin.site.register(AccountTier)
-admin.site.register(ExpiringLink)
-admin.site.register(Image)
+admin.site.register(AccountTier, AccountTierAdmin)
+admin.site.register(ExpiringLink, ExpiringLinkAdmin)
+admin.site.register(Image, ImageAdmin)
 admin.site.register(User, UserAdmin)
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self) -> None:
+        """
+        Connects signal receivers, schedules periodic jobs, checks that
+        image list cache and throttling counters are shared by all
+        processes.
+        """
+        from django.core.signals import request_started
+
+        from . import signals  # noqa
+        from .jobs import start_scheduler
+        from .list_cache import get_list_cache
+        from .throttling import check_counter_store
+
+        request_started.connect(start_scheduler)
+        get_list_cache()
+        check_counter_store()
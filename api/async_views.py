@@ -0,0 +1,72 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+
+from .links import get_link_cache
+from .views import ImageViewSet
+
+image_list_view = ImageViewSet.as_view({"get": "list", "post": "create"})
+
+
+def database_sync_to_async(function: callable) -> callable:
+    """
+    Wraps function using database to run in a thread pool, outside the
+    single thread shared by synchronous code, so concurrent reads do not
+    wait for each other. Stale connections are closed around each call.
+
+    Args:
+        function(callable): Synchronous function.
+
+    Returns:
+        callable: Coroutine function.
+    """
+
+    def run(*args, **kwargs) -> object:
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def expiring_link_detail(request, pk: int) -> JsonResponse:
+    """
+    Async version of ExpiringLinkViewSet.retrieve(). Links from the
+    in-process cache are returned without leaving the event loop.
+    """
+    link_cache = get_link_cache()
+    cached, expiring_link = link_cache.resolve_local(pk)
+    if not cached:
+        expiring_link = await database_sync_to_async(link_cache.resolve)(pk)
+    if expiring_link is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    if expiring_link.expired:
+        return JsonResponse({"url": "This link has expired!"})
+    return JsonResponse({"url": expiring_link.url})
+
+
+def render_image_list(request) -> HttpResponse:
+    """Runs ImageViewSet list or create and renders its response."""
+    response = image_list_view(request)
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+async def image_list(request) -> HttpResponse:
+    """
+    Async entry point of the image list. Django 3.2 has no async ORM and
+    DRF views are synchronous, so the whole ImageViewSet (queries and
+    rendering) still runs on a thread: reads in the thread pool
+    concurrently, uploads in the thread shared by synchronous code. Only
+    the event loop is kept free while they run.
+    """
+    if request.method in ("GET", "HEAD"):
+        return await database_sync_to_async(render_image_list)(request)
+    return await sync_to_async(render_image_list)(request)
+
+
+# ImageViewSet authenticates requests itself, like every DRF view.
+image_list.csrf_exempt = True
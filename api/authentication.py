@@ -0,0 +1,236 @@
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from .caching import LocalCache
+from .models import User
+
+MISSING = "missing"
+API_TOKEN_SALT = "api.authentication.token"
+
+
+class Principal(
+    namedtuple(
+        "Principal", ["id", "username", "is_active", "tier_id", "fingerprint"]
+    )
+):
+    """
+    User authenticated by API tokens, as kept in PrincipalCache. Neither
+    the password hash nor other personal data are cached.
+
+    Attributes:
+        id (int): User object's id.
+        username (str): User's username, folder of uploaded images.
+        is_active (bool): False for deactivated users.
+        tier_id (int): User's AccountTier object's id or None.
+        fingerprint (str): user_fingerprint() of the user.
+    """
+
+    def user(self) -> User:
+        """
+        Returns User object with only principal's fields loaded, other
+        fields are read from database when accessed and save() updates
+        only the loaded ones.
+        """
+        return User.from_db(
+            User.objects.db,
+            ["id", "username", "is_active", "accountTier_id"],
+            [self.id, self.username, self.is_active, self.tier_id],
+        )
+
+
+class PrincipalCache:
+    """
+    Caches principals of users authenticated by API tokens by id in an
+    in-process LRU and optionally in a shared Django cache.
+
+    Cached users are dropped right away in the process which saved or
+    deleted them, in the shared cache and after local_ttl seconds in
+    other processes. Tier permissions of the user come from TierCache.
+
+    Args:
+        max_entries(int): Size of the in-process LRU.
+        local_ttl(float): Time to live of in-process entries.
+        shared_cache(object): Optional; Django cache shared by processes.
+        timeout(int): Optional; Time to live of shared cache entries.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        local_ttl: float,
+        shared_cache: object = None,
+        timeout: int = 300,
+    ) -> None:
+        self.local = LocalCache(max_entries)
+        self.local_ttl = local_ttl
+        self.shared_cache = shared_cache
+        self.timeout = timeout
+
+    @staticmethod
+    def key(pk: int) -> str:
+        """Returns shared cache key of the user."""
+        return f"principal:{pk}"
+
+    @staticmethod
+    def load(pk: int) -> Principal or str:
+        """Reads user from database, returns its principal or MISSING."""
+        user = (
+            User.objects.filter(pk=pk)
+            .only("username", "is_active", "accountTier_id", "password")
+            .first()
+        )
+        if user is None:
+            return MISSING
+        return Principal(
+            user.pk,
+            user.username,
+            user.is_active,
+            user.accountTier_id,
+            user_fingerprint(user),
+        )
+
+    def get(self, pk: int) -> Principal or None:
+        """
+        Returns principal of the user, reads it from database if it is not
+        cached.
+
+        Args:
+            pk(int): User object's id.
+
+        Returns:
+            Principal: User's principal or None if user does not exist.
+        """
+        principal = self.local.get(pk)
+        if principal is None and self.shared_cache is not None:
+            principal = self.shared_cache.get(self.key(pk))
+        if principal is None:
+            principal = self.load(pk)
+            if self.shared_cache is not None:
+                self.shared_cache.set(self.key(pk), principal, self.timeout)
+        self.local.set(pk, principal, self.local_ttl)
+        return None if principal == MISSING else principal
+
+    def invalidate(self, pk: int) -> None:
+        """
+        Removes cached user.
+
+        Args:
+            pk(int): User object's id.
+        """
+        self.local.delete(pk)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self.key(pk))
+
+
+@lru_cache(maxsize=None)
+def get_principal_cache() -> PrincipalCache:
+    """Returns PrincipalCache configured in settings."""
+    shared_cache = None
+    if settings.API_TOKEN_PRINCIPAL_CACHE:
+        shared_cache = caches[settings.API_TOKEN_PRINCIPAL_CACHE]
+    return PrincipalCache(
+        settings.API_TOKEN_PRINCIPAL_CACHE_SIZE,
+        settings.API_TOKEN_PRINCIPAL_LOCAL_TTL,
+        shared_cache,
+        settings.API_TOKEN_PRINCIPAL_TIMEOUT,
+    )
+
+
+@receiver(setting_changed)
+def reset_principal_cache(setting: str, **kwargs) -> None:
+    """Drops cached PrincipalCache when its settings change."""
+    if setting.startswith("API_TOKEN_PRINCIPAL"):
+        get_principal_cache.cache_clear()
+
+
+def user_fingerprint(user: User) -> str:
+    """Returns digest which changes when user's password changes."""
+    return user.get_session_auth_hash()[:16]
+
+
+def issue_api_token(user: User, max_age: int = None) -> str:
+    """
+    Returns token signed with SECRET_KEY which authenticates the user.
+
+    Tokens are not stored anywhere. They expire after max_age seconds and
+    are revoked all at once by changing user's password.
+
+    Args:
+        user(object): User object.
+        max_age(int): Optional; Validity in seconds, API_TOKEN_MAX_AGE
+                      by default.
+
+    Returns:
+        str: URL safe token.
+    """
+    if max_age is None:
+        max_age = settings.API_TOKEN_MAX_AGE
+    return signing.dumps(
+        {
+            "u": user.pk,
+            "h": user_fingerprint(user),
+            "e": int(time.time() + max_age),
+        },
+        salt=API_TOKEN_SALT,
+    )
+
+
+class APITokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticates requests with "Authorization: Bearer <token>" header,
+    where the token was made by issue_api_token().
+
+    The token is validated without any query, the user is built from
+    PrincipalCache, so neither sessions nor users are read from database
+    for cached users. It has to come before SessionAuthentication, whose
+    401 responses would lack WWW-Authenticate header.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request: object) -> tuple or None:
+        """
+        Returns user and token or None if request has no bearer token.
+
+        Args:
+            request(object): DRF request.
+
+        Returns:
+            tuple: User object and its token.
+        """
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _("Invalid token header. Token must not contain spaces.")
+            )
+        try:
+            token = auth[1].decode()
+            data = signing.loads(token, salt=API_TOKEN_SALT)
+        except (UnicodeError, signing.BadSignature):
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if data["e"] <= time.time():
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        principal = get_principal_cache().get(data["u"])
+        if (
+            principal is None
+            or not principal.is_active
+            or not constant_time_compare(principal.fingerprint, data["h"])
+        ):
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        return principal.user(), token
+
+    def authenticate_header(self, request: object) -> str:
+        """Returns WWW-Authenticate header of 401 responses."""
+        return f'{self.keyword} realm="api"'
@@ -0,0 +1,143 @@
+import io
+import os
+import statistics
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image as PillowImage
+
+from .storage import StorageBackend
+
+
+def percentile(samples: list, percent: float) -> float:
+    """
+    Returns percentile of samples using nearest-rank method.
+
+    Args:
+        samples(list): Measured values.
+        percent(float): Percentile, from 0 to 100.
+
+    Returns:
+        float: Value below which given percent of samples fall.
+    """
+    ordered = sorted(samples)
+    index = max(int(round(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(samples: list, elapsed: float = None) -> dict:
+    """
+    Summarizes measured durations.
+
+    Args:
+        samples(list): Durations of single operations in seconds.
+        elapsed(float): Optional; Wall time of all operations, defaults to
+                        the sum of samples.
+
+    Returns:
+        dict: Number of operations, operations per second, mean, p50 and
+              p99 duration in milliseconds.
+    """
+    elapsed = elapsed or sum(samples)
+    return {
+        "count": len(samples),
+        "ops_per_second": round(len(samples) / elapsed, 2) if elapsed else 0,
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def measure(operation: callable, iterations: int) -> dict:
+    """
+    Calls operation given number of times and summarizes its duration.
+
+    Args:
+        operation(callable): Called with iteration number.
+        iterations(int): Number of calls.
+
+    Returns:
+        dict: Result of summarize().
+    """
+    samples = []
+    started = time.perf_counter()
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        operation(iteration)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def sample_png(seed: int) -> SimpleUploadedFile:
+    """Returns small PNG file with content unique for the seed."""
+    content = io.BytesIO()
+    color = (seed % 256, seed // 256 % 256, seed // 65536 % 256)
+    PillowImage.new("RGB", (32, 32), color).save(content, "PNG")
+    return SimpleUploadedFile(f"benchmark{seed}.png", content.getvalue())
+
+
+class NullStorage(StorageBackend):
+    """
+    Storage backend which reads uploaded files and discards them, so
+    benchmarks measure the API instead of the network.
+    """
+
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        """Reads the file, returns Cloudinary like URL."""
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "rb") as source:
+                source.read()
+        else:
+            file.seek(0)
+            file.read()
+        key = f"{folder}/{name}"
+        return {
+            "url": f"http://res.cloudinary.com/demo/image/upload/v1/{key}.png",
+            "key": key,
+        }
+
+    def delete(self, key: str) -> None:
+        """Does nothing."""
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    thresholds: dict,
+    min_delta_ms: float = 0.0,
+) -> list:
+    """
+    Finds benchmarks which got slower than in the baseline run.
+
+    Args:
+        results(dict): Summaries by benchmark name.
+        baseline(dict): Summaries of the baseline run by benchmark name.
+        thresholds(dict): Allowed relative slowdown by compared summary
+                          field, e.g. {"p50_ms": 0.2} for 20%.
+        min_delta_ms(float): Optional; Slowdowns smaller than this number
+                             of milliseconds are ignored as noise.
+
+    Returns:
+        list: Dicts with benchmark, field, baseline and current values and
+              relative change of every regression.
+    """
+    regressions = []
+    for name, summary in sorted(results.items()):
+        if name not in baseline:
+            continue
+        for field, threshold in thresholds.items():
+            before, after = baseline[name][field], summary[field]
+            if after - before <= max(before * threshold, min_delta_ms):
+                continue
+            regressions.append(
+                {
+                    "benchmark": name,
+                    "field": field,
+                    "baseline": before,
+                    "current": after,
+                    "change": round(after / before - 1, 3) if before else None,
+                }
+            )
+    return regressions
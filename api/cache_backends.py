@@ -0,0 +1,137 @@
+import pickle
+import re
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+# Adds delta to the key only if it exists, in one step, so a key expiring
+# meanwhile is never created again without timeout.
+INCR_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 1 then
+    return redis.call("incrby", KEYS[1], ARGV[1])
+end
+return false
+"""
+
+
+class RedisCache(BaseCache):
+    """
+    Cache backend storing values in Redis or in any server speaking its
+    protocol. Integers are stored as they are, so incr() is atomic, other
+    values are pickled. clear() removes only keys with the cache's
+    KEY_PREFIX.
+
+    LOCATION is the server URL, OPTIONS["CLIENT_CLASS"] can point to
+    a client class other than redis.Redis which has from_url() method,
+    e.g. a local fake in tests.
+    """
+
+    def __init__(self, server: str, params: dict) -> None:
+        super(RedisCache, self).__init__(params)
+        client_class = params.get("OPTIONS", {}).get("CLIENT_CLASS")
+        if client_class:
+            client_class = import_string(client_class)
+        elif redis is None:
+            raise ImproperlyConfigured(
+                "RedisCache requires redis package, install it with "
+                "'pip install redis'."
+            )
+        else:
+            client_class = redis.Redis
+        self._client = client_class.from_url(server)
+        self._incr = self._client.register_script(INCR_SCRIPT)
+
+    @staticmethod
+    def dumps(value: object) -> bytes or int:
+        """Returns value as stored in Redis."""
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(value: bytes) -> object:
+        """Returns value read from Redis."""
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def get_backend_timeout(self, timeout: object = DEFAULT_TIMEOUT):
+        """Returns timeout in seconds, None for values which never expire."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(int(timeout), 0)
+
+    def key(self, key: str, version: int = None) -> str:
+        """Returns validated cache key with prefix and version."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Stores value only if the key is not set yet."""
+        timeout = self.get_backend_timeout(timeout)
+        if timeout == 0:
+            return False
+        return bool(
+            self._client.set(
+                self.key(key, version), self.dumps(value), ex=timeout, nx=True
+            )
+        )
+
+    def get(self, key, default=None, version=None):
+        """Returns value or default if it is not set."""
+        value = self._client.get(self.key(key, version))
+        return default if value is None else self.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Stores value, removes the key when timeout is not positive."""
+        timeout = self.get_backend_timeout(timeout)
+        if timeout == 0:
+            self.delete(key, version=version)
+            return
+        self._client.set(self.key(key, version), self.dumps(value), ex=timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        """Sets new timeout of the key."""
+        key = self.key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return bool(self._client.persist(key))
+        return bool(self._client.expire(key, timeout))
+
+    def delete(self, key, version=None):
+        """Removes the key."""
+        return bool(self._client.delete(self.key(key, version)))
+
+    def has_key(self, key, version=None):
+        """Checks if the key is set."""
+        return bool(self._client.exists(self.key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        """Atomically adds delta to integer value of existing key."""
+        key = self.key(key, version)
+        value = self._incr(keys=[key], args=[delta])
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def clear(self):
+        """Removes all keys of the cache, other keys of the database stay."""
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", self.key_prefix) + ":*"
+        keys = []
+        for key in self._client.scan_iter(match=pattern, count=1000):
+            keys.append(key)
+            if len(keys) == 1000:
+                self._client.delete(*keys)
+                keys = []
+        if keys:
+            self._client.delete(*keys)
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """
+    Thread-safe in-process LRU cache with per entry time to live.
+
+    Args:
+        max_entries(int): Maximal number of entries, least recently used
+                          ones are evicted first.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: object, default: object = None) -> object:
+        """
+        Returns cached value or default if it is missing or expired.
+
+        Args:
+            key(object): Cache key.
+            default(object): Optional; Returned when value is not cached.
+
+        Returns:
+            object: Cached value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: object, value: object, ttl: float) -> None:
+        """
+        Stores value for ttl seconds.
+
+        Args:
+            key(object): Cache key.
+            value(object): Cached value.
+            ttl(float): Time to live in seconds.
+        """
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: object) -> None:
+        """Removes value from the cache."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all values from the cache."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,146 @@
+import hashlib
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from .models import AccountTier, ExpiringLink, Image, Thumbnail, User
+
+# Account tiers of generated users, like the built-in ones: name, thumbnail
+# sizes, original_size and fetch_url.
+TIERS = (
+    ("basic", (200,), False, False),
+    ("premium", (200, 400), True, False),
+    ("enterprise", (200, 400), True, True),
+)
+
+
+def generate_dataset(
+    users: int,
+    images: int,
+    links: int,
+    prefix: str = "bench",
+    seed: int = 0,
+    batch_size: int = 1000,
+) -> dict:
+    """
+    Creates users spread evenly across account tiers with images and
+    expiring links, using bulk inserts. The same seed generates the same
+    names, URLs and sizes.
+
+    Args:
+        users(int): Number of users.
+        images(int): Number of images of every user.
+        links(int): Number of expiring links of every user, created for
+                    user's first images. Some of them are already expired.
+        prefix(str): Optional; Prefix of names of generated tiers, users
+                     and images, used by clear_dataset().
+        seed(int): Optional; Seed of random data.
+        batch_size(int): Optional; Number of rows inserted at once.
+
+    Returns:
+        dict: Number of created tiers, users, images and links.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    generator = random.Random(seed)
+    now = timezone.now()
+    password = make_password(None)
+    with transaction.atomic():
+        tiers = []
+        for name, sizes, original_size, fetch_url in TIERS:
+            tier = AccountTier.objects.create(
+                name=f"{prefix}-{name}",
+                original_size=original_size,
+                fetch_url=fetch_url,
+            )
+            tier.thumbnail_sizes.set(
+                Thumbnail.objects.filter(size=size).first()
+                or Thumbnail.objects.create(size=size)
+                for size in sizes
+            )
+            tiers.append(tier)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"{prefix}-{index}-{fake.user_name()}",
+                    email=fake.email(),
+                    password=password,
+                    accountTier=tiers[index % len(tiers)],
+                )
+                for index in range(users)
+            ],
+            batch_size=batch_size,
+        )
+        # bulk_create() sets primary keys only on PostgreSQL.
+        created_users = list(
+            User.objects.filter(username__startswith=f"{prefix}-").order_by(
+                "pk"
+            )
+        )
+        image_count = link_count = 0
+        for user in created_users:
+            new_images = []
+            for index in range(images):
+                name = f"{user.username}-{index}-{fake.slug()}"
+                new_images.append(
+                    Image(
+                        owner=user,
+                        name=name,
+                        url="http://res.cloudinary.com/demo/image/upload/"
+                        f"v1/{user.username}/{name}.png",
+                        storage_key=f"{user.username}/{name}",
+                        content_hash=hashlib.sha256(name.encode()).hexdigest(),
+                        size=generator.randint(10**4, 10**7),
+                    )
+                )
+            Image.objects.bulk_create(new_images, batch_size=batch_size)
+            image_count += len(new_images)
+            if not links:
+                continue
+            new_links = []
+            for image in Image.objects.filter(owner=user).order_by("pk")[
+                :links
+            ]:
+                created_time = now - timedelta(
+                    seconds=generator.randint(0, 30000)
+                )
+                expiration_time = generator.randint(300, 30000)
+                new_links.append(
+                    ExpiringLink(
+                        image=image,
+                        url=image.url,
+                        created_time=created_time,
+                        expiration_time=expiration_time,
+                        expires_at=ExpiringLink.compute_expires_at(
+                            created_time, expiration_time
+                        ),
+                    )
+                )
+            ExpiringLink.objects.bulk_create(new_links, batch_size=batch_size)
+            link_count += len(new_links)
+    return {
+        "tiers": len(tiers),
+        "users": len(created_users),
+        "images": image_count,
+        "links": link_count,
+    }
+
+
+def clear_dataset(prefix: str = "bench") -> None:
+    """
+    Deletes tiers, users, images and links made by generate_dataset().
+
+    Args:
+        prefix(str): Optional; Prefix of generated names.
+    """
+    with transaction.atomic():
+        users = User.objects.filter(username__startswith=f"{prefix}-")
+        Image.objects.filter(owner__in=users).delete()
+        users.delete()
+        AccountTier.objects.filter(
+            name__in=[f"{prefix}-{name}" for name, *_ in TIERS]
+        ).delete()
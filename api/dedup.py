@@ -0,0 +1,99 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from .models import Image
+
+
+def file_hash(file: object) -> str:
+    """
+    Returns SHA-256 digest of file content.
+
+    Files received by SpooledFileUploadHandler are hashed while they
+    stream in, other files are read chunk by chunk.
+
+    Args:
+        file(object): Uploaded file.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+    content_hash = getattr(file, "content_hash", None)
+    if content_hash is None:
+        digest = hashlib.sha256()
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+        content_hash = file.content_hash = digest.hexdigest()
+    return content_hash
+
+
+def upload_hash(file: object, options: dict) -> str:
+    """
+    Returns digest identifying stored object made of the file, which
+    includes resize transformation applied during upload.
+
+    Args:
+        file(object): Uploaded file.
+        options(dict): Options passed to StorageBackend.upload().
+
+    Returns:
+        str: Hex digest.
+    """
+    content_hash = file_hash(file)
+    if not options.get("size"):
+        return content_hash
+    transformed = f"{content_hash}:size={options['size']}"
+    return hashlib.sha256(transformed.encode()).hexdigest()
+
+
+def find_duplicates(user: object, content_hashes: list) -> dict:
+    """
+    Finds already stored images with passed content hashes.
+
+    Images of the user are searched, or images of all users when
+    IMAGE_DEDUP_SCOPE is "global". Nothing is found when it is "none".
+
+    Args:
+        user(object): Owner of new images.
+        content_hashes(list): Upload hashes of new images.
+
+    Returns:
+        dict: Stored Image object for every found hash.
+    """
+    if settings.IMAGE_DEDUP_SCOPE == "none" or not content_hashes:
+        return {}
+    images = (
+        Image.objects.filter(
+            content_hash__in=set(content_hashes), status=Image.READY
+        )
+        .exclude(storage_key="")
+        .only("url", "storage_key", "content_hash", "size")
+    )
+    if settings.IMAGE_DEDUP_SCOPE != "global":
+        images = images.filter(owner=user)
+    return {image.content_hash: image for image in images}
+
+
+def dedup_stats() -> dict:
+    """
+    Returns numbers of uploads and bytes saved by reusing stored images.
+
+    Returns:
+        dict: Number of hashed "images", "stored" objects they point to,
+              "uploads_saved" and "bytes_saved".
+    """
+    images = Image.objects.exclude(content_hash="").exclude(storage_key="")
+    total = images.aggregate(images=Count("id"), size=Sum("size"))
+    stored = (
+        images.values("storage_key")
+        .annotate(object_size=Max("size"))
+        .aggregate(stored=Count("storage_key"), size=Sum("object_size"))
+    )
+    return {
+        "images": total["images"],
+        "stored": stored["stored"],
+        "uploads_saved": total["images"] - stored["stored"],
+        "bytes_saved": (total["size"] or 0) - (stored["size"] or 0),
+    }
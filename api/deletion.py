@@ -0,0 +1,181 @@
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from .jobs import PeriodicJob
+from .models import Image, StorageDeletion
+from .storage import LocalStorage, StorageBackend, get_storage
+from .thumbnails import get_thumbnail_engine
+
+logger = logging.getLogger(__name__)
+
+# Keys collected by collected_deletions(), None outside of it.
+pending_keys = contextvars.ContextVar("pending_keys", default=None)
+
+
+def schedule_deletion(keys: list) -> None:
+    """
+    Queues deletion of stored files in the current transaction and wakes
+    the storage cleaner when it is committed.
+
+    Args:
+        keys(list): Storage keys, empty ones are skipped.
+    """
+    pending = pending_keys.get()
+    if pending is not None:
+        pending.extend(keys)
+        return
+    deletions = [StorageDeletion(storage_key=key) for key in keys if key]
+    if not deletions:
+        return
+    StorageDeletion.objects.bulk_create(deletions)
+    if settings.STORAGE_CLEANUP_WORKER:
+        transaction.on_commit(lambda: get_storage_cleaner().wake())
+
+
+@contextmanager
+def collected_deletions():
+    """
+    Context manager queuing all deletions scheduled within it with one
+    query when it exits, e.g. for images deleted by a single
+    QuerySet.delete(). Should be used inside a transaction.
+    """
+    keys = []
+    token = pending_keys.set(keys)
+    try:
+        yield
+    finally:
+        pending_keys.reset(token)
+    schedule_deletion(keys)
+
+
+def delete_objects(queryset: QuerySet) -> int:
+    """
+    Deletes objects with related ones in a transaction, queues files of
+    deleted images at once.
+
+    Args:
+        queryset(object): Objects to delete.
+
+    Returns:
+        int: Number of deleted objects, without related ones.
+    """
+    with transaction.atomic(), collected_deletions():
+        return queryset.delete()[1].get(queryset.model._meta.label, 0)
+
+
+def retry_later(deletions: list, now: object) -> None:
+    """
+    Postpones failed deletions with exponential backoff, drops the ones
+    which failed STORAGE_CLEANUP_RETRIES times.
+
+    Args:
+        deletions(list): StorageDeletion objects of the failed batch.
+        now(object): Date and time of the attempt.
+    """
+    retried, abandoned = [], []
+    for deletion in deletions:
+        deletion.attempts += 1
+        if deletion.attempts > settings.STORAGE_CLEANUP_RETRIES:
+            abandoned.append(deletion.pk)
+            logger.error("Giving up deleting %s", deletion.storage_key)
+            continue
+        deletion.next_attempt_at = now + timedelta(
+            seconds=settings.STORAGE_CLEANUP_RETRY_BACKOFF
+            * 2 ** (deletion.attempts - 1)
+        )
+        retried.append(deletion)
+    StorageDeletion.objects.bulk_update(
+        retried, ["attempts", "next_attempt_at"]
+    )
+    StorageDeletion.objects.filter(pk__in=abandoned).delete()
+
+
+def delete_stored_files(
+    storage: StorageBackend = None, batch_size: int = None
+) -> int:
+    """
+    Deletes queued files which are due, in batches passed to the
+    backend's delete_many(). Files still referenced by an image, e.g.
+    a deduplicated upload of the same content, are kept. LocalStorage
+    files lose their cached thumbnails too. Failed batches are retried
+    later.
+
+    Args:
+        storage(object): Optional; Storage backend, defaults to
+                         get_storage().
+        batch_size(int): Optional; Number of files deleted at once,
+                         defaults to STORAGE_CLEANUP_BATCH_SIZE.
+
+    Returns:
+        int: Number of deleted files.
+    """
+    storage = storage or get_storage()
+    batch_size = batch_size or settings.STORAGE_CLEANUP_BATCH_SIZE
+    deleted = 0
+    while True:
+        now = timezone.now()
+        batch = list(
+            StorageDeletion.objects.filter(next_attempt_at__lte=now).order_by(
+                "pk"
+            )[:batch_size]
+        )
+        if not batch:
+            return deleted
+        keys = {deletion.storage_key for deletion in batch}
+        referenced = set(
+            Image.objects.filter(storage_key__in=keys).values_list(
+                "storage_key", flat=True
+            )
+        )
+        unreferenced = sorted(keys - referenced)
+        try:
+            if unreferenced:
+                storage.delete_many(unreferenced)
+        except Exception:
+            logger.warning(
+                "Deleting %s stored files failed, retrying later",
+                len(unreferenced),
+                exc_info=True,
+            )
+            retry_later(batch, now)
+            continue
+        if isinstance(storage, LocalStorage):
+            get_thumbnail_engine().delete(unreferenced)
+        StorageDeletion.objects.filter(
+            pk__in=[deletion.pk for deletion in batch]
+        ).delete()
+        deleted += len(unreferenced)
+
+
+def delete_stored_files_job() -> None:
+    """Deletes queued files with batch size from settings."""
+    deleted = delete_stored_files()
+    if deleted:
+        logger.info("Deleted %s stored files", deleted)
+
+
+_storage_cleaner = None
+_storage_cleaner_lock = threading.Lock()
+
+
+def get_storage_cleaner() -> PeriodicJob:
+    """
+    Returns process wide job deleting queued files every
+    STORAGE_CLEANUP_INTERVAL seconds, starts it on first call.
+    """
+    global _storage_cleaner
+    with _storage_cleaner_lock:
+        if _storage_cleaner is None:
+            _storage_cleaner = PeriodicJob(
+                delete_stored_files_job, settings.STORAGE_CLEANUP_INTERVAL
+            )
+            _storage_cleaner.start()
+    return _storage_cleaner
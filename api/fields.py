@@ -0,0 +1,80 @@
+from django.conf import settings
+from PIL import Image as PillowImage
+from rest_framework import serializers
+
+from .metrics import timed
+
+
+class ImageHeaderField(serializers.FileField):
+    """
+    Image file field which validates uploads by their header only.
+
+    Unlike serializers.ImageField the file is neither copied to memory
+    nor decoded, Pillow reads just the format and dimensions. Images with
+    more than IMAGE_MAX_PIXELS pixels are refused before anything is
+    decoded. Validated files get image_format and image_size attributes.
+
+    Args:
+        formats(tuple): Optional; Accepted Pillow format names.
+    """
+
+    default_error_messages = {
+        "invalid_image": (
+            "Upload a valid image. The file you uploaded was either not "
+            "an image or a corrupted image."
+        ),
+        "invalid_format": (
+            "Unsupported image format {image_format}, "
+            "allowed formats are {formats}."
+        ),
+        "too_many_pixels": (
+            "Image has {pixels} pixels, at most {max_pixels} are allowed."
+        ),
+    }
+
+    def __init__(self, *args, formats: tuple = ("JPEG", "PNG"), **kwargs):
+        self.formats = formats
+        super(ImageHeaderField, self).__init__(*args, **kwargs)
+
+    @timed("validate")
+    def to_internal_value(self, data: object) -> object:
+        """
+        Reads image header, checks its format and number of pixels.
+
+        Args:
+            data(object): Uploaded file.
+
+        Returns:
+            object: Uploaded file.
+        """
+        file = super(ImageHeaderField, self).to_internal_value(data)
+        if hasattr(file, "temporary_file_path"):
+            source = file.temporary_file_path()
+        else:
+            source = file
+            source.seek(0)
+        try:
+            with PillowImage.open(source) as image:
+                image_format, image_size = image.format, image.size
+        except (OSError, SyntaxError, PillowImage.DecompressionBombError):
+            self.fail("invalid_image")
+        finally:
+            if source is file:
+                file.seek(0)
+        if image_format not in self.formats:
+            self.fail(
+                "invalid_format",
+                image_format=image_format,
+                formats=", ".join(self.formats),
+            )
+        pixels = image_size[0] * image_size[1]
+        if pixels > settings.IMAGE_MAX_PIXELS:
+            self.fail(
+                "too_many_pixels",
+                pixels=pixels,
+                max_pixels=settings.IMAGE_MAX_PIXELS,
+            )
+        file.image_format = image_format
+        file.image_size = image_size
+        file.content_type = PillowImage.MIME[image_format]
+        return file
@@ -0,0 +1,148 @@
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import Image as PillowImage
+
+try:
+    # Registers AVIF plugin in Pillow older than 11.2.
+    import pillow_avif  # noqa: F401
+except ImportError:  # pragma: no cover
+    pass
+
+FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "AVIF": "avif"}
+EXTENSIONS = {extension: name for name, extension in FORMATS.items()}
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "AVIF": "image/avif",
+}
+# Formats served to clients which accept them, the most compact first.
+NEGOTIATED_FORMATS = ("AVIF", "WEBP")
+
+
+@lru_cache(maxsize=None)
+def available_formats() -> frozenset:
+    """Returns Pillow names of formats which can be encoded."""
+    PillowImage.init()
+    return frozenset(name for name in FORMATS if name in PillowImage.SAVE)
+
+
+def parse_format(extension: str, supported: frozenset = None) -> str:
+    """
+    Returns Pillow name of output format.
+
+    Args:
+        extension(str): Format as used in URLs, e.g. "webp" or "jpeg".
+        supported(frozenset): Optional; Pillow names of formats the
+                              image is served in, defaults to formats
+                              Pillow can encode.
+
+    Returns:
+        str: Pillow format name.
+
+    Raises:
+        ValueError: Format is unknown or cannot be encoded.
+    """
+    if supported is None:
+        supported = available_formats()
+    image_format = format_of(f"image.{extension}")
+    if image_format not in supported:
+        raise ValueError(f"Unsupported image format: {extension}")
+    return image_format
+
+
+def format_of(path: str) -> str or None:
+    """Returns Pillow name of the format of a file by its extension."""
+    extension = os.path.splitext(path)[1][1:].lower()
+    return EXTENSIONS.get("jpg" if extension == "jpeg" else extension)
+
+
+def accepted_types(accept: str) -> set:
+    """
+    Returns media types accepted by the client.
+
+    Args:
+        accept(str): Accept header.
+
+    Returns:
+        set: Media types with non-zero quality value.
+    """
+    types = set()
+    for item in accept.split(","):
+        media_type, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            types.add(media_type.strip().lower())
+    return types
+
+
+def negotiate_format(accept: str, source_format: str) -> str:
+    """
+    Returns the most compact format the client explicitly accepts, wildcards
+    are ignored because browsers send "image/*" without supporting AVIF.
+
+    Args:
+        accept(str): Accept header.
+        source_format(str): Pillow name of the stored image's format,
+                            returned when no better format is accepted.
+
+    Returns:
+        str: Pillow format name.
+    """
+    types = accepted_types(accept)
+    for image_format in NEGOTIATED_FORMATS:
+        if (
+            MIME_TYPES[image_format] in types
+            and image_format in available_formats()
+        ):
+            return image_format
+    return source_format
+
+
+def quality_for(preset: str, image_format: str) -> int or None:
+    """
+    Returns encoder quality of the preset for the format.
+
+    Args:
+        preset(str): Key of IMAGE_QUALITY_PRESETS.
+        image_format(str): Pillow format name.
+
+    Returns:
+        int: Quality or None when the format has no quality setting.
+
+    Raises:
+        ValueError: Preset is unknown.
+    """
+    if preset not in settings.IMAGE_QUALITY_PRESETS:
+        raise ValueError(f"Unknown quality preset: {preset}")
+    return settings.IMAGE_QUALITY_PRESETS[preset].get(image_format)
+
+
+def encode_options(image_format: str, quality: int = None) -> dict:
+    """
+    Returns keyword arguments of Image.save() for the format.
+
+    Args:
+        image_format(str): Pillow format name.
+        quality(int): Optional; Encoder quality.
+
+    Returns:
+        dict: Save options.
+    """
+    options = {}
+    if quality is not None and image_format != "PNG":
+        options["quality"] = quality
+    if image_format == "WEBP":
+        options["method"] = settings.IMAGE_WEBP_METHOD
+    elif image_format == "AVIF":
+        options["speed"] = settings.IMAGE_AVIF_SPEED
+    return options
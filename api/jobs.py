@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from .models import ExpiringLink
+
+logger = logging.getLogger(__name__)
+
+
+def purge_expired_links(
+    batch_size: int = 1000, retention: int = 0, pause: float = 0.0
+) -> int:
+    """
+    Deletes expired links in batches, so no delete holds long locks.
+
+    Args:
+        batch_size(int): Optional; Number of links deleted at once.
+        retention(int): Optional; Links expired for less than given number
+                        of seconds are kept.
+        pause(float): Optional; Sleep between batches in seconds.
+
+    Returns:
+        int: Number of deleted links.
+    """
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    purged = 0
+    while True:
+        batch = list(
+            ExpiringLink.objects.filter(expires_at__lt=cutoff).values_list(
+                "pk", flat=True
+            )[:batch_size]
+        )
+        if not batch:
+            return purged
+        ExpiringLink.objects.filter(pk__in=batch).delete()
+        purged += len(batch)
+        if pause:
+            time.sleep(pause)
+
+
+def process_in_batches(
+    queryset: QuerySet, operation: callable, batch_size: int = 1000
+) -> int:
+    """
+    Calls operation with consecutive batches of queryset's objects walking
+    the primary key, so no statement touches more than batch_size rows and
+    the operation may delete processed objects.
+
+    Args:
+        queryset(object): Processed objects.
+        operation(callable): Called with QuerySet of one batch.
+        batch_size(int): Optional; Number of objects in a batch.
+
+    Returns:
+        int: Number of processed objects.
+    """
+    ordered = queryset.order_by("pk")
+    manager = queryset.model._default_manager
+    processed, last = 0, None
+    while True:
+        page = ordered if last is None else ordered.filter(pk__gt=last)
+        batch = list(page.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return processed
+        operation(manager.filter(pk__in=batch))
+        processed += len(batch)
+        last = batch[-1]
+
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def submit_job(function: callable, *args, **kwargs) -> Future:
+    """
+    Runs function in the process wide background job thread, one job at
+    a time, e.g. admin actions on many objects.
+
+    Args:
+        function(callable): Called with passed arguments.
+
+    Returns:
+        Future: Resolved with function's result.
+    """
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="job"
+            )
+
+    def run() -> object:
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            logger.exception("Background job %s failed", function.__name__)
+            raise
+        finally:
+            close_old_connections()
+
+    return _job_executor.submit(run)
+
+
+class PeriodicJob(threading.Thread):
+    """
+    Daemon thread calling function every interval seconds and whenever
+    it is woken up.
+
+    Args:
+        function(callable): Called without arguments.
+        interval(float): Seconds between calls.
+    """
+
+    def __init__(self, function: callable, interval: float) -> None:
+        super(PeriodicJob, self).__init__(
+            name=f"periodic-{function.__name__}", daemon=True
+        )
+        self.function = function
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.woken = threading.Event()
+
+    def run(self) -> None:
+        """Calls function until the job is stopped."""
+        while True:
+            self.woken.wait(self.interval)
+            self.woken.clear()
+            if self.stopped.is_set():
+                return
+            try:
+                self.function()
+            except Exception:
+                logger.exception("Periodic job %s failed", self.name)
+            finally:
+                close_old_connections()
+
+    def wake(self) -> None:
+        """Calls function now, without waiting for the interval."""
+        self.woken.set()
+
+    def stop(self) -> None:
+        """Stops calling function."""
+        self.stopped.set()
+        self.woken.set()
+
+
+def purge_expired_links_job() -> None:
+    """Purges expired links with batch size and retention from settings."""
+    purged = purge_expired_links(
+        settings.EXPIRED_LINK_PURGE_BATCH_SIZE,
+        settings.EXPIRED_LINK_RETENTION,
+    )
+    logger.info("Purged %s expired links", purged)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(**kwargs) -> None:
+    """
+    Starts periodic purging of expired links when the first request is
+    handled, if EXPIRED_LINK_PURGE_INTERVAL setting is set.
+    """
+    global _scheduler
+    request_started.disconnect(start_scheduler)
+    with _scheduler_lock:
+        if _scheduler is None and settings.EXPIRED_LINK_PURGE_INTERVAL:
+            _scheduler = PeriodicJob(
+                purge_expired_links_job,
+                settings.EXPIRED_LINK_PURGE_INTERVAL,
+            )
+            _scheduler.start()
@@ -0,0 +1,231 @@
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .caching import LocalCache
+from .models import ExpiringLink
+
+MISSING = "missing"
+SIGNED_LINK_SALT = "api.links.signed"
+
+
+class ResolvedLink(namedtuple("ResolvedLink", ["url", "expires_at"])):
+    """
+    Destination URL of an expiring link and its expiry timestamp.
+
+    Attributes:
+        url (str): Destination's URL.
+        expires_at (float): Expiry as POSIX timestamp.
+    """
+
+    @property
+    def expired(self) -> bool:
+        """Checks if link has already expired."""
+        return self.expires_at <= time.time()
+
+
+class LinkCache:
+    """
+    Caches resolved expiring links by id in an in-process LRU and
+    optionally in a shared Django cache.
+
+    Valid links are cached until they expire, expired and missing links
+    are cached for negative_ttl seconds, so database is queried at most
+    once per link per time window.
+
+    Args:
+        max_entries(int): Size of the in-process LRU.
+        local_ttl(float): Maximal time to live of in-process entries,
+                          limits how long other processes can serve
+                          a deleted link.
+        negative_ttl(float): Time to live of expired and missing links.
+        shared_cache(object): Optional; Django cache shared by processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        local_ttl: float,
+        negative_ttl: float,
+        shared_cache: object = None,
+    ) -> None:
+        self.local = LocalCache(max_entries)
+        self.local_ttl = local_ttl
+        self.negative_ttl = negative_ttl
+        self.shared_cache = shared_cache
+
+    @staticmethod
+    def key(pk: int) -> str:
+        """Returns shared cache key of the link."""
+        return f"expiringlink:{pk}"
+
+    def load(self, pk: int) -> tuple or str:
+        """Reads link from database, returns its url and expiry or MISSING."""
+        row = (
+            ExpiringLink.objects.filter(pk=pk)
+            .values_list("url", "expires_at")
+            .first()
+        )
+        if row is None:
+            return MISSING
+        url, expires_at = row
+        return (url, expires_at.timestamp())
+
+    def ttl(self, entry: tuple or str) -> float:
+        """Returns time to live of cache entry."""
+        if entry == MISSING:
+            return self.negative_ttl
+        remaining = entry[1] - time.time()
+        return remaining if remaining > 0 else self.negative_ttl
+
+    def resolve(self, pk: int) -> ResolvedLink or None:
+        """
+        Returns resolved link, reads it from database if it is not cached.
+
+        Args:
+            pk(int): ExpiringLink object's id.
+
+        Returns:
+            ResolvedLink: Resolved link or None if link does not exist.
+        """
+        entry = self.local.get(pk)
+        if entry is None and self.shared_cache is not None:
+            entry = self.shared_cache.get(self.key(pk))
+            if entry is not None:
+                self.local.set(pk, entry, min(self.ttl(entry), self.local_ttl))
+        if entry is None:
+            entry = self.load(pk)
+            ttl = self.ttl(entry)
+            self.local.set(pk, entry, min(ttl, self.local_ttl))
+            if self.shared_cache is not None and int(ttl) > 0:
+                self.shared_cache.set(self.key(pk), entry, int(ttl))
+        if entry == MISSING:
+            return None
+        return ResolvedLink(*entry)
+
+    def resolve_local(self, pk: int) -> tuple:
+        """
+        Returns link only if it is in the in-process cache.
+
+        Args:
+            pk(int): ExpiringLink object's id.
+
+        Returns:
+            tuple: True and resolved link (None if link does not exist)
+                   when it is cached, False and None if it is not.
+        """
+        entry = self.local.get(pk)
+        if entry is None:
+            return False, None
+        if entry == MISSING:
+            return True, None
+        return True, ResolvedLink(*entry)
+
+    def invalidate(self, pk: int) -> None:
+        """
+        Removes cached link.
+
+        Args:
+            pk(int): ExpiringLink object's id.
+        """
+        self.local.delete(pk)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self.key(pk))
+
+
+@lru_cache(maxsize=None)
+def get_link_cache() -> LinkCache:
+    """Returns LinkCache configured in settings."""
+    shared_cache = None
+    if settings.EXPIRING_LINK_SHARED_CACHE:
+        shared_cache = caches[settings.EXPIRING_LINK_SHARED_CACHE]
+    return LinkCache(
+        settings.EXPIRING_LINK_CACHE_SIZE,
+        settings.EXPIRING_LINK_CACHE_LOCAL_TTL,
+        settings.EXPIRING_LINK_NEGATIVE_TTL,
+        shared_cache,
+    )
+
+
+@receiver(setting_changed)
+def reset_link_cache(setting: str, **kwargs) -> None:
+    """Drops cached LinkCache when its settings change."""
+    if setting.startswith("EXPIRING_LINK"):
+        get_link_cache.cache_clear()
+
+
+def sign_link(expiring_link: ExpiringLink) -> str:
+    """
+    Returns token signed with SECRET_KEY which encodes link and image
+    ids, destination URL and expiry of the link.
+
+    Args:
+        expiring_link(object): ExpiringLink object.
+
+    Returns:
+        str: URL safe token.
+    """
+    return signing.dumps(
+        {
+            "l": expiring_link.pk,
+            "i": expiring_link.image_id,
+            "u": expiring_link.url,
+            "e": int(expiring_link.expires_at.timestamp()),
+        },
+        salt=SIGNED_LINK_SALT,
+        compress=True,
+    )
+
+
+def get_revocation_cache() -> object or None:
+    """Returns cache with revoked signed links or None if it is disabled."""
+    if not settings.SIGNED_LINK_REVOCATION_CACHE:
+        return None
+    return caches[settings.SIGNED_LINK_REVOCATION_CACHE]
+
+
+def revocation_key(pk: int) -> str:
+    """Returns revocation cache key of the link with given id."""
+    return f"revokedlink:{pk}"
+
+
+def revoke_link(expiring_link: ExpiringLink) -> None:
+    """
+    Adds all signed links of the ExpiringLink to the revocation list
+    until it expires. Tokens carry the link's id, so tokens signed at any
+    time are revoked.
+
+    Args:
+        expiring_link(object): ExpiringLink object.
+    """
+    cache = get_revocation_cache()
+    remaining = int(expiring_link.expires_at.timestamp() - time.time())
+    if cache is not None and remaining > 0:
+        cache.set(revocation_key(expiring_link.pk), True, remaining)
+
+
+def resolve_signed_link(token: str) -> ResolvedLink or None:
+    """
+    Validates signed link without querying the database.
+
+    Args:
+        token(str): Token returned by sign_link().
+
+    Returns:
+        ResolvedLink: Resolved link or None if the token is invalid
+                      or revoked.
+    """
+    try:
+        data = signing.loads(token, salt=SIGNED_LINK_SALT)
+    except signing.BadSignature:
+        return None
+    cache = get_revocation_cache()
+    if cache is not None and cache.get(revocation_key(data.get("l"))):
+        return None
+    return ResolvedLink(data["u"], data["e"])
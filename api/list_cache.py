@@ -0,0 +1,212 @@
+import hashlib
+import math
+import time
+import uuid
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.http import http_date
+
+from .models import Image
+from .tiers import get_tier_cache
+
+
+class CachedResponse(
+    namedtuple(
+        "CachedResponse", ["content", "content_type", "etag", "last_modified"]
+    )
+):
+    """
+    Rendered image list response.
+
+    Attributes:
+        content (bytes): Response body.
+        content_type (str): Content-Type header.
+        etag (str): Quoted digest of the body.
+        last_modified (int): POSIX timestamp sent as Last-Modified.
+    """
+
+    def headers(self) -> dict:
+        """Returns validator headers of the response."""
+        return {
+            "ETag": self.etag,
+            "Last-Modified": http_date(self.last_modified),
+        }
+
+
+class ListCache:
+    """
+    Caches rendered image list responses of every user.
+
+    Responses are stored under a version of user's images, which is
+    replaced whenever any of user's Image or ExpiringLink objects is
+    saved, so changed lists are never served from the cache.
+
+    Args:
+        cache(object): Django cache storing versions and responses.
+        timeout(int): Maximal time to live of responses in seconds.
+    """
+
+    def __init__(self, cache: object, timeout: int) -> None:
+        self.cache = cache
+        self.timeout = timeout
+
+    @staticmethod
+    def version_key(user_id: int) -> str:
+        """Returns cache key of user's images version."""
+        return f"imagelist:version:{user_id}"
+
+    def version(self, user_id: int) -> tuple:
+        """Returns token and timestamp of current version of user's images."""
+        version = self.cache.get(self.version_key(user_id))
+        if version is None:
+            self.cache.add(
+                self.version_key(user_id),
+                (uuid.uuid4().hex, time.time()),
+                None,
+            )
+            version = self.cache.get(self.version_key(user_id))
+        return version
+
+    def bump(self, *user_ids: int) -> None:
+        """
+        Replaces version of users' images, dropping their cached lists.
+
+        Args:
+            user_ids(int): Ids of users whose images have changed.
+        """
+        now = time.time()
+        self.cache.set_many(
+            {
+                self.version_key(user_id): (uuid.uuid4().hex, now)
+                for user_id in user_ids
+            },
+            None,
+        )
+
+    def key(self, request: object) -> tuple:
+        """
+        Returns cache key of response to request and time of the last
+        change of user's images. Both have to be read before the response
+        is rendered, so it is never cached under a newer version.
+
+        Args:
+            request(object): Image list request.
+
+        Returns:
+            tuple: Cache key and POSIX timestamp.
+        """
+        user = request.user
+        token, changed = self.version(user.pk)
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = ":".join(
+            [
+                "imagelist",
+                str(user.pk),
+                token,
+                str(user.accountTier_id),
+                str(get_tier_cache().version()),
+                request.accepted_renderer.format,
+                path,
+            ]
+        )
+        return key, changed
+
+    def get(self, key: str) -> CachedResponse or None:
+        """Returns cached response or None."""
+        return self.cache.get(key)
+
+    def set(
+        self,
+        key: str,
+        changed: float,
+        response: object,
+        valid_until: float = None,
+    ) -> CachedResponse:
+        """
+        Caches rendered response.
+
+        Last-Modified is not earlier than the second after the last change
+        of user's images, so a response generated in the same second as the
+        previous one is still reported as modified.
+
+        Args:
+            key(str): Key returned by key().
+            changed(float): Time of the last change returned by key().
+            response(object): Rendered response.
+            valid_until(float): Optional; Timestamp when the response
+                                becomes stale, e.g. when a link expires.
+
+        Returns:
+            CachedResponse: Cached response.
+        """
+        now = time.time()
+        entry = CachedResponse(
+            response.content,
+            response["Content-Type"],
+            '"%s"' % hashlib.md5(response.content).hexdigest(),
+            max(int(now), math.floor(changed) + 1),
+        )
+        timeout = self.timeout
+        if valid_until is not None:
+            timeout = min(timeout, int(valid_until - now))
+        if timeout > 0:
+            self.cache.set(key, entry, timeout)
+        return entry
+
+
+def invalidate_image_lists(user_ids: list = (), image_ids: list = ()):
+    """
+    Drops cached image lists of users and of owners of images.
+
+    Args:
+        user_ids(list): Optional; Ids of users.
+        image_ids(list): Optional; Ids of images.
+    """
+    list_cache = get_list_cache()
+    if list_cache is None:
+        return
+    user_ids = set(user_ids)
+    if image_ids:
+        user_ids.update(
+            Image.objects.filter(pk__in=image_ids).values_list(
+                "owner_id", flat=True
+            )
+        )
+    if user_ids:
+        list_cache.bump(*user_ids)
+
+
+@lru_cache(maxsize=None)
+def get_list_cache() -> ListCache or None:
+    """
+    Returns ListCache configured in settings or None if it is disabled.
+    Refuses in-process caches outside of "dev" SERVER_MODE, where other
+    worker processes would keep serving lists changed by one of them.
+    """
+    if not settings.IMAGE_LIST_CACHE:
+        return None
+    cache = caches[settings.IMAGE_LIST_CACHE]
+    if isinstance(cache, LocMemCache) and settings.SERVER_MODE != "dev":
+        raise ImproperlyConfigured(
+            f"IMAGE_LIST_CACHE {settings.IMAGE_LIST_CACHE!r} is a per process "
+            "locmem cache, use a cache shared by all workers (file, database "
+            "or redis) or set IMAGE_LIST_CACHE to an empty value."
+        )
+    return ListCache(cache, settings.IMAGE_LIST_CACHE_TIMEOUT)
+
+
+@receiver(setting_changed)
+def reset_list_cache(setting: str, **kwargs) -> None:
+    """Drops cached ListCache when its settings change."""
+    if setting.startswith("IMAGE_LIST_CACHE") or setting in (
+        "CACHES",
+        "SERVER_MODE",
+    ):
+        get_list_cache.cache_clear()
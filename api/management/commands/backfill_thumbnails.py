@@ -0,0 +1,91 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import AccountTier, Image
+from api.storage import LocalStorage, get_storage
+from api.thumbnails import get_thumbnail_engine
+
+
+class Command(BaseCommand):
+    """Renders missing thumbnails of existing LocalStorage images."""
+
+    help = "Renders missing thumbnails of existing images in parallel."
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of rendering processes, defaults to CPU cores.",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=100,
+            help="Number of images between progress reports.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Submits every image with missing thumbnails to process pool."""
+        if not isinstance(get_storage(), LocalStorage):
+            raise CommandError("Thumbnails are rendered only by LocalStorage.")
+        engine = get_thumbnail_engine()
+        tier_sizes = {
+            tier.pk: [
+                thumbnail.size for thumbnail in tier.thumbnail_sizes.all()
+            ]
+            for tier in AccountTier.objects.exclude(
+                name="Basic"
+            ).prefetch_related("thumbnail_sizes")
+        }
+        images = (
+            Image.objects.filter(status=Image.READY)
+            .exclude(storage_key="")
+            .values_list("storage_key", "owner__accountTier")
+            .iterator()
+        )
+        started = time.perf_counter()
+        done = thumbnails = 0
+        workers = options["workers"] or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            limit = workers * 4
+            pending = set()
+            for key, tier in images:
+                future = engine.prerender(
+                    key, tier_sizes.get(tier, []), executor=executor
+                )
+                done += 1
+                if future is not None:
+                    pending.add(future)
+                while len(pending) >= limit:
+                    finished, pending = wait(
+                        pending, return_when=FIRST_COMPLETED
+                    )
+                    thumbnails += self.count(finished)
+                if done % options["progress_every"] == 0:
+                    self.report(done, thumbnails, started)
+            thumbnails += self.count(wait(pending).done)
+        self.report(done, thumbnails, started)
+
+    def count(self, futures: set) -> int:
+        """Returns number of thumbnails rendered by finished futures."""
+        rendered = 0
+        for future in futures:
+            try:
+                rendered += len(future.result())
+            except Exception as error:
+                self.stderr.write(f"Rendering failed: {error}")
+        return rendered
+
+    def report(self, images: int, thumbnails: int, started: float) -> None:
+        """Writes progress and throughput."""
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{images} images, {thumbnails} thumbnails rendered in "
+            f"{elapsed:.1f}s ({images / elapsed:.1f} images/s, "
+            f"{thumbnails / elapsed:.1f} thumbnails/s)"
+        )
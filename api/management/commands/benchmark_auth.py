@@ -0,0 +1,93 @@
+import json
+
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import (
+    APITokenAuthentication,
+    get_principal_cache,
+    issue_api_token,
+)
+from api.benchmarking import measure
+from api.models import User
+
+
+class Command(BaseCommand):
+    """Measures authentication overhead per request."""
+
+    help = (
+        "Compares authenticating requests with sessions and with API "
+        "tokens, with cold and warm principal cache."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options) -> None:
+        """Authenticates requests, removes created objects afterwards."""
+        user = User.objects.create(username="benchmark-auth")
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = (
+            "django.contrib.auth.backends.ModelBackend"
+        )
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        factory = APIRequestFactory()
+        token = issue_api_token(user)
+        middleware = SessionMiddleware(lambda request: None)
+        auth_middleware = AuthenticationMiddleware(lambda request: None)
+
+        def authenticate(authenticator: object, **headers) -> callable:
+            def operation(iteration: int) -> None:
+                request = factory.get("/api/image/", **headers)
+                middleware.process_request(request)
+                auth_middleware.process_request(request)
+                user = Request(request, authenticators=[authenticator]).user
+                assert user.is_authenticated
+
+            return operation
+
+        def cold(operation: callable) -> callable:
+            def cold_operation(iteration: int) -> None:
+                get_principal_cache().invalidate(user.pk)
+                operation(iteration)
+
+            return cold_operation
+
+        session_auth = authenticate(
+            SessionAuthentication(),
+            HTTP_COOKIE=f"sessionid={session.session_key}",
+        )
+        token_auth = authenticate(
+            APITokenAuthentication(), HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+        modes = {
+            "session": session_auth,
+            "token_cold": cold(token_auth),
+            "token_warm": token_auth,
+        }
+        results = {}
+        try:
+            for name, operation in modes.items():
+                operation(0)
+                with CaptureQueriesContext(connection) as queries:
+                    result = measure(operation, options["requests"])
+                result["queries_per_request"] = round(
+                    len(queries) / options["requests"], 2
+                )
+                results[name] = result
+        finally:
+            session.delete()
+            user.delete()
+        self.stdout.write(json.dumps(results, indent=2))
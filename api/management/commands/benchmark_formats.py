@@ -0,0 +1,140 @@
+import io
+import json
+import os
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image as PillowImage
+from PIL import ImageDraw, ImageFilter
+
+from api.benchmarking import measure
+from api.formats import FORMATS, available_formats, format_of, quality_for
+from api.thumbnails import render_thumbnail, transcode
+
+
+def photo(seed: int, size: int) -> bytes:
+    """Returns JPEG with smooth color areas and noise, like a photo."""
+    generator = random.Random(seed)
+    image = PillowImage.new("RGB", (size, size))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = generator.randrange(size), generator.randrange(size)
+        radius = generator.randrange(size // 8, size // 2)
+        color = tuple(generator.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), color)
+    image = image.filter(ImageFilter.GaussianBlur(size / 50))
+    noise = PillowImage.effect_noise((size, size), 24).convert("RGB")
+    image = PillowImage.blend(image, noise, 0.1)
+    content = io.BytesIO()
+    image.save(content, "JPEG", quality=92)
+    return content.getvalue()
+
+
+def screenshot(seed: int, size: int) -> bytes:
+    """Returns PNG with flat boxes and lines of "text", like a screenshot."""
+    generator = random.Random(seed)
+    image = PillowImage.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = generator.randrange(size), generator.randrange(size)
+        color = tuple(generator.randrange(128, 256) for _ in range(3))
+        draw.rectangle((x, y, x + size // 4, y + size // 6), color)
+    for line in range(0, size, 18):
+        width = generator.randrange(size // 4, size)
+        draw.text((10, line), "lorem ipsum " * (width // 70), "black")
+    content = io.BytesIO()
+    image.save(content, "PNG")
+    return content.getvalue()
+
+
+class Command(BaseCommand):
+    """Measures bytes served and encoding cost of every output format."""
+
+    help = (
+        "Encodes a sample corpus (synthetic photos and screenshots or "
+        "files from --source) in every available format and quality preset "
+        "and reports sizes and encoding times."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--source", help="Directory with JPEG/PNG files.")
+        parser.add_argument("--images", type=int, default=10)
+        parser.add_argument("--size", type=int, default=1600)
+        parser.add_argument(
+            "--thumbnail",
+            type=int,
+            default=0,
+            help="Encode thumbnails of this size instead of full images.",
+        )
+        parser.add_argument(
+            "--presets",
+            nargs="+",
+            default=list(settings.IMAGE_QUALITY_PRESETS),
+        )
+
+    def corpus(self, options: dict) -> list:
+        """Returns (name, content) of sample images."""
+        if not options["source"]:
+            return [
+                (
+                    (f"photo{index}.jpg", photo(index, options["size"]))
+                    if index % 2 == 0
+                    else (
+                        f"screenshot{index}.png",
+                        screenshot(index, options["size"]),
+                    )
+                )
+                for index in range(options["images"])
+            ]
+        corpus = []
+        for name in sorted(os.listdir(options["source"])):
+            if format_of(name) in ("JPEG", "PNG"):
+                with open(os.path.join(options["source"], name), "rb") as file:
+                    corpus.append((name, file.read()))
+        return corpus
+
+    def handle(self, *args, **options) -> None:
+        """Encodes the corpus, prints JSON summary."""
+        corpus = self.corpus(options)
+        results = {
+            "images": len(corpus),
+            "original_bytes": sum(len(item[1]) for item in corpus),
+            "formats": {},
+        }
+
+        def encode(image_format: str, quality: int) -> tuple:
+            sizes = []
+
+            def operation(index: int) -> None:
+                source = io.BytesIO(corpus[index][1])
+                if options["thumbnail"]:
+                    content = render_thumbnail(
+                        source, options["thumbnail"], image_format, quality
+                    )
+                else:
+                    content = transcode(source, image_format, quality)
+                sizes.append(len(content))
+
+            return operation, sizes
+
+        for image_format in FORMATS:
+            if image_format not in available_formats():
+                continue
+            presets = {}
+            for preset in options["presets"]:
+                quality = quality_for(preset, image_format)
+                operation, sizes = encode(image_format, quality)
+                summary = measure(operation, len(corpus))
+                presets[preset if quality else "lossless"] = {
+                    "quality": quality,
+                    "bytes": sum(sizes),
+                    "ratio": round(sum(sizes) / results["original_bytes"], 3),
+                    "encode_mean_ms": summary["mean_ms"],
+                    "encode_p99_ms": summary["p99_ms"],
+                }
+                if quality is None:
+                    break
+            results["formats"][FORMATS[image_format]] = presets
+        self.stdout.write(json.dumps(results, indent=2))
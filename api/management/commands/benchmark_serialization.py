@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.benchmarking import measure
+from api.models import Image, User
+from api.resolvers import ImageResolver
+from api.serializers import ImageSerializer
+from api.storage import StorageBackend, ThumbnailURLTemplate
+from api.tiers import TierInfo
+
+
+def legacy_thumbnails(url: str, sizes: list) -> dict:
+    """Builds thumbnail URLs splitting image URL once per size."""
+    storage = StorageBackend()
+    return {
+        f"Thumbnail {size}px": storage.url_for_size(url, size)
+        for size in sizes
+    }
+
+
+class Command(BaseCommand):
+    """Measures serializing a list of images with thumbnail URLs."""
+
+    help = (
+        "Compares building thumbnail URLs per size with compiled "
+        "ThumbnailURLTemplate and measures list serialization."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--images", type=int, default=10000)
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[100, 200, 400, 800, 1600]
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options) -> None:
+        """Serializes in-memory images, database is not queried."""
+        sizes = options["sizes"]
+        user = User(pk=1, username="benchmark")
+        images = [
+            Image(
+                pk=index,
+                name=f"image{index}",
+                owner=user,
+                url=f"http://res.cloudinary.com/demo/image/upload/"
+                f"v1/benchmark/image{index}.png",
+            )
+            for index in range(options["images"])
+        ]
+        request = Request(APIRequestFactory().get("/api/image/"))
+        request.user = user
+        resolver = ImageResolver.for_request(request)
+        resolver.account_tier = TierInfo(
+            1, "Enterprise", True, False, tuple(sizes)
+        )
+        template = ThumbnailURLTemplate(sizes)
+
+        def serialize(iteration: int) -> list:
+            return ImageSerializer(
+                images, many=True, context={"request": request}
+            ).data
+
+        results = {
+            "images": len(images),
+            "sizes": len(sizes),
+            "thumbnails_before": measure(
+                lambda iteration: [
+                    legacy_thumbnails(image.url, sizes) for image in images
+                ],
+                options["repeat"],
+            ),
+            "thumbnails_after": measure(
+                lambda iteration: [
+                    template.render(image.url) for image in images
+                ],
+                options["repeat"],
+            ),
+            "list_serialization": measure(serialize, options["repeat"]),
+        }
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,271 @@
+import json
+import platform
+import random
+import statistics
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.benchmarking import compare, measure, sample_png
+from api.links import get_link_cache
+from api.models import ExpiringLink, Image, User
+
+BENCHMARKS = ("list", "detail", "expiring_link", "upload")
+
+
+class Command(BaseCommand):
+    """Runs API benchmarks against a generated dataset."""
+
+    help = (
+        "Measures image list, image detail, expiring link and upload "
+        "requests of users made by generate_dataset, uploading to a storage "
+        "which discards files. Prints JSON results; with --baseline fails "
+        "when p50 or p99 got worse than the thresholds."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=20,
+            help="Unmeasured requests made before each benchmark.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Measure every benchmark this many times.",
+        )
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS
+        )
+        parser.add_argument("--output", help="Write results to the file.")
+        parser.add_argument(
+            "--baseline", help="Results of an earlier run to compare with."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Allowed slowdown of p50, 0.2 is 20%%.",
+        )
+        parser.add_argument(
+            "--p99-threshold",
+            type=float,
+            default=0.5,
+            help="Allowed slowdown of p99, which is noisier.",
+        )
+        parser.add_argument(
+            "--min-delta-ms",
+            type=float,
+            default=1.0,
+            help="Ignore slowdowns smaller than this.",
+        )
+
+    def request(
+        self, client: APIClient, method: str, url: str, **kwargs
+    ) -> object:
+        """Makes request, fails the benchmark on unexpected status."""
+        response = getattr(client, method)(url, **kwargs)
+        if response.status_code not in (200, 201):
+            raise CommandError(
+                f"{method.upper()} {url} returned {response.status_code}"
+            )
+        return response
+
+    def run(self, operation: callable, options: dict) -> dict:
+        """
+        Warms operation up, measures it --repeat times and returns median
+        of every summary field, which steadies p99 between runs.
+        """
+        for iteration in range(options["warmup"]):
+            operation(iteration)
+        summaries = [
+            measure(
+                lambda iteration: operation(
+                    options["warmup"]
+                    + repeat * options["iterations"]
+                    + iteration
+                ),
+                options["iterations"],
+            )
+            for repeat in range(options["repeat"])
+        ]
+        return {
+            field: statistics.median(summary[field] for summary in summaries)
+            for field in summaries[0]
+        }
+
+    def benchmark_list(
+        self, users: list, generator, options: dict
+    ) -> callable:
+        """Returns operation listing a page of images of a random user."""
+        client = APIClient()
+        url = reverse("api:image-list")
+        targets = [generator.choice(users) for _ in range(self.calls)]
+
+        def operation(iteration: int) -> None:
+            client.force_authenticate(user=targets[iteration])
+            self.request(client, "get", url, data=self.page)
+
+        return operation
+
+    def benchmark_detail(
+        self, users: list, generator, options: dict
+    ) -> callable:
+        """Returns operation getting a random image of a random user."""
+        client = APIClient()
+        targets = []
+        for _ in range(self.calls):
+            user = generator.choice(users)
+            images = Image.objects.filter(owner=user).order_by("pk")
+            count = images.count()
+            if count:
+                pk = images.values_list("pk", flat=True)[
+                    generator.randrange(count)
+                ]
+                targets.append((user, reverse("api:image-detail", args=[pk])))
+        if not targets:
+            raise CommandError("Dataset has no images.")
+
+        def operation(iteration: int) -> None:
+            user, url = targets[iteration % len(targets)]
+            client.force_authenticate(user=user)
+            self.request(client, "get", url)
+
+        return operation
+
+    def benchmark_expiring_link(
+        self, users: list, generator, options: dict
+    ) -> callable:
+        """Returns operation resolving a random expiring link."""
+        client = APIClient()
+        links = list(
+            ExpiringLink.objects.filter(image__owner__in=users)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if not links:
+            raise CommandError("Dataset has no expiring links.")
+        targets = [
+            reverse("api:expiringlink-detail", args=[generator.choice(links)])
+            for _ in range(self.calls)
+        ]
+        get_link_cache.cache_clear()
+
+        def operation(iteration: int) -> None:
+            self.request(client, "get", targets[iteration])
+
+        return operation
+
+    def benchmark_upload(
+        self, users: list, generator, options: dict
+    ) -> callable:
+        """Returns operation uploading a new image as a random user."""
+        client = APIClient()
+        url = reverse("api:image-list")
+        targets = [generator.choice(users) for _ in range(self.calls)]
+
+        def operation(iteration: int) -> None:
+            client.force_authenticate(user=targets[iteration])
+            self.request(
+                client,
+                "post",
+                url,
+                data={
+                    "name": f"{options['prefix']}-upload-{iteration}",
+                    "image": sample_png(options["seed"] * 10**6 + iteration),
+                },
+                format="multipart",
+            )
+
+        return operation
+
+    def handle(self, *args, **options) -> None:
+        """Runs selected benchmarks, compares them with the baseline."""
+        prefix = options["prefix"]
+        users = list(
+            User.objects.filter(username__startswith=f"{prefix}-").order_by(
+                "pk"
+            )
+        )
+        if not users:
+            raise CommandError(
+                f"Dataset {prefix} not found, run generate_dataset first."
+            )
+        self.calls = (
+            options["warmup"] + options["iterations"] * options["repeat"]
+        )
+        self.page = {"page_size": options["page_size"]}
+        results = {
+            "meta": {
+                "prefix": prefix,
+                "users": len(users),
+                "images": Image.objects.filter(owner__in=users).count(),
+                "links": ExpiringLink.objects.filter(
+                    image__owner__in=users
+                ).count(),
+                "iterations": options["iterations"],
+                "repeat": options["repeat"],
+                "page_size": options["page_size"],
+                "seed": options["seed"],
+                "vendor": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "benchmarks": {},
+        }
+        try:
+            with override_settings(
+                IMAGE_STORAGE_BACKEND="api.benchmarking.NullStorage",
+                IMAGE_LIST_CACHE="",
+                UPLOAD_ASYNC=False,
+                THUMBNAIL_PRERENDER=False,
+                ALLOWED_HOSTS=["*"],
+            ):
+                for name in BENCHMARKS:
+                    if name not in options["only"]:
+                        continue
+                    operation = getattr(self, f"benchmark_{name}")(
+                        users, random.Random(options["seed"]), options
+                    )
+                    results["benchmarks"][name] = self.run(operation, options)
+        finally:
+            Image.objects.filter(name__startswith=f"{prefix}-upload-").delete()
+        regressions = []
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+            regressions = compare(
+                results["benchmarks"],
+                baseline["benchmarks"],
+                {
+                    "p50_ms": options["threshold"],
+                    "p99_ms": options["p99_threshold"],
+                },
+                options["min_delta_ms"],
+            )
+            results["regressions"] = regressions
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
+        if regressions:
+            raise CommandError(
+                "Performance regressed: "
+                + ", ".join(
+                    f"{item['benchmark']} {item['field']} "
+                    f"{item['baseline']} -> {item['current']}"
+                    for item in regressions
+                )
+            )
@@ -0,0 +1,63 @@
+import io
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+from PIL import Image as PillowImage
+
+from api.benchmarking import measure
+from api.storage import LocalStorage
+from api.thumbnails import DiskLRUCache, ThumbnailEngine
+
+
+def sample_image(width: int, height: int, seed: int) -> io.BytesIO:
+    """Returns JPEG file with a noisy gradient."""
+    image = PillowImage.linear_gradient("L").resize((width, height))
+    noise = PillowImage.effect_noise((width, height), 32 + seed % 32)
+    image = PillowImage.merge("RGB", (image, noise, image.rotate(90)))
+    content = io.BytesIO()
+    image.save(content, "JPEG", quality=90)
+    content.seek(0)
+    content.name = f"sample{seed}.jpg"
+    return content
+
+
+class Command(BaseCommand):
+    """Measures serving thumbnails from cold and warm cache."""
+
+    help = "Measures renders per second and p99 of ThumbnailEngine."
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--images", type=int, default=20)
+        parser.add_argument("--width", type=int, default=3000)
+        parser.add_argument("--height", type=int, default=2000)
+        parser.add_argument("--sizes", type=int, nargs="+", default=[200, 400])
+        parser.add_argument("--warm-iterations", type=int, default=1000)
+
+    def handle(self, *args, **options) -> None:
+        """Renders every size of every image, then reads them again."""
+        with tempfile.TemporaryDirectory() as root:
+            storage = LocalStorage(root, "http://benchmark/")
+            engine = ThumbnailEngine(
+                storage, DiskLRUCache(f"{root}/thumbnails", 2**40)
+            )
+            keys = [
+                storage.upload(
+                    sample_image(options["width"], options["height"], seed),
+                    "benchmark",
+                    f"sample{seed}",
+                )["key"]
+                for seed in range(options["images"])
+            ]
+            jobs = [(key, size) for key in keys for size in options["sizes"]]
+
+            def serve(index: int) -> bytes:
+                with open(engine.get(*jobs[index % len(jobs)]), "rb") as file:
+                    return file.read()
+
+            results = {
+                "cold": measure(serve, len(jobs)),
+                "warm": measure(serve, options["warm_iterations"]),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,104 @@
+import json
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.benchmarking import sample_png, summarize
+from api.models import AccountTier, Image, User
+
+
+class Command(BaseCommand):
+    """Measures concurrent uploads against the configured database."""
+
+    help = (
+        "Uploads images from concurrent threads to LocalStorage in "
+        "a temporary directory, reports uploads per second, p99 and "
+        "failed uploads. Run it once per database configuration."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--uploads", type=int, default=50)
+
+    def handle(self, *args, **options) -> None:
+        """Uploads images, removes created objects afterwards."""
+        tier = AccountTier.objects.create(
+            name="Benchmark", original_size=True, fetch_url=True
+        )
+        user = User.objects.create(
+            username="benchmark-uploads", accountTier=tier
+        )
+        samples, errors = [], []
+        lock = threading.Lock()
+
+        def upload(thread: int) -> None:
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                for index in range(options["uploads"]):
+                    seed = thread * options["uploads"] + index
+                    start = time.perf_counter()
+                    try:
+                        status = client.post(
+                            reverse("api:image-list"),
+                            {
+                                "name": f"benchmark-{user.pk}-{seed}",
+                                "image": sample_png(seed),
+                                "link_expiry_time": 300,
+                            },
+                            format="multipart",
+                        ).status_code
+                    except Exception as error:
+                        status = type(error).__name__
+                    with lock:
+                        samples.append(time.perf_counter() - start)
+                        if status != 201:
+                            errors.append(status)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        try:
+            with tempfile.TemporaryDirectory() as root, override_settings(
+                IMAGE_STORAGE_BACKEND="api.storage.LocalStorage",
+                LOCAL_STORAGE_ROOT=root,
+                THUMBNAIL_PRERENDER=False,
+                UPLOAD_ASYNC=False,
+                ALLOWED_HOSTS=["*"],
+            ):
+                threads = [
+                    threading.Thread(target=upload, args=(thread,))
+                    for thread in range(options["threads"])
+                ]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+        finally:
+            Image.objects.filter(owner=user).delete()
+            user.delete()
+            tier.delete()
+        database = settings.DATABASES["default"]
+        results = {
+            "vendor": connection.vendor,
+            "conn_max_age": database.get("CONN_MAX_AGE", 0),
+            "threads": options["threads"],
+            "uploads": summarize(samples, elapsed),
+            "failed": len(errors),
+            "errors": sorted(set(map(str, errors))),
+        }
+        if connection.vendor == "sqlite":
+            results["journal_mode"] = settings.SQLITE_JOURNAL_MODE
+            results["synchronous"] = settings.SQLITE_SYNCHRONOUS
+            results["busy_timeout"] = settings.SQLITE_BUSY_TIMEOUT
+        self.stdout.write(json.dumps(results, indent=2))
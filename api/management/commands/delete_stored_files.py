@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.deletion import delete_stored_files
+
+
+class Command(BaseCommand):
+    """Deletes files of deleted images from storage."""
+
+    help = "Deletes queued files of deleted images in batches."
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.STORAGE_CLEANUP_BATCH_SIZE,
+            help="Number of files deleted in one storage call.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Deletes due files and prints their number."""
+        deleted = delete_stored_files(batch_size=options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} stored files.")
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.uploads import fail_stale_uploads
+
+
+class Command(BaseCommand):
+    """Marks images whose background uploads were lost as failed."""
+
+    help = (
+        "Marks images pending for longer than any upload can take as "
+        "failed and removes old spooled files."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.UPLOAD_STALE_AFTER,
+            help="Fail images pending for more than given seconds.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Fails stale pending images and prints their number."""
+        failed = fail_stale_uploads(options["older_than"])
+        self.stdout.write(f"Marked {failed} stale uploads as failed.")
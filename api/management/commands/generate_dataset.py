@@ -0,0 +1,63 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.datasets import clear_dataset, generate_dataset
+from api.models import User
+
+
+class Command(BaseCommand):
+    """Generates synthetic users, images and expiring links."""
+
+    help = (
+        "Creates users spread across basic, premium and enterprise tiers "
+        "with images and expiring links for benchmarks. Names are prefixed "
+        "with --prefix and the same --seed generates the same data."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--images", type=int, default=100, help="Images of every user."
+        )
+        parser.add_argument(
+            "--links", type=int, default=10, help="Links of every user."
+        )
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete dataset with the same prefix first.",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Only delete dataset with the prefix.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Generates dataset, prints JSON summary."""
+        prefix = options["prefix"]
+        if options["clear"] or options["delete"]:
+            clear_dataset(prefix)
+            if options["delete"]:
+                return
+        if User.objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(
+                f"Dataset {prefix} exists, pass --clear to replace it."
+            )
+        started = time.perf_counter()
+        counts = generate_dataset(
+            options["users"],
+            options["images"],
+            options["links"],
+            prefix=prefix,
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        counts["seconds"] = round(time.perf_counter() - started, 2)
+        self.stdout.write(json.dumps(counts, indent=2))
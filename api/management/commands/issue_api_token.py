@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.authentication import issue_api_token
+from api.models import User
+
+
+class Command(BaseCommand):
+    """Prints API token of a user."""
+
+    help = (
+        "Prints token authenticating the user with "
+        "'Authorization: Bearer <token>' header."
+    )
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument("username")
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=settings.API_TOKEN_MAX_AGE,
+            help="Seconds the token is valid for.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Issues the token."""
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"User '{options['username']}' does not exist")
+        self.stdout.write(issue_api_token(user, options["max_age"]))
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import purge_expired_links
+
+
+class Command(BaseCommand):
+    """Deletes expired links in batches."""
+
+    help = "Deletes expired links in batches and reports purge rate."
+
+    def add_arguments(self, parser) -> None:
+        """Adds command line arguments."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EXPIRED_LINK_PURGE_BATCH_SIZE,
+            help="Number of links deleted in one statement.",
+        )
+        parser.add_argument(
+            "--retention",
+            type=int,
+            default=settings.EXPIRED_LINK_RETENTION,
+            help="Keep links expired for less than given seconds.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Purges expired links."""
+        started = time.perf_counter()
+        purged = purge_expired_links(
+            options["batch_size"], options["retention"], options["pause"]
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Purged {purged} expired links in {elapsed:.2f}s "
+            f"({purged / elapsed:.1f} rows/s)"
+        )
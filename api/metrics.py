@@ -0,0 +1,388 @@
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+# Metrics of the request handled in the current context, None outside of
+# requests and when metrics are disabled.
+current_request = contextvars.ContextVar("current_request", default=None)
+# Section timed in the current context, nested timers of the same section
+# are not counted twice.
+current_section = contextvars.ContextVar("current_section", default=None)
+
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = tuple(2**power for power in range(10, 27, 2))
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """Returns Prometheus label set, e.g. '{view="media",le="0.1"}'."""
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    """Returns sample value in Prometheus text format."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+
+    Args:
+        name(str): Metric name.
+        documentation(str): Help text.
+        labels(tuple): Optional; Label names.
+    """
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labels: tuple = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        """Adds amount to the counter of given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> list:
+        """Returns lines of the exposition."""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}_total{format_labels(self.labels, labels)} "
+            f"{format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """
+    Histogram with labels and fixed buckets.
+
+    Only the bucket of an observed value is incremented, buckets are made
+    cumulative when they are exposed.
+
+    Args:
+        name(str): Metric name.
+        documentation(str): Help text.
+        labels(tuple): Optional; Label names.
+        buckets(tuple): Optional; Upper bounds of buckets, defaults to
+                        METRICS_LATENCY_BUCKETS.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        buckets: tuple = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(
+            sorted(buckets or settings.METRICS_LATENCY_BUCKETS)
+        ) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        """Records value in the series of given label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> list:
+        """Returns lines of the exposition."""
+        with self._lock:
+            series = sorted(
+                (labels, list(values))
+                for labels, values in self._series.items()
+            )
+        lines = []
+        for labels, values in series:
+            count = 0
+            for bound, bucket in zip(self.buckets, values):
+                count += bucket
+                bucket_labels = format_labels(
+                    self.labels, labels, f'le="{format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            label_set = format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_set} {values[-1]!r}")
+            lines.append(f"{self.name}_count{label_set} {count}")
+        return lines
+
+
+class Registry:
+    """In-process collection of metrics exposed by /metrics."""
+
+    def __init__(self) -> None:
+        self.metrics = {}
+
+    def register(self, metric: Counter or Histogram) -> object:
+        """Adds metric, returns it."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        """Creates and registers Counter."""
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        """Creates and registers Histogram."""
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        """Returns all metrics in Prometheus text format."""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_duration = registry.histogram(
+    "imageapi_request_duration_seconds",
+    "Time spent handling requests.",
+    ("view", "method", "status"),
+)
+section_duration = registry.histogram(
+    "imageapi_request_section_duration_seconds",
+    "Time requests spent in database, storage upload, image validation "
+    "and serialization.",
+    ("view", "section"),
+)
+request_queries = registry.histogram(
+    "imageapi_request_db_queries",
+    "Database queries made by requests.",
+    ("view",),
+    QUERY_BUCKETS,
+)
+upload_duration = registry.histogram(
+    "imageapi_storage_upload_duration_seconds",
+    "Time spent uploading files to image storage.",
+    ("backend",),
+)
+upload_size = registry.histogram(
+    "imageapi_storage_upload_size_bytes",
+    "Sizes of files uploaded to image storage.",
+    ("backend",),
+    BYTES_BUCKETS,
+)
+upload_errors = registry.counter(
+    "imageapi_storage_upload_errors",
+    "Failed uploads to image storage.",
+    ("backend",),
+)
+
+
+class RequestMetrics:
+    """
+    Time and number of operations of one request by section, e.g. "db".
+    Sections may be timed by threads working for the request.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.sections = {}
+        self._lock = threading.Lock()
+
+    def add(self, section: str, seconds: float) -> None:
+        """Adds one operation which took given time to the section."""
+        with self._lock:
+            total, count = self.sections.get(section, (0.0, 0))
+            self.sections[section] = (total + seconds, count + 1)
+
+    def server_timing(self, duration: float) -> str:
+        """
+        Returns Server-Timing header value.
+
+        Args:
+            duration(float): Time of the whole request in seconds.
+
+        Returns:
+            str: Durations of the request and its sections in milliseconds.
+        """
+        metrics = [f"total;dur={duration * 1000:.1f}"]
+        for section, (total, count) in sorted(self.sections.items()):
+            metric = f"{section};dur={total * 1000:.1f}"
+            if section == "db":
+                metric += f';desc="{count} queries"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+
+def timed(section: str) -> callable:
+    """
+    Decorator adding duration of every call to the section of current
+    request's metrics. Outside of measured requests the function is called
+    directly.
+
+    Args:
+        section(str): Section name, e.g. "serialize".
+
+    Returns:
+        callable: Decorator.
+    """
+
+    def decorator(function: callable) -> callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) -> object:
+            metrics = current_request.get()
+            if metrics is None or current_section.get() == section:
+                return function(*args, **kwargs)
+            token = current_section.set(section)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.add(section, time.perf_counter() - start)
+                current_section.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def file_size(file: object) -> int:
+    """Returns size of file object or of file at the path."""
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file)
+    return getattr(file, "size", None) or 0
+
+
+def instrumented_upload(upload: callable) -> callable:
+    """
+    Decorator of StorageBackend.upload() which records its duration and
+    the uploaded bytes by backend, also for background uploads.
+    """
+
+    @functools.wraps(upload)
+    def wrapper(self, file: object, *args, **kwargs) -> dict:
+        if not settings.METRICS_ENABLED:
+            return upload(self, file, *args, **kwargs)
+        backend = type(self).__name__
+        start = time.perf_counter()
+        try:
+            output = upload(self, file, *args, **kwargs)
+        except Exception:
+            upload_errors.inc(1, backend)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            upload_duration.observe(duration, backend)
+            metrics = current_request.get()
+            if metrics is not None:
+                metrics.add("upload", duration)
+        upload_size.observe(file_size(file), backend)
+        return output
+
+    return wrapper
+
+
+def record_query(execute, sql, params, many, context) -> object:
+    """Database execute wrapper timing queries of measured requests."""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add("db", time.perf_counter() - start)
+
+
+def instrument_connection(connection: object) -> None:
+    """Installs record_query() in the connection once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(connection: object, **kwargs) -> None:
+    """Times queries of connections opened by any thread."""
+    if settings.METRICS_ENABLED:
+        instrument_connection(connection)
+
+
+def view_name(request: object) -> str:
+    """Returns name of the URL pattern which matched the request."""
+    match = getattr(request, "resolver_match", None)
+    return "<unmatched>" if match is None else match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Measures latency of every request by view, method and status and time
+    it spent in database queries, storage uploads, image validation and
+    serialization. With METRICS_SERVER_TIMING enabled the measurements are
+    sent in Server-Timing header.
+
+    The middleware removes itself from the chain when METRICS_ENABLED is
+    not set, so disabled metrics cost only the timed() checks.
+    """
+
+    def __init__(self, get_response: callable) -> None:
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request: object) -> HttpResponse:
+        """Measures the request."""
+        for connection in connections.all():
+            instrument_connection(connection)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - metrics.started
+        view = view_name(request)
+        request_duration.observe(
+            duration, view, request.method, str(response.status_code)
+        )
+        request_queries.observe(metrics.sections.get("db", (0, 0))[1], view)
+        for section, (total, _) in metrics.sections.items():
+            section_duration.observe(total, view, section)
+        if settings.METRICS_SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing(duration)
+        return response
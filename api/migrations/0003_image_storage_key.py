@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='storage_key',
+            field=models.CharField(blank=True, max_length=512),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.utils.timezone
+
+BATCH_SIZE = 1000
+
+
+def fill_expires_at(apps, schema_editor):
+    ExpiringLink = apps.get_model("api", "ExpiringLink")
+    while True:
+        links = list(
+            ExpiringLink.objects.filter(expires_at__isnull=True)
+            .only("created_time", "expiration_time")[:BATCH_SIZE]
+        )
+        if not links:
+            break
+        for link in links:
+            link.expires_at = link.created_time + timedelta(
+                seconds=link.expiration_time
+            )
+        ExpiringLink.objects.bulk_update(links, ["expires_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_image_storage_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expiringlink',
+            name='created_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='expiringlink',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_expires_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='expiringlink',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, editable=False),
+        ),
+    ]
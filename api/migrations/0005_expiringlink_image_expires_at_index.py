@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_expiringlink_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expiringlink',
+            name='image',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiring_links', to='api.image'),
+        ),
+        migrations.AddIndex(
+            model_name='expiringlink',
+            index=models.Index(fields=['image', 'expires_at'], name='api_expirin_image_i_9d1092_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_expiringlink_image_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
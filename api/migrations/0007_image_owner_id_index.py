@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_image_content_hash_size'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['owner', 'id'], name='api_image_owner_i_504d52_idx'),
+        ),
+    ]
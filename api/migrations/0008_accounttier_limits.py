@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:15
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_image_owner_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounttier',
+            name='concurrent_uploads',
+            field=models.PositiveIntegerField(blank=True, help_text='Empty for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='accounttier',
+            name='daily_upload_bytes',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Empty for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='accounttier',
+            name='requests_per_minute',
+            field=models.PositiveIntegerField(blank=True, help_text='Empty for no limit.', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_accounttier_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounttier',
+            name='image_quality',
+            field=models.CharField(blank=True, choices=[('low', 'Low'), ('eco', 'Eco'), ('good', 'Good'), ('best', 'Best')], help_text='Empty to serve images in uploaded formats.', max_length=8),
+        ),
+    ]
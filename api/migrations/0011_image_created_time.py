@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:45
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_storagedeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='created_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_time'], name='image_pending_created_idx'),
+        ),
+    ]
@@ -1,8 +1,12 @@
+from datetime import timedelta
+
 from django.conf import settings
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models.deletion import CASCADE
 from django.urls import reverse
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class Thumbnail(models.Model):
@@ -29,12 +33,45 @@ class AccountTier(models.Model):
         thumbnail_sizes (QuerySet): Available thumbnail sizes.
         original_size (bool): Permission to store original size Image objects.
         fetch_url (bool): Permission to make ExpiryLink's
+        requests_per_minute (int): Limit of image API requests of a user,
+            unlimited if empty.
+        concurrent_uploads (int): Limit of uploads of a user running at
+            once, unlimited if empty.
+        daily_upload_bytes (int): Limit of bytes uploaded by a user per
+            day (UTC), unlimited if empty.
+        image_quality (str): Quality preset of images served in formats
+            negotiated with clients, empty to serve uploaded formats.
     """
 
+    QUALITY_CHOICES = [
+        ("low", "Low"),
+        ("eco", "Eco"),
+        ("good", "Good"),
+        ("best", "Best"),
+    ]
+
     name = models.CharField(max_length=32)
     thumbnail_sizes = models.ManyToManyField(Thumbnail)
     original_size = models.BooleanField()
     fetch_url = models.BooleanField()
+    requests_per_minute = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        help_text="Empty for no limit.",
+    )
+    concurrent_uploads = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Empty for no limit."
+    )
+    daily_upload_bytes = models.PositiveBigIntegerField(
+        blank=True, null=True, help_text="Empty for no limit."
+    )
+    image_quality = models.CharField(
+        max_length=8,
+        blank=True,
+        choices=QUALITY_CHOICES,
+        help_text="Empty to serve images in uploaded formats.",
+    )
 
     def __str__(self) -> str:
         """Returns string representation of AccountTier object."""
@@ -56,12 +93,49 @@ class Image(models.Model):
     Attributes:
         owner (object): ForeignKey to User.
         name (str): Name of the image.
-        url (str): URL to  the image.
+        url (str): URL to  the image, empty until upload is finished.
+        storage_key (str): Key of the image file in storage backend.
+        status (str): Upload status of the image.
+        content_hash (str): SHA-256 digest of the stored file's content,
+            including resize transformation applied on upload.
+        size (int): Size of the uploaded file in bytes.
+        created_time (datetime): Date and time the image was created.
     """
 
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (READY, "Ready"),
+        (FAILED, "Failed"),
+    ]
+
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE)
     name = models.CharField(max_length=256, unique=True)
-    url = models.URLField()
+    url = models.URLField(blank=True)
+    storage_key = models.CharField(max_length=512, blank=True, db_index=True)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=READY
+    )
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    created_time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """
+        Index used to list images of a user ordered by id and partial
+        index used to find stale pending uploads.
+        """
+
+        indexes = [
+            models.Index(fields=["owner", "id"]),
+            models.Index(
+                fields=["created_time"],
+                name="image_pending_created_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
 
     def __str__(self) -> str:
         """Returns string representation of Image object."""
@@ -77,17 +151,72 @@ class ExpiringLink(models.Model):
         image (object): ForeignKey to image object.
         created_time (object): Creation date and time.
         expiration_time (int): Expiration time of URL in seconds.
+        expires_at (object): Expiry date and time, computed on save.
     """
 
     url = models.URLField()
-    image = models.ForeignKey(Image, on_delete=CASCADE)
-    created_time = models.DateTimeField(auto_now_add=True)
+    image = models.ForeignKey(
+        Image, on_delete=CASCADE, related_name="expiring_links"
+    )
+    created_time = models.DateTimeField(default=timezone.now, editable=False)
     expiration_time = models.IntegerField()
+    expires_at = models.DateTimeField(db_index=True, editable=False)
+
+    class Meta:
+        """Index used to find newest valid links of images."""
+
+        indexes = [models.Index(fields=["image", "expires_at"])]
 
     def __str__(self) -> str:
         """Returns string representation of ExpiringLink object."""
         return f"{self.url}"
 
+    @staticmethod
+    def compute_expires_at(created_time: object, expiration_time: int):
+        """
+        Returns expiry date and time of a link.
+
+        Args:
+            created_time(object): Creation date and time.
+            expiration_time(int): Expiration time in seconds.
+
+        Returns:
+            object: Expiry date and time.
+        """
+        return created_time + timedelta(seconds=expiration_time)
+
+    def save(self, *args, **kwargs) -> None:
+        """Saves object with expires_at matching its expiration time."""
+        self.expires_at = self.compute_expires_at(
+            self.created_time, self.expiration_time
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {
+            "created_time",
+            "expiration_time",
+        } & set(update_fields):
+            kwargs["update_fields"] = [*update_fields, "expires_at"]
+        super(ExpiringLink, self).save(*args, **kwargs)
+
     def get_url(self) -> str:
         """Returns object's url."""
         return reverse("api:expiringlink-detail", kwargs={"pk": self.pk})
+
+
+class StorageDeletion(models.Model):
+    """
+    Represents stored file queued for deletion.
+
+    Attributes:
+        storage_key (str): Key of the file in storage backend.
+        attempts (int): Number of failed deletion attempts.
+        next_attempt_at (object): Date and time of the next attempt.
+    """
+
+    storage_key = models.CharField(max_length=512)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        """Returns string representation of StorageDeletion object."""
+        return f"{self.storage_key}"
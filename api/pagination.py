@@ -0,0 +1,17 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ImageCursorPagination(CursorPagination):
+    """
+    Keyset pagination for user's Image objects.
+
+    Image objects are always filtered by owner, so ordering by id walks
+    the (owner_id, id) key and each page costs the same no matter how
+    many images the user has.
+    """
+
+    ordering = "id"
+    page_size = settings.IMAGE_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.IMAGE_MAX_PAGE_SIZE
@@ -0,0 +1,111 @@
+from django.db import connection
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import ExpiringLink, User
+from .tiers import TierInfo, get_tier_cache
+
+
+class ImageResolver:
+    """
+    Resolves data shared by every Image serialized within one request.
+
+    Serializing a page of images needs the requesting user's account tier,
+    its thumbnail sizes and the expiring links attached to the images.
+    ImageResolver loads each of them once per request instead of once per
+    serialized Image object, tier data comes from TierCache.
+
+    Args:
+        request(object): Request the resolver is bound to.
+    """
+
+    def __init__(self, request: object) -> None:
+        self.request = request
+        self._links = {}
+
+    @classmethod
+    def for_request(cls, request: object) -> "ImageResolver":
+        """
+        Returns resolver bound to request, creates it on first use.
+
+        Args:
+            request(object): Current request.
+
+        Returns:
+            ImageResolver: Request-scoped resolver.
+        """
+        resolver = getattr(request, "_image_resolver", None)
+        if resolver is None:
+            resolver = cls(request)
+            request._image_resolver = resolver
+        return resolver
+
+    @property
+    def user(self) -> User:
+        """Returns request user."""
+        return self.request.user
+
+    @cached_property
+    def account_tier(self) -> TierInfo:
+        """Returns request user's cached account tier permissions."""
+        return get_tier_cache().for_user(self.user)
+
+    @property
+    def thumbnail_sizes(self) -> list:
+        """Returns thumbnail sizes available for request user."""
+        return list(self.account_tier.thumbnail_sizes)
+
+    def prime_links(self, images: list) -> None:
+        """
+        Loads newest valid expiring link of every passed image with
+        a single query.
+
+        Args:
+            images(list): Image objects which links should be loaded.
+        """
+        missing = [image.pk for image in images if image.pk not in self._links]
+        if not missing:
+            return
+        self._links.update(dict.fromkeys(missing))
+        links = (
+            ExpiringLink.objects.filter(
+                image_id__in=missing, expires_at__gt=timezone.now()
+            )
+            .only("image_id", "url", "expires_at")
+            .order_by("image_id", "-expires_at")
+        )
+        if connection.features.can_distinct_on_fields:
+            links = links.distinct("image_id")
+        for link in links:
+            if self._links[link.image_id] is None:
+                self._links[link.image_id] = link
+
+    def expiring_link(self, image: object) -> ExpiringLink or None:
+        """
+        Returns newest valid expiring link attached to the image.
+
+        Args:
+            image(object): Image object.
+
+        Returns:
+            object: ExpiringLink object or None.
+        """
+        if image.pk not in self._links:
+            self.prime_links([image])
+        return self._links[image.pk]
+
+    def links_valid_until(self) -> float or None:
+        """
+        Returns time when the first of loaded expiring links expires.
+
+        Returns:
+            float: POSIX timestamp or None if no links were loaded.
+        """
+        return min(
+            (
+                link.expires_at.timestamp()
+                for link in self._links.values()
+                if link is not None
+            ),
+            default=None,
+        )
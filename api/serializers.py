@@ -1,12 +1,113 @@
-import cloudinary.uploader
+import hashlib
+import os
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.core.validators import (
     FileExtensionValidator,
     MaxValueValidator,
     MinValueValidator,
 )
+from django.db import models, transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from .dedup import find_duplicates, upload_hash
+from .deletion import delete_objects
+from .fields import ImageHeaderField
+from .formats import parse_format
+from .links import sign_link
+from .list_cache import invalidate_image_lists
+from .metrics import timed
+from .models import ExpiringLink, Image
+from .resolvers import ImageResolver
+from .storage import ThumbnailURLTemplate, get_storage, get_url_template
+from .thumbnails import prerender_thumbnails
+from .throttling import hold_upload_limits
+from .tiers import get_tier_cache
+from .uploads import UploadQueueFull, get_upload_queue, spool_file
+
+
+def get_upload_options(user: object, name: str) -> dict:
+    """
+    Returns upload options, checks user's account tier permissions
+    to upload original size image file or thumbnail.
+
+    Args:
+        user(object): Image owner.
+        name(str): Name of the image.
+
+    Returns:
+        dict: Options passed to StorageBackend.upload().
+    """
+    options = {"folder": user.username, "name": name}
+    if not get_tier_cache().for_user(user).original_size:
+        options["size"] = 200
+    return options
+
 
-from .models import ExpiringLink, Image, User
+def extract_archive(archive: object, max_files: int, max_size: int) -> list:
+    """
+    Extracts files from ZIP archive to spooled temporary files,
+    hashes their content on the way. Limits are checked against the
+    archive's directory before anything is extracted, reading stops as
+    soon as extracted files get bigger than allowed.
+
+    Args:
+        archive(object): Uploaded ZIP archive.
+        max_files(int): Maximum number of files in the archive.
+        max_size(int): Maximum total size of extracted files in bytes.
+
+    Raises:
+        ValidationError: If archive has too many or too big files.
+
+    Returns:
+        list: Extracted files.
+    """
+    too_big = serializers.ValidationError(
+        {"archive": f"Extracted files can have at most {max_size} bytes."}
+    )
+    files = []
+    with zipfile.ZipFile(archive) as zip_file:
+        infos = [info for info in zip_file.infolist() if not info.is_dir()]
+        if len(infos) > max_files:
+            raise serializers.ValidationError(
+                {"archive": f"Archive can have at most {max_files} files."}
+            )
+        if sum(info.file_size for info in infos) > max_size:
+            raise too_big
+        extracted = 0
+        try:
+            for info in infos:
+                content = tempfile.SpooledTemporaryFile(
+                    max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+                )
+                file = UploadedFile(
+                    content,
+                    os.path.basename(info.filename),
+                    size=info.file_size,
+                )
+                files.append(file)
+                digest = hashlib.sha256()
+                with zip_file.open(info) as member:
+                    for chunk in iter(lambda: member.read(64 * 1024), b""):
+                        extracted += len(chunk)
+                        if extracted > max_size:
+                            raise too_big
+                        digest.update(chunk)
+                        content.write(chunk)
+                content.seek(0)
+                file.content_hash = digest.hexdigest()
+        except BaseException:
+            for file in files:
+                file.close()
+            raise
+    return files
 
 
 class ExpiringLinkSerializer(serializers.Serializer):
@@ -19,15 +120,47 @@ class ExpiringLinkSerializer(serializers.Serializer):
 
     url = serializers.URLField()
 
+    @timed("serialize")
+    def to_representation(self, instance: object) -> dict:
+        """Serializes the link."""
+        return super(ExpiringLinkSerializer, self).to_representation(instance)
+
+
+class ImageListSerializer(serializers.ListSerializer):
+    """
+    List serializer for Image objects, lets child serializer load data
+    shared by the whole page at once instead of once per Image object.
+    """
+
+    @timed("serialize")
+    def to_representation(self, data: object) -> list:
+        """
+        Prepares child serializer for all images, serializes them.
+
+        Args:
+            data(object): Image objects to serialize.
+
+        Returns:
+            list: Serialized data.
+        """
+        images = data.all() if isinstance(data, models.Manager) else data
+        images = list(images)
+        self.child.prepare(images)
+        return super(ImageListSerializer, self).to_representation(images)
+
 
 class ImageSerializer(serializers.ModelSerializer):
     """Image model serializer for AccountTier's with fetch_url==False.
 
+    Read requests may pass comma separated ?fields= query parameter
+    to receive only chosen model fields and extras ("thumbnails",
+    "expiring_link"), extras which were not requested are not built.
+
     Args:
         image(file): Passes image file to serializer.
     """
 
-    image = serializers.ImageField(
+    image = ImageHeaderField(
         allow_empty_file=False,
         write_only=True,
         validators=[FileExtensionValidator(["jpg", "png"])],
@@ -41,11 +174,99 @@ class ImageSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             "url": {"read_only": True},
         }
+        list_serializer_class = ImageListSerializer
+
+    @property
+    def resolver(self) -> ImageResolver:
+        """Returns resolver bound to current request."""
+        return ImageResolver.for_request(self.context["request"])
 
+    @cached_property
+    def requested_fields(self) -> set or None:
+        """Returns fields passed in ?fields= or None if all are requested."""
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        fields = request.query_params.get("fields")
+        if not fields:
+            return None
+        return {field.strip() for field in fields.split(",")}
+
+    def is_requested(self, field: str) -> bool:
+        """
+        Checks if field should be present in serialized data.
+
+        Args:
+            field(str): Field or extra name.
+
+        Returns:
+            bool: True if field was requested.
+        """
+        return self.requested_fields is None or field in self.requested_fields
+
+    def get_fields(self) -> dict:
+        """Returns serializer fields without not requested readable ones."""
+        fields = super(ImageSerializer, self).get_fields()
+        if self.requested_fields is not None:
+            for name, field in list(fields.items()):
+                if not field.write_only and name not in self.requested_fields:
+                    del fields[name]
+        return fields
+
+    def get_thumbnail_sizes(self) -> list:
+        """Returns thumbnail sizes the request user's account tier permits."""
+        if self.resolver.account_tier.name == "Basic":
+            return []
+        return self.resolver.thumbnail_sizes
+
+    def get_format_options(self) -> str:
+        """
+        Returns format and quality transformation of image URLs. Format
+        passed in ?image_format= is used as it is if the storage backend
+        serves it, users of tiers with a quality preset get the format
+        negotiated when images are fetched.
+        """
+        request = self.context.get("request")
+        requested = (
+            request.query_params.get("image_format") if request else None
+        )
+        quality = self.resolver.account_tier.image_quality
+        options = []
+        if requested and requested != "auto":
+            try:
+                parse_format(requested, get_storage().supported_formats())
+            except ValueError:
+                raise serializers.ValidationError(
+                    {"image_format": f"Unsupported image format: {requested}"}
+                )
+            options.append(f"f_{requested.lower()}")
+        elif requested or quality:
+            options.append("f_auto")
+        if quality:
+            options.append(f"q_auto:{quality}")
+        return ",".join(options)
+
+    @cached_property
+    def url_template(self) -> ThumbnailURLTemplate:
+        """Returns compiled template of image URLs for request user."""
+        return get_url_template(
+            tuple(self.get_thumbnail_sizes()), self.get_format_options()
+        )
+
+    def prepare(self, images: list) -> None:
+        """
+        Loads data needed to serialize all passed images.
+
+        Args:
+            images(list): Image objects which are going to be serialized.
+        """
+
+    @timed("serialize")
     def to_representation(self, instance: object) -> dict:
         """
         Adds extra thumbnail sizes for users with appropriate
-        account tier permits.
+        account tier permits. Images which are not uploaded yet get their
+        upload status and status URL instead.
 
         Args:
             instance(object): Image object to serialize.
@@ -54,24 +275,27 @@ class ImageSerializer(serializers.ModelSerializer):
             dict: Serialized data.
         """
         ret = super(ImageSerializer, self).to_representation(instance)
-        user = User.objects.get(id=self.context["request"].user.id)
-        if user.accountTier.name != "Basic":
-            thumbnails = user.accountTier.thumbnail_sizes.all()
-            for thumbnail in thumbnails:
-                size = thumbnail.size
-                name = f"Thumbnail {size}px"
-                first_url_part = ret["url"].split("upload/", 1)[0]
-                thumbnail_size = f"upload/w_{size},h_{size}/"
-                second_url_part = ret["url"].split("upload/", 1)[1]
-                url = first_url_part + thumbnail_size + second_url_part
-                extra_ret = {name: url}
-                ret.update(extra_ret)
+        if instance.status != Image.READY:
+            ret["status"] = instance.status
+            ret["status_url"] = self.context["request"].build_absolute_uri(
+                reverse("api:image-detail", kwargs={"pk": instance.pk})
+            )
+            return ret
+        if "url" in ret:
+            ret["url"] = self.url_template.original(instance.url)
+        if not self.is_requested("thumbnails"):
+            return ret
+        ret.update(self.url_template.render(instance.url))
         return ret
 
     def create(self, validated_data: dict) -> object or None:
         """
         Creates Image object, checks user's account tier permissions
         to upload original size image file or thumbnail.
+        Content already stored for the user (or for anyone, with global
+        IMAGE_DEDUP_SCOPE) is reused instead of being uploaded again.
+        With UPLOAD_ASYNC setting enabled the file is uploaded in the
+        background and Image object is returned in pending state.
 
         Args:
             validated_data(dict): Data to serialize.
@@ -81,32 +305,50 @@ class ImageSerializer(serializers.ModelSerializer):
         """
         if not self.is_valid():
             return None
-        user = User.objects.get(id=self.context["request"].user.id)
-        if user.accountTier.original_size:
-            output = cloudinary.uploader.upload(
-                self.context["request"].FILES["image"],
-                folder=user.username,
-                public_id=self.validated_data["name"],
-                overwrite=True,
-            )
-        else:
-            output = cloudinary.uploader.upload(
-                self.context["request"].FILES["image"],
-                folder=user.username,
-                public_id=self.validated_data["name"],
-                height=200,
-                width=200,
-                crop="scale",
-                overwrite=True,
-            )
+        user = self.resolver.user
+        file = self.context["request"].FILES["image"]
+        options = get_upload_options(user, self.validated_data["name"])
+        content_hash = upload_hash(file, options)
         new_image = Image(
-            name=self.validated_data["name"], owner=user, url=output["url"]
+            name=self.validated_data["name"],
+            owner=user,
+            content_hash=content_hash,
+            size=file.size,
         )
+        duplicate = find_duplicates(user, [content_hash]).get(content_hash)
+        if duplicate is not None:
+            new_image.url = duplicate.url
+            new_image.storage_key = duplicate.storage_key
+            new_image.save()
+            return new_image
+        if settings.UPLOAD_ASYNC:
+            path = spool_file(file)
+            new_image.status = Image.PENDING
+            new_image.save()
+            try:
+                future = get_upload_queue().submit(
+                    new_image.pk, path, options, self.get_thumbnail_sizes()
+                )
+            except UploadQueueFull:
+                # Nothing will upload the file, free the image name.
+                new_image.delete()
+                os.remove(path)
+                raise
+            release = hold_upload_limits()
+            if release is not None:
+                future.add_done_callback(
+                    lambda future: release(failed=bool(future.exception()))
+                )
+            return new_image
+        output = get_storage().upload(file, **options)
+        new_image.url = output["url"]
+        new_image.storage_key = output["key"]
         new_image.save()
+        prerender_thumbnails(output["key"], self.get_thumbnail_sizes())
         return new_image
 
 
-class ImageLinkSerializer(serializers.ModelSerializer):
+class ImageLinkSerializer(ImageSerializer):
     """
     Image model serializer for AccountTier's with fetch_url==True.
 
@@ -116,26 +358,28 @@ class ImageLinkSerializer(serializers.ModelSerializer):
                      to image which expires after given value in seconds.
     """
 
-    image = serializers.ImageField(
-        allow_empty_file=False,
-        write_only=True,
-        validators=[FileExtensionValidator(["jpg", "png"])],
-    )
     link_expiry_time = serializers.IntegerField(
         required=False,
         write_only=True,
         validators=[MaxValueValidator(30000), MinValueValidator(300)],
     )
 
-    class Meta:
+    class Meta(ImageSerializer.Meta):
         """Serializer based on Image model."""
 
-        model = Image
         fields = ["name", "url", "image", "link_expiry_time"]
-        extra_kwargs = {
-            "url": {"read_only": True},
-        }
 
+    def prepare(self, images: list) -> None:
+        """
+        Loads expiring links of all passed images with a single query.
+
+        Args:
+            images(list): Image objects which are going to be serialized.
+        """
+        if self.is_requested("expiring_link"):
+            self.resolver.prime_links(images)
+
+    @timed("serialize")
     def to_representation(self, instance: object) -> dict:
         """
         Adds extra thumbnail sizes for users with appropriate
@@ -148,28 +392,24 @@ class ImageLinkSerializer(serializers.ModelSerializer):
             dict: Serialized data.
         """
         ret = super(ImageLinkSerializer, self).to_representation(instance)
-        user = User.objects.get(id=self.context["request"].user.id)
-        if user.accountTier.name != "Basic":
-            thumbnails = user.accountTier.thumbnail_sizes.all()
-            for thumbnail in thumbnails:
-                size = thumbnail.size
-                name = f"Thumbnail {size}px"
-                first_url_part = ret["url"].split("upload/", 1)[0]
-                thumbnail_size = f"upload/w_{size},h_{size}/"
-                second_url_part = ret["url"].split("upload/", 1)[1]
-                url = first_url_part + thumbnail_size + second_url_part
-                extra_ret = {name: url}
-                ret.update(extra_ret)
-        try:
-            expiring_link = ExpiringLink.objects.get(url=ret["url"])
+        if instance.status != Image.READY:
+            return ret
+        if not self.is_requested("expiring_link"):
+            return ret
+        expiring_link = self.resolver.expiring_link(instance)
+        if expiring_link is not None:
+            if settings.EXPIRING_LINK_MODE == "signed":
+                path = reverse(
+                    "api:signedlink-detail",
+                    kwargs={"token": sign_link(expiring_link)},
+                )
+            else:
+                path = expiring_link.get_url()
             expiring_link_url = (
-                self.context["request"].build_absolute_uri("/")[:-1]
-                + expiring_link.get_url()  # noqa
+                self.context["request"].build_absolute_uri("/")[:-1] + path
             )
             extra_ret = {"Expiring link": expiring_link_url}
             ret.update(extra_ret)
-        except:  # noqa
-            pass
         return ret
 
     def create(self, validated_data: dict) -> object or None:
@@ -184,37 +424,273 @@ class ImageLinkSerializer(serializers.ModelSerializer):
         Returns:
             object: Image object or None.
         """
-        if not self.is_valid():
-            return None
-        user = User.objects.get(id=self.context["request"].user.id)
-        if user.accountTier.original_size:
-            output = cloudinary.uploader.upload(
-                self.context["request"].FILES["image"],
-                folder=user.username,
-                public_id=self.validated_data["name"],
-                overwrite=True,
-            )
-        else:
-            output = cloudinary.uploader.upload(
-                self.context["request"].FILES["image"],
-                folder=user.username,
-                public_id=self.validated_data["name"],
-                height=200,
-                width=200,
-                crop="scale",
-                overwrite=True,
-            )
-        new_image = Image(
-            name=self.validated_data["name"], owner=user, url=output["url"]
-        )
-        new_image.save()
-        try:
+        new_image = super(ImageLinkSerializer, self).create(validated_data)
+        if new_image is not None and "link_expiry_time" in validated_data:
             expiring_link = ExpiringLink(
                 image=new_image,
                 url=new_image.url,
                 expiration_time=self.validated_data["link_expiry_time"],
             )
             expiring_link.save()
-        except:  # noqa
-            pass
         return new_image
+
+
+class BatchUploadSerializer(serializers.Serializer):
+    """
+    Serializer uploading many images at once.
+
+    Images are validated up front, uploaded concurrently and created with
+    a single query. Image names are taken from file names without
+    extensions.
+
+    Args:
+        images(list): Optional; Image files.
+        archive(file): Optional; ZIP archive with image files.
+        link_expiry_time(int): Optional; If passed and account tier
+                     permits, creates expiring links to all images.
+    """
+
+    images = serializers.ListField(
+        child=serializers.FileField(allow_empty_file=False), required=False
+    )
+    archive = serializers.FileField(
+        required=False, validators=[FileExtensionValidator(["zip"])]
+    )
+    link_expiry_time = serializers.IntegerField(
+        required=False,
+        validators=[MaxValueValidator(30000), MinValueValidator(300)],
+    )
+
+    def validate(self, attrs: dict) -> dict:
+        """Checks that images or archive with at most 500 files was sent."""
+        files = list(attrs.get("images", []))
+        if "archive" in attrs:
+            try:
+                files += extract_archive(
+                    attrs["archive"],
+                    max_files=settings.BATCH_UPLOAD_MAX_FILES - len(files),
+                    max_size=settings.BATCH_UPLOAD_MAX_ARCHIVE_SIZE,
+                )
+            except zipfile.BadZipFile:
+                raise serializers.ValidationError(
+                    {"archive": "Invalid ZIP archive."}
+                )
+        if not files:
+            raise serializers.ValidationError("No images provided.")
+        if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+            raise serializers.ValidationError(
+                f"At most {settings.BATCH_UPLOAD_MAX_FILES} images "
+                "can be uploaded at once."
+            )
+        attrs["files"] = files
+        return attrs
+
+    @cached_property
+    def image_serializer(self) -> ImageSerializer:
+        """Returns serializer used to represent created images."""
+        if self.resolver.account_tier.fetch_url:
+            return ImageLinkSerializer(context=self.context)
+        return ImageSerializer(context=self.context)
+
+    @property
+    def resolver(self) -> ImageResolver:
+        """Returns resolver bound to current request."""
+        return ImageResolver.for_request(self.context["request"])
+
+    def validate_files(self, files: list) -> tuple:
+        """
+        Validates every file, collects errors instead of raising them.
+
+        Args:
+            files(list): Uploaded files.
+
+        Returns:
+            tuple: Dict of valid files by image name and list of errors.
+        """
+        image_field = ImageHeaderField(
+            validators=[FileExtensionValidator(["jpg", "png"])]
+        )
+        valid, errors = {}, []
+        for file in files:
+            name = os.path.splitext(os.path.basename(file.name))[0][:256]
+            try:
+                image_field.run_validation(file)
+            except serializers.ValidationError as error:
+                errors.append({"name": name, "errors": error.detail})
+                continue
+            if name in valid:
+                errors.append(
+                    {"name": name, "errors": ["Duplicated image name."]}
+                )
+                continue
+            valid[name] = file
+        taken = Image.objects.filter(name__in=valid).values_list(
+            "name", flat=True
+        )
+        for name in taken:
+            del valid[name]
+            errors.append(
+                {"name": name, "errors": ["Image with this name exists."]}
+            )
+        return valid, errors
+
+    def create(self, validated_data: dict) -> list:
+        """
+        Uploads valid images concurrently and creates Image objects.
+        Files with the same content are uploaded once and content which
+        is already stored is not uploaded at all.
+
+        Args:
+            validated_data(dict): Validated files and link expiry time.
+
+        Returns:
+            list: Serialized image or errors for every file.
+        """
+        user = self.resolver.user
+        valid, errors = self.validate_files(validated_data["files"])
+        results = [{"status": "error", **error} for error in errors]
+        items = [
+            {"file": file, **get_upload_options(user, name)}
+            for name, file in valid.items()
+        ]
+        hashes = [upload_hash(item["file"], item) for item in items]
+        stored = {
+            content_hash: {"url": image.url, "key": image.storage_key}
+            for content_hash, image in find_duplicates(user, hashes).items()
+        }
+        dedup = settings.IMAGE_DEDUP_SCOPE != "none"
+        upload_keys = [
+            content_hash if dedup else item["name"]
+            for item, content_hash in zip(items, hashes)
+        ]
+        uploads = {}
+        for item, content_hash, upload_key in zip(items, hashes, upload_keys):
+            if content_hash not in stored:
+                uploads.setdefault(upload_key, item)
+        outputs = dict(
+            zip(uploads, get_storage().upload_many(list(uploads.values())))
+        )
+        new_images = []
+        for item, content_hash, upload_key in zip(items, hashes, upload_keys):
+            output = stored.get(content_hash) or outputs[upload_key]
+            if isinstance(output, Exception):
+                results.append(
+                    {
+                        "name": item["name"],
+                        "status": "error",
+                        "errors": [f"Upload failed: {output}"],
+                    }
+                )
+                continue
+            new_images.append(
+                Image(
+                    name=item["name"],
+                    owner=user,
+                    url=output["url"],
+                    storage_key=output["key"],
+                    content_hash=content_hash,
+                    size=item["file"].size,
+                )
+            )
+        Image.objects.bulk_create(new_images, ignore_conflicts=True)
+        created = list(
+            Image.objects.filter(
+                owner=user, name__in=[image.name for image in new_images]
+            )
+        )
+        created_names = {image.name for image in created}
+        for image in new_images:
+            if image.name not in created_names:
+                results.append(
+                    {
+                        "name": image.name,
+                        "status": "error",
+                        "errors": ["Image with this name exists."],
+                    }
+                )
+        if "link_expiry_time" in validated_data and (
+            self.resolver.account_tier.fetch_url
+        ):
+            self.create_links(created, validated_data["link_expiry_time"])
+        invalidate_image_lists(user_ids=[user.pk])
+        thumbnail_sizes = self.image_serializer.get_thumbnail_sizes()
+        for storage_key in {image.storage_key for image in created}:
+            prerender_thumbnails(storage_key, thumbnail_sizes)
+        self.image_serializer.prepare(created)
+        results += [
+            {
+                "status": "created",
+                **self.image_serializer.to_representation(image),
+            }
+            for image in created
+        ]
+        return results
+
+    def create_links(self, images: list, expiration_time: int) -> None:
+        """
+        Creates expiring links to all images with a single query.
+
+        Args:
+            images(list): Image objects.
+            expiration_time(int): Expiration time of links in seconds.
+        """
+        created_time = timezone.now()
+        ExpiringLink.objects.bulk_create(
+            ExpiringLink(
+                image=image,
+                url=image.url,
+                created_time=created_time,
+                expiration_time=expiration_time,
+                expires_at=ExpiringLink.compute_expires_at(
+                    created_time, expiration_time
+                ),
+            )
+            for image in images
+        )
+
+
+class BatchDeleteSerializer(serializers.Serializer):
+    """
+    Serializer deleting many images of the request user at once.
+
+    Args:
+        ids(list): IDs of images to delete.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+
+    def validate_ids(self, ids: list) -> list:
+        """Checks that at most BATCH_DELETE_MAX_IMAGES ids were sent."""
+        if len(ids) > settings.BATCH_DELETE_MAX_IMAGES:
+            raise serializers.ValidationError(
+                f"At most {settings.BATCH_DELETE_MAX_IMAGES} images "
+                "can be deleted at once."
+            )
+        return sorted(set(ids))
+
+    def create(self, validated_data: dict) -> dict:
+        """
+        Deletes user's images with their expiring links in a transaction,
+        their files are removed from storage in the background.
+
+        Args:
+            validated_data(dict): Validated image ids.
+
+        Returns:
+            dict: IDs of deleted images and of images which were not found.
+        """
+        ids = validated_data["ids"]
+        images = Image.objects.filter(
+            owner=self.context["request"].user, pk__in=ids
+        )
+        with transaction.atomic():
+            deleted = set(
+                images.select_for_update().values_list("pk", flat=True)
+            )
+            delete_objects(images.filter(pk__in=deleted))
+        return {
+            "deleted": sorted(deleted),
+            "not_found": [pk for pk in ids if pk not in deleted],
+        }
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import get_principal_cache
+from .deletion import schedule_deletion
+from .links import get_link_cache, revoke_link
+from .list_cache import invalidate_image_lists
+from .models import AccountTier, ExpiringLink, Image, Thumbnail, User
+from .tiers import get_tier_cache
+
+
+@receiver([post_save, post_delete], sender=ExpiringLink)
+def invalidate_expiring_link(sender, instance: ExpiringLink, **kwargs) -> None:
+    """Removes saved or deleted ExpiringLink from link cache."""
+    get_link_cache().invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=ExpiringLink)
+def revoke_signed_link(sender, instance: ExpiringLink, **kwargs) -> None:
+    """Adds signed link of deleted ExpiringLink to the revocation list."""
+    revoke_link(instance)
+
+
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_owner_list(sender, instance: Image, **kwargs) -> None:
+    """Drops cached image lists of saved or deleted Image's owner."""
+    invalidate_image_lists(user_ids=[instance.owner_id])
+
+
+@receiver(post_delete, sender=Image)
+def delete_stored_file(sender, instance: Image, **kwargs) -> None:
+    """
+    Queues deletion of deleted Image's file, also when it is deleted by
+    admin or together with its owner.
+    """
+    schedule_deletion([instance.storage_key])
+
+
+@receiver([post_save, post_delete], sender=ExpiringLink)
+def invalidate_link_owner_list(
+    sender, instance: ExpiringLink, **kwargs
+) -> None:
+    """
+    Drops cached image lists of saved or deleted ExpiringLink's owner.
+    Deleted links which already expired are not listed, so they are
+    skipped.
+    """
+    deleted = kwargs["signal"] is post_delete
+    if deleted and instance.expires_at <= timezone.now():
+        return
+    if ExpiringLink.image.is_cached(instance):
+        invalidate_image_lists(user_ids=[instance.image.owner_id])
+    else:
+        invalidate_image_lists(image_ids=[instance.image_id])
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_principal(sender, instance: User, **kwargs) -> None:
+    """Drops cached user authenticated by API tokens."""
+    get_principal_cache().invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=AccountTier)
+@receiver([post_save, post_delete], sender=Thumbnail)
+@receiver(m2m_changed, sender=AccountTier.thumbnail_sizes.through)
+def invalidate_tiers(sender, **kwargs) -> None:
+    """Drops cached tier permissions when tiers or thumbnails change."""
+    if kwargs.get("action", "post_").startswith("post_"):
+        get_tier_cache().invalidate()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection: object, **kwargs) -> None:
+    """
+    Sets journal mode, synchronous mode and busy timeout of new SQLite
+    connections, so readers do not block writers and concurrent writers
+    wait for the lock instead of failing.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT:d}"
+        )
+        if settings.SQLITE_JOURNAL_MODE:
+            cursor.execute(
+                f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}"
+            )
+        if settings.SQLITE_SYNCHRONOUS:
+            cursor.execute(
+                f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}"
+            )
@@ -0,0 +1,390 @@
+import contextvars
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import cloudinary.api
+import cloudinary.uploader
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from PIL import Image as PillowImage
+
+from .formats import FORMATS, available_formats
+from .metrics import instrumented_upload
+
+
+class ThumbnailURLTemplate:
+    """
+    Builds thumbnail URLs of a stored image for a fixed set of sizes.
+
+    URL parts added for every size are formatted once, when the template
+    is compiled, and every image URL is split only once.
+
+    Args:
+        sizes(tuple): Thumbnail sizes in pixels.
+        transformation(str): Optional; Format of transformation added
+                             after "upload/", gets size argument.
+        options(str): Optional; Format and quality transformation, e.g.
+                      "f_auto,q_auto:eco", added to thumbnails and to the
+                      original image.
+    """
+
+    def __init__(
+        self,
+        sizes: tuple,
+        transformation: str = "w_{size},h_{size}",
+        options: str = "",
+    ) -> None:
+        self.sizes = tuple(sizes)
+        if options:
+            transformation = f"{transformation},{options}"
+        self.parts = [
+            (
+                f"Thumbnail {size}px",
+                f"upload/{transformation}/".format(size=size),
+            )
+            for size in self.sizes
+        ]
+        self.original_part = f"upload/{options}/" if options else None
+
+    def render(self, url: str) -> dict:
+        """
+        Returns thumbnail URLs of stored image.
+
+        Args:
+            url(str): Stored image's URL.
+
+        Returns:
+            dict: Thumbnail URL by "Thumbnail {size}px" name.
+        """
+        prefix, _, suffix = url.partition("upload/")
+        return {name: prefix + part + suffix for name, part in self.parts}
+
+    def original(self, url: str) -> str:
+        """
+        Returns URL of the original image with format and quality options.
+
+        Args:
+            url(str): Stored image's URL.
+
+        Returns:
+            str: Image URL.
+        """
+        if self.original_part is None:
+            return url
+        prefix, _, suffix = url.partition("upload/")
+        return prefix + self.original_part + suffix
+
+
+@lru_cache(maxsize=256)
+def get_url_template(sizes: tuple, options: str = "") -> ThumbnailURLTemplate:
+    """
+    Returns compiled thumbnail URL template shared by requests of all
+    users with the same thumbnail sizes and format options.
+
+    Args:
+        sizes(tuple): Thumbnail sizes in pixels.
+        options(str): Optional; Format and quality transformation.
+
+    Returns:
+        ThumbnailURLTemplate: Compiled template.
+    """
+    return ThumbnailURLTemplate(sizes, options=options)
+
+
+class StorageBackend:
+    """
+    Interface of backends which store uploaded image files.
+
+    Uploads return dict with "url" of the stored file and "key" which
+    identifies it in the backend and is used to delete it.
+    """
+
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        """
+        Stores image file.
+
+        Args:
+            file(object): File object or path to the file.
+            folder(str): Folder of the file, user's username.
+            name(str): Name of the image.
+            size(int): Optional; If passed image is scaled to size x size
+                       pixels before it is stored.
+
+        Returns:
+            dict: Stored file's "url" and "key".
+        """
+        raise NotImplementedError()
+
+    def upload_many(self, items: list, parallelism: int = None) -> list:
+        """
+        Stores many image files concurrently.
+
+        Args:
+            items(list): Dicts with upload() keyword arguments.
+            parallelism(int): Optional; Maximal number of concurrent
+                              uploads, defaults to BATCH_UPLOAD_PARALLELISM.
+
+        Returns:
+            list: upload() result for every item in the same order,
+                  or exception raised while uploading the item.
+        """
+        parallelism = parallelism or settings.BATCH_UPLOAD_PARALLELISM
+
+        def upload(item: dict) -> dict or Exception:
+            try:
+                return self.upload(**item)
+            except Exception as error:
+                return error
+
+        # Every upload runs in a copy of the caller's context, so it is
+        # counted in the metrics of the request.
+        contexts = [contextvars.copy_context() for _ in items]
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            return list(
+                executor.map(
+                    lambda context, item: context.run(upload, item),
+                    contexts,
+                    items,
+                )
+            )
+
+    def delete(self, key: str) -> None:
+        """
+        Removes stored file.
+
+        Args:
+            key(str): Key returned by upload().
+        """
+        raise NotImplementedError()
+
+    def delete_many(self, keys: list) -> None:
+        """
+        Removes many stored files.
+
+        Args:
+            keys(list): Keys returned by upload().
+        """
+        for key in keys:
+            self.delete(key)
+
+    def supported_formats(self) -> frozenset:
+        """
+        Returns Pillow names of formats stored images can be served in
+        with f_<format> URL transformation. Cloudinary style backends
+        transform images remotely and serve all of them.
+        """
+        return frozenset(FORMATS)
+
+    def url_for_size(self, url: str, size: int) -> str:
+        """
+        Returns URL of the thumbnail of stored image, made by adding
+        Cloudinary style resize transformation after "upload/".
+
+        Args:
+            url(str): Stored image's URL.
+            size(int): Thumbnail size in pixels.
+
+        Returns:
+            str: Thumbnail URL.
+        """
+        first_url_part, second_url_part = url.split("upload/", 1)
+        return f"{first_url_part}upload/w_{size},h_{size}/{second_url_part}"
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Stores images in Cloudinary, thumbnails are URL transformations.
+
+    Files bigger than CLOUDINARY_CHUNK_SIZE are sent in chunks of that
+    size, so they are never read to memory as a whole.
+
+    With deduplication enabled a stored file can be shared by many images,
+    so files are named after their content digest, like LocalStorage
+    paths, and uploading an image name again never replaces content of
+    other images.
+    """
+
+    chunk_size = 64 * 1024
+
+    def public_id(self, file: object, name: str, size: int = None) -> str:
+        """
+        Returns public id of uploaded file.
+
+        Args:
+            file(object): File object or path to the file.
+            name(str): Name of the image.
+            size(int): Optional; Size the image is scaled to.
+
+        Returns:
+            str: Image name, or SHA-256 digest of the file (with size it
+                 is scaled to) when deduplication is enabled.
+        """
+        if settings.IMAGE_DEDUP_SCOPE == "none":
+            return name
+        content_hash = getattr(file, "content_hash", None)
+        if content_hash is None:
+            digest = hashlib.sha256()
+            if isinstance(file, (str, os.PathLike)):
+                with open(file, "rb") as source:
+                    for chunk in iter(
+                        lambda: source.read(self.chunk_size), b""
+                    ):
+                        digest.update(chunk)
+            else:
+                file.seek(0)
+                for chunk in iter(lambda: file.read(self.chunk_size), b""):
+                    digest.update(chunk)
+            content_hash = digest.hexdigest()
+        return f"{content_hash}_{size}" if size else content_hash
+
+    @instrumented_upload
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        """Uploads image file to Cloudinary."""
+        options = {
+            "folder": folder,
+            "public_id": self.public_id(file, name, size),
+            "overwrite": settings.IMAGE_DEDUP_SCOPE == "none",
+        }
+        if size:
+            options.update(height=size, width=size, crop="scale")
+        if isinstance(file, (str, os.PathLike)):
+            file_size = os.path.getsize(file)
+        else:
+            file_size = getattr(file, "size", None) or 0
+            file.seek(0)
+        if file_size > settings.CLOUDINARY_CHUNK_SIZE:
+            output = cloudinary.uploader.upload_large(
+                file, chunk_size=settings.CLOUDINARY_CHUNK_SIZE, **options
+            )
+        else:
+            output = cloudinary.uploader.upload(file, **options)
+        return {"url": output["url"], "key": output["public_id"]}
+
+    def delete(self, key: str) -> None:
+        """Removes image file and its derived sizes from Cloudinary."""
+        cloudinary.uploader.destroy(key, invalidate=True)
+
+    def delete_many(self, keys: list) -> None:
+        """Removes image files from Cloudinary in batches of 100."""
+        for start in range(0, len(keys), 100):
+            cloudinary.api.delete_resources(
+                keys[start : start + 100], invalidate=True  # noqa
+            )
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores images on local disk under paths derived from their content,
+    so identical files are stored once. Thumbnails are rendered on first
+    request by ThumbnailEngine.
+
+    Args:
+        root(str): Optional; Directory with stored files,
+                   defaults to LOCAL_STORAGE_ROOT.
+        base_url(str): Optional; URL the root directory is served at,
+                       defaults to LOCAL_STORAGE_URL.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, root: str = None, base_url: str = None) -> None:
+        self.root = str(root or settings.LOCAL_STORAGE_ROOT)
+        self.base_url = base_url or settings.LOCAL_STORAGE_URL
+
+    def path(self, key: str) -> str:
+        """
+        Returns path of stored file, refuses keys leaving the root.
+
+        Args:
+            key(str): Key returned by upload().
+
+        Returns:
+            str: Absolute path to the file.
+        """
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _open(self, file: object, size: int = None) -> object:
+        """Returns readable file, scaled to size x size if size is passed."""
+        if isinstance(file, (str, os.PathLike)):
+            file = open(file, "rb")
+        else:
+            file.seek(0)
+        if not size:
+            return file
+        with PillowImage.open(file) as image:
+            image_format = image.format
+            resized = image.resize((size, size))
+        content = io.BytesIO()
+        resized.save(content, image_format)
+        content.seek(0)
+        return content
+
+    @instrumented_upload
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        """
+        Writes image file under a path made of its SHA-256 digest. Passed
+        file objects are left open for the caller.
+        """
+        extension = os.path.splitext(getattr(file, "name", str(file)))[1]
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        source = self._open(file, size)
+        try:
+            fd, temporary_path = tempfile.mkstemp(dir=self.root)
+            try:
+                with os.fdopen(fd, "wb") as destination:
+                    for chunk in iter(
+                        lambda: source.read(self.chunk_size), b""
+                    ):
+                        digest.update(chunk)
+                        destination.write(chunk)
+                hexdigest = digest.hexdigest()
+                key = f"{hexdigest[:2]}/{hexdigest}{extension.lower()}"
+                os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+                os.replace(temporary_path, self.path(key))
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+        finally:
+            if source is not file:
+                source.close()
+        return {"url": f"{self.base_url}upload/{key}", "key": key}
+
+    def supported_formats(self) -> frozenset:
+        """Returns formats ThumbnailEngine can encode with local Pillow."""
+        return available_formats()
+
+    def delete(self, key: str) -> None:
+        """Removes image file from disk."""
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+@lru_cache(maxsize=None)
+def get_storage() -> StorageBackend:
+    """Returns storage backend selected in IMAGE_STORAGE_BACKEND setting."""
+    return import_string(settings.IMAGE_STORAGE_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_storage(setting: str, **kwargs) -> None:
+    """Drops cached storage backend when storage settings change."""
+    if setting.startswith(("IMAGE_STORAGE", "LOCAL_STORAGE")):
+        get_storage.cache_clear()
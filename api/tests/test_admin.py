@@ -0,0 +1,117 @@
+import pytest
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from api.jobs import submit_job
+from api.models import ExpiringLink, Image, StorageDeletion
+
+
+def create_images(owner: object, count: int, prefix: str = "image") -> list:
+    """Creates images of owner with an expiring link each."""
+    images = []
+    for index in range(count):
+        image = mixer.blend(
+            "api.Image",
+            name=f"{prefix}-{owner.username}-{index}",
+            url=f"http://t.com/upload/{prefix}{index}.png",
+            owner=owner,
+        )
+        mixer.blend("api.ExpiringLink", image=image, expiration_time=300)
+        images.append(image)
+    return images
+
+
+@pytest.mark.django_db
+class TestChangelists:
+    """Tests for admin changelists of big tables."""
+
+    @pytest.fixture
+    def owner(self) -> object:
+        """Creates image owner."""
+        return mixer.blend("api.User", username="alice")
+
+    @pytest.mark.parametrize(
+        "url",
+        ["admin:api_image_changelist", "admin:api_expiringlink_changelist"],
+    )
+    def test_queries_do_not_grow(
+        self, owner, admin_client, django_assert_max_num_queries, url
+    ):
+        """Tests that listing more objects makes no more queries."""
+        create_images(owner, 2, "first")
+        with django_assert_max_num_queries(50) as context:
+            assert admin_client.get(reverse(url)).status_code == 200
+        queries = len(context.captured_queries)
+        create_images(owner, 10, "second")
+        with django_assert_max_num_queries(queries):
+            assert admin_client.get(reverse(url)).status_code == 200
+
+    def test_estimated_count(self, owner, admin_client, settings):
+        """Tests that counts above the limit are estimated or cut."""
+        settings.ADMIN_COUNT_LIMIT = 3
+        images = create_images(owner, 5)
+        url = reverse("admin:api_image_changelist")
+        response = admin_client.get(url)
+        assert response.context["cl"].result_count == images[-1].pk
+        response = admin_client.get(url, {"status": "ready"})
+        assert response.context["cl"].result_count == 4
+
+    def test_prefix_search(self, owner, admin_client):
+        """Tests searching by name and owner username prefixes."""
+        create_images(owner, 2)
+        create_images(mixer.blend("api.User", username="bob"), 1, "photo")
+        url = reverse("admin:api_image_changelist")
+
+        def search(term: str) -> set:
+            response = admin_client.get(url, {"q": term})
+            return {image.name for image in response.context["cl"].result_list}
+
+        assert search("photo") == {"photo-bob-0"}
+        assert search("al") == {"image-alice-0", "image-alice-1"}
+        assert search("bob") == {"photo-bob-0"}
+        assert search("lice") == set()
+
+    def test_change_forms(self, owner, admin_client):
+        """Tests that forms do not list all users and images."""
+        image = create_images(owner, 1)[0]
+        other = create_images(mixer.blend("api.User", username="bob"), 1)[0]
+        content = admin_client.get(
+            reverse("admin:api_image_change", args=[image.pk])
+        ).content.decode()
+        assert "alice" in content and "bob" not in content
+        content = admin_client.get(
+            reverse(
+                "admin:api_expiringlink_change",
+                args=[image.expiring_links.get().pk],
+            )
+        ).content.decode()
+        assert other.name not in content
+
+    def test_delete_selected_removed(self, admin_client):
+        """Tests that only background delete action is offered."""
+        response = admin_client.get(reverse("admin:api_image_changelist"))
+        actions = dict(
+            response.context["action_form"].fields["action"].choices
+        )
+        assert "delete_selected" not in actions
+        assert "delete_in_background" in actions
+
+
+@pytest.mark.django_db(transaction=True)
+def test_delete_in_background(admin_client, settings):
+    """Tests deleting selected images and their links in batches."""
+    settings.ADMIN_ACTION_BATCH_SIZE = 2
+    settings.STORAGE_CLEANUP_WORKER = False
+    images = create_images(mixer.blend("api.User"), 5)
+    response = admin_client.post(
+        reverse("admin:api_image_changelist"),
+        {
+            "action": "delete_in_background",
+            "_selected_action": [image.pk for image in images[:4]],
+        },
+    )
+    assert response.status_code == 302
+    submit_job(lambda: None).result(timeout=10)
+    assert list(Image.objects.all()) == [images[4]]
+    assert ExpiringLink.objects.count() == 1
+    assert StorageDeletion.objects.count() == 4
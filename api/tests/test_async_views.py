@@ -0,0 +1,62 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from mixer.backend.django import mixer
+
+from api import async_views
+from api.links import get_link_cache
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncViews:
+    """Tests for async views."""
+
+    factory = RequestFactory()
+
+    def test_expiring_link_detail(self, django_assert_num_queries):
+        """Tests resolving link, then serving it from in-process cache."""
+        link = mixer.blend(
+            "api.ExpiringLink", url="http://test.com", expiration_time=300
+        )
+        get_link_cache().invalidate(link.pk)
+        request = self.factory.get(f"/api/expiringlink/{link.pk}/")
+        response = async_to_sync(async_views.expiring_link_detail)(
+            request, link.pk
+        )
+        with django_assert_num_queries(0):
+            cached = async_to_sync(async_views.expiring_link_detail)(
+                request, link.pk
+            )
+        assert response.status_code == 200
+        assert response.content == b'{"url": "http://test.com"}'
+        assert cached.content == response.content
+
+    def test_missing_expiring_link(self):
+        """Tests that missing link responds with 404."""
+        request = self.factory.get("/api/expiringlink/0/")
+        response = async_to_sync(async_views.expiring_link_detail)(request, 0)
+        assert response.status_code == 404
+
+    def test_image_list(self):
+        """Tests listing user's images in the thread pool."""
+        tier = mixer.blend(
+            "api.AccountTier",
+            name="Basic",
+            original_size=True,
+            fetch_url=False,
+        )
+        user = mixer.blend("api.User", accountTier=tier)
+        mixer.cycle(3).blend(
+            "api.Image", owner=user, url="http://test.com/upload/a"
+        )
+        request = self.factory.get("/api/image/")
+        request.user = user
+        response = async_to_sync(async_views.image_list)(request)
+        assert response.status_code == 200
+        assert b'"results"' in response.content
+
+    def test_image_list_requires_authentication(self):
+        """Tests that anonymous users are refused."""
+        request = self.factory.get("/api/image/")
+        response = async_to_sync(async_views.image_list)(request)
+        assert response.status_code == 401
@@ -0,0 +1,161 @@
+import time
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+
+from api.authentication import (
+    Principal,
+    get_principal_cache,
+    issue_api_token,
+    user_fingerprint,
+)
+
+
+@pytest.mark.django_db
+class TestAPITokenAuthentication:
+    """Tests for APITokenAuthentication."""
+
+    client = APIClient()
+
+    @pytest.fixture
+    def user(self) -> object:
+        """Creates user with an account tier."""
+        tier = mixer.blend("api.AccountTier", original_size=True)
+        user = mixer.blend("api.User", accountTier=tier)
+        user.set_password("password")
+        user.save()
+        return user
+
+    def get(self, token: str, **headers) -> object:
+        """Lists images authenticating with the token."""
+        return self.client.get(
+            reverse("api:image-list"),
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+            **headers,
+        )
+
+    def test_authenticate(self, user):
+        """Tests listing user's images with a token."""
+        mixer.blend("api.Image", url="http://t.com/upload/a", owner=user)
+        response = self.get(issue_api_token(user))
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 1
+
+    def test_cached_principal(self, user, django_assert_num_queries):
+        """Tests that cached user is authenticated without queries."""
+        token = issue_api_token(user)
+        etag = self.get(token)["ETag"]
+        with django_assert_num_queries(0):
+            response = self.get(token, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    @pytest.mark.parametrize(
+        "header",
+        ["Bearer invalid", "Bearer a b", "Bearer"],
+    )
+    def test_invalid_token(self, header):
+        """Tests that malformed and forged tokens are rejected."""
+        response = self.client.get(
+            reverse("api:image-list"), HTTP_AUTHORIZATION=header
+        )
+        assert response.status_code == 401
+        assert response["WWW-Authenticate"] == 'Bearer realm="api"'
+
+    def test_expired_token(self, user):
+        """Tests that tokens expire after max_age seconds."""
+        token = issue_api_token(user, max_age=-1)
+        response = self.get(token)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has expired."
+
+    def test_password_change_revokes(self, user):
+        """Tests that changing password invalidates issued tokens."""
+        token = issue_api_token(user)
+        assert self.get(token).status_code == 200
+        user.set_password("other password")
+        user.save()
+        assert self.get(token).status_code == 401
+
+    def test_inactive_user(self, user):
+        """Tests that deactivated users are not authenticated."""
+        token = issue_api_token(user)
+        assert self.get(token).status_code == 200
+        user.is_active = False
+        user.save()
+        assert self.get(token).status_code == 401
+
+    def test_deleted_user(self, user):
+        """Tests that tokens of deleted users are rejected."""
+        token = issue_api_token(user)
+        user.delete()
+        assert self.get(token).status_code == 401
+
+    def test_issue_api_token_command(self, user, capsys):
+        """Tests printing token of a user."""
+        call_command("issue_api_token", user.username, "--max-age", "60")
+        token = capsys.readouterr().out.strip()
+        assert self.get(token).status_code == 200
+
+
+@pytest.mark.django_db
+class TestPrincipalCache:
+    """Tests for PrincipalCache."""
+
+    def test_get(self, django_assert_num_queries):
+        """Tests that user is read from database once."""
+        user = mixer.blend("api.User")
+        get_principal_cache().get(user.pk)
+        with django_assert_num_queries(0):
+            cached = get_principal_cache().get(user.pk).user()
+            assert cached == user
+            assert cached.username == user.username
+            assert cached.accountTier_id == user.accountTier_id
+
+    def test_shared_entry(self):
+        """Tests that password hash is not kept in the shared cache."""
+        user = mixer.blend("api.User")
+        user.set_password("password")
+        user.save()
+        get_principal_cache().get(user.pk)
+        cached = caches["default"].get(get_principal_cache().key(user.pk))
+        assert cached == Principal(
+            user.pk,
+            user.username,
+            True,
+            user.accountTier_id,
+            user_fingerprint(user),
+        )
+
+    def test_save_loaded_fields(self):
+        """Tests that saving cached user keeps its other fields."""
+        user = mixer.blend("api.User", first_name="name")
+        user.set_password("password")
+        user.save()
+        cached = get_principal_cache().get(user.pk).user()
+        cached.is_active = False
+        cached.save()
+        user.refresh_from_db()
+        assert not user.is_active
+        assert user.first_name == "name"
+        assert user.check_password("password")
+
+    def test_missing_user(self, django_assert_num_queries):
+        """Tests that missing users are cached too."""
+        assert get_principal_cache().get(0) is None
+        with django_assert_num_queries(0):
+            assert get_principal_cache().get(0) is None
+
+    def test_local_ttl(self, settings):
+        """Tests that in-process entries expire after local ttl."""
+        settings.API_TOKEN_PRINCIPAL_CACHE = ""
+        settings.API_TOKEN_PRINCIPAL_LOCAL_TTL = 0.05
+        user = mixer.blend("api.User", username="before")
+        get_principal_cache().get(user.pk)
+        type(user).objects.filter(pk=user.pk).update(username="after")
+        assert get_principal_cache().get(user.pk).username == "before"
+        time.sleep(0.06)
+        assert get_principal_cache().get(user.pk).username == "after"
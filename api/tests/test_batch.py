@@ -0,0 +1,142 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from mixer.backend.django import mixer
+from PIL import Image as PillowImage
+from rest_framework.test import APIClient
+
+from api import serializers
+from api.models import ExpiringLink, Image
+from api.storage import StorageBackend
+
+
+class FakeStorage(StorageBackend):
+    """Storage which pretends to store files in the cloud."""
+
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        if name == "broken":
+            raise ConnectionError("timeout")
+        return {"url": f"http://test.com/upload/{name}.png", "key": name}
+
+
+def make_png(name: str) -> bytes:
+    """Returns content of a PNG file, different for every name."""
+    content = io.BytesIO()
+    color = tuple(hashlib.md5(name.encode()).digest()[:3])
+    PillowImage.new("RGB", (10, 10), color).save(content, "PNG")
+    return content.getvalue()
+
+
+@pytest.mark.django_db
+class TestBatchUpload:
+    """Tests for uploading many images at once."""
+
+    client = APIClient()
+    url = reverse("api:image-batch")
+
+    @pytest.fixture
+    def user(self, monkeypatch) -> object:
+        """Creates user with enterprise tier, selects fake storage."""
+        monkeypatch.setattr(serializers, "get_storage", FakeStorage)
+        tier = mixer.blend(
+            "api.AccountTier",
+            name="Enterprise",
+            original_size=True,
+            fetch_url=True,
+        )
+        user = mixer.blend("api.User", accountTier=tier)
+        self.client.force_authenticate(user=user)
+        yield user
+        self.client.force_authenticate(user=None)
+
+    def test_upload_images(self, user, django_assert_max_num_queries):
+        """Tests uploading all valid images."""
+        files = [
+            SimpleUploadedFile(f"image{index}.png", make_png(str(index)))
+            for index in range(10)
+        ]
+        with django_assert_max_num_queries(8):
+            response = self.client.post(
+                self.url,
+                {"images": files, "link_expiry_time": 300},
+                format="multipart",
+            )
+        assert response.status_code == 201
+        assert len(response.data) == 10
+        assert Image.objects.filter(owner=user).count() == 10
+        assert ExpiringLink.objects.count() == 10
+        assert all("Expiring link" in result for result in response.data)
+
+    def test_upload_with_errors(self, user):
+        """Tests reporting errors of single images."""
+        mixer.blend("api.Image", name="taken")
+        files = [
+            SimpleUploadedFile("valid.png", make_png("valid")),
+            SimpleUploadedFile("taken.png", make_png("taken")),
+            SimpleUploadedFile("broken.png", make_png("broken")),
+            SimpleUploadedFile("text.png", b"not an image"),
+        ]
+        response = self.client.post(
+            self.url, {"images": files}, format="multipart"
+        )
+        statuses = {
+            result["name"]: result["status"] for result in response.data
+        }
+        assert response.status_code == 207
+        assert statuses == {
+            "valid": "created",
+            "taken": "error",
+            "broken": "error",
+            "text": "error",
+        }
+
+    def test_upload_archive(self, user):
+        """Tests uploading images from ZIP archive."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("gallery/first.png", make_png("a"))
+            zip_file.writestr("gallery/second.png", make_png("b"))
+        archive = SimpleUploadedFile("gallery.zip", archive.getvalue())
+        response = self.client.post(
+            self.url, {"archive": archive}, format="multipart"
+        )
+        assert response.status_code == 201
+        assert sorted(result["name"] for result in response.data) == [
+            "first",
+            "second",
+        ]
+
+    @pytest.mark.parametrize(
+        "limit", ["BATCH_UPLOAD_MAX_FILES", "BATCH_UPLOAD_MAX_ARCHIVE_SIZE"]
+    )
+    def test_archive_limits(self, user, settings, monkeypatch, limit):
+        """Tests refusing big archives before extracting them."""
+        setattr(settings, limit, 2)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            for index in range(50):
+                zip_file.writestr(f"{index}.png", make_png(str(index)))
+        archive = SimpleUploadedFile("gallery.zip", archive.getvalue())
+        opened = []
+        monkeypatch.setattr(
+            zipfile.ZipFile,
+            "open",
+            lambda *args, **kwargs: opened.append(args) or 1 / 0,
+        )
+        response = self.client.post(
+            self.url, {"archive": archive}, format="multipart"
+        )
+        assert response.status_code == 400
+        assert "archive" in response.data
+        assert not opened
+
+    def test_upload_nothing(self, user):
+        """Tests sending request without images."""
+        response = self.client.post(self.url, {}, format="multipart")
+        assert response.status_code == 400
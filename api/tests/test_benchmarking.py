@@ -0,0 +1,102 @@
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api.benchmarking import compare
+from api.datasets import clear_dataset, generate_dataset
+from api.models import AccountTier, ExpiringLink, Image, User
+
+
+@pytest.mark.django_db
+class TestDataset:
+    """Tests for the synthetic dataset generator."""
+
+    def test_generate(self):
+        """Tests creating users across tiers with images and links."""
+        counts = generate_dataset(6, 4, 2, prefix="test")
+        assert counts == {"tiers": 3, "users": 6, "images": 24, "links": 12}
+        users = User.objects.filter(username__startswith="test-")
+        assert {user.accountTier.name for user in users} == {
+            "test-basic",
+            "test-premium",
+            "test-enterprise",
+        }
+        link = ExpiringLink.objects.first()
+        assert link.expires_at == ExpiringLink.compute_expires_at(
+            link.created_time, link.expiration_time
+        )
+
+    def test_reproducible(self):
+        """Tests that the same seed generates the same data."""
+        generate_dataset(2, 3, 0, prefix="test", seed=7)
+        first = list(Image.objects.values_list("name", "url", "size"))
+        clear_dataset("test")
+        assert not Image.objects.exists()
+        assert not AccountTier.objects.filter(name__startswith="test-")
+        generate_dataset(2, 3, 0, prefix="test", seed=7)
+        assert list(Image.objects.values_list("name", "url", "size")) == first
+
+
+class TestCompare:
+    """Tests for finding regressions."""
+
+    baseline = {"list": {"p50_ms": 10.0, "p99_ms": 20.0}}
+
+    def test_regression(self):
+        """Tests reporting slowdowns above the threshold."""
+        results = {"list": {"p50_ms": 13.0, "p99_ms": 21.0}}
+        assert compare(
+            results, self.baseline, {"p50_ms": 0.2, "p99_ms": 0.2}
+        ) == [
+            {
+                "benchmark": "list",
+                "field": "p50_ms",
+                "baseline": 10.0,
+                "current": 13.0,
+                "change": 0.3,
+            }
+        ]
+
+    def test_noise(self):
+        """Tests ignoring slowdowns below the minimal delta."""
+        results = {"list": {"p50_ms": 13.0, "p99_ms": 20.0}}
+        assert not compare(results, self.baseline, {"p50_ms": 0.2}, 5.0)
+        assert not compare(results, {}, {"p50_ms": 0.2})
+
+
+@pytest.mark.django_db
+class TestBenchmarkSuite:
+    """Tests for benchmark_suite command."""
+
+    def test_run_and_compare(self, tmp_path):
+        """Tests writing JSON results and failing on regressions."""
+        generate_dataset(3, 5, 2, prefix="test")
+        output = tmp_path / "results.json"
+        options = {"prefix": "test", "iterations": 3, "warmup": 1}
+        call_command("benchmark_suite", output=str(output), **options)
+        results = json.loads(output.read_text())
+        assert set(results["benchmarks"]) == {
+            "list",
+            "detail",
+            "expiring_link",
+            "upload",
+        }
+        assert results["meta"]["images"] == 15
+        assert not Image.objects.filter(name__startswith="test-upload-")
+        for summary in results["benchmarks"].values():
+            summary["p50_ms"] = summary["p99_ms"] = 0.001
+        output.write_text(json.dumps(results))
+        with pytest.raises(CommandError, match="Performance regressed"):
+            call_command(
+                "benchmark_suite",
+                baseline=str(output),
+                min_delta_ms=0,
+                only=["detail"],
+                **options,
+            )
+
+    def test_missing_dataset(self):
+        """Tests refusing to run without a dataset."""
+        with pytest.raises(CommandError, match="generate_dataset"):
+            call_command("benchmark_suite", prefix="missing")
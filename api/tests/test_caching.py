@@ -0,0 +1,261 @@
+import fnmatch
+import time
+
+import pytest
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+
+from api.cache_backends import INCR_SCRIPT
+from api.list_cache import get_list_cache
+
+REDIS_CACHES = {
+    "default": {
+        "BACKEND": "api.cache_backends.RedisCache",
+        "LOCATION": "redis://localhost:6379/0",
+        "OPTIONS": {"CLIENT_CLASS": "api.tests.test_caching.FakeRedis"},
+    }
+}
+
+
+class FakeRedis:
+    """In-memory stand-in for redis.Redis client."""
+
+    def __init__(self) -> None:
+        self.data = {}
+        self.expires = {}
+
+    @classmethod
+    def from_url(cls, url: str) -> "FakeRedis":
+        """Returns new client."""
+        return cls()
+
+    def alive(self, key: str) -> bool:
+        """Drops expired key, checks if the key is set."""
+        if self.expires.get(key, float("inf")) <= time.monotonic():
+            self.delete(key)
+        return key in self.data
+
+    def get(self, key: str) -> bytes or None:
+        """Returns stored value."""
+        return self.data.get(key) if self.alive(key) else None
+
+    def set(self, key, value, ex=None, nx=False) -> bool or None:
+        """Stores value, optionally only when the key is not set."""
+        if nx and self.alive(key):
+            return None
+        self.data[key] = (
+            str(value).encode() if isinstance(value, int) else value
+        )
+        self.expires.pop(key, None)
+        if ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        return True
+
+    def delete(self, *keys: str) -> int:
+        """Removes the keys."""
+        for key in keys:
+            self.expires.pop(key, None)
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key: str) -> int:
+        """Checks if the key is set."""
+        return int(self.alive(key))
+
+    def expire(self, key: str, seconds: int) -> bool:
+        """Sets timeout of the key."""
+        if not self.alive(key):
+            return False
+        self.expires[key] = time.monotonic() + seconds
+        return True
+
+    def persist(self, key: str) -> bool:
+        """Removes timeout of the key."""
+        return self.alive(key) and self.expires.pop(key, None) is not None
+
+    def incrby(self, key: str, delta: int) -> int:
+        """Adds delta to integer value."""
+        value = int(self.data.get(key, 0)) + delta
+        self.data[key] = str(value).encode()
+        return value
+
+    def scan_iter(self, match: str, count: int) -> list:
+        """Returns keys matching glob pattern."""
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+    def register_script(self, script: str) -> callable:
+        """Returns Python version of RedisCache's increment script."""
+        assert script == INCR_SCRIPT
+
+        def incr(keys: list, args: list) -> int or None:
+            if not self.alive(keys[0]):
+                return None
+            return self.incrby(keys[0], args[0])
+
+        return incr
+
+
+class TestRedisCache:
+    """Tests for RedisCache backend."""
+
+    @pytest.fixture
+    def cache(self, settings) -> object:
+        """Returns RedisCache using FakeRedis client."""
+        settings.CACHES = REDIS_CACHES
+        return caches["default"]
+
+    def test_get_set(self, cache):
+        """Tests storing pickled and integer values."""
+        cache.set("tier", {"sizes": (200, 400)})
+        cache.set("version", 3)
+        assert cache.get("tier") == {"sizes": (200, 400)}
+        assert cache.get("version") == 3
+        assert cache.get("missing", "default") == "default"
+
+    def test_add_incr_delete(self, cache):
+        """Tests add not overwriting, atomic incr and delete."""
+        assert cache.add("version", 1)
+        assert not cache.add("version", 5)
+        assert cache.incr("version") == 2
+        assert cache.delete("version")
+        assert not cache.has_key("version")
+        with pytest.raises(ValueError):
+            cache.incr("version")
+
+    def test_incr_expired(self, cache, monkeypatch):
+        """Tests that incr() does not bring expired key back."""
+        cache.add("counter", 1, 10)
+        monkeypatch.setattr(time, "monotonic", lambda: float("inf"))
+        with pytest.raises(ValueError):
+            cache.incr("counter")
+        assert not cache._client.data
+
+    def test_clear(self, cache):
+        """Tests that clear() keeps keys of other users of the database."""
+        cache.set("key", "value")
+        cache._client.set("other:key", b"value")
+        cache.clear()
+        assert cache.get("key") is None
+        assert list(cache._client.data) == ["other:key"]
+
+    def test_timeouts(self, cache):
+        """Tests that non-positive timeout removes the key."""
+        cache.set("key", "value", None)
+        assert cache.touch("key", 10)
+        cache.set("key", "value", 0)
+        assert cache.get("key") is None
+        assert cache.get_or_set("key", "other", 10) == "other"
+
+
+@pytest.mark.django_db
+class TestListCache:
+    """Tests for cached image lists."""
+
+    client = APIClient()
+    url = "http://test.com/upload/test"
+
+    @pytest.fixture
+    def user(self) -> object:
+        """Creates user with images and logs them in."""
+        tier = mixer.blend(
+            "api.AccountTier", original_size=True, fetch_url=True
+        )
+        tier.thumbnail_sizes.add(mixer.blend("api.Thumbnail", size=200))
+        user = mixer.blend("api.User", accountTier=tier)
+        mixer.cycle(3).blend("api.Image", url=self.url, owner=user)
+        self.client.force_authenticate(user=user)
+        yield user
+        self.client.force_authenticate(user=None)
+
+    def test_cached_list(self, user, django_assert_num_queries):
+        """Tests that unchanged list is served without queries."""
+        url = reverse("api:image-list")
+        response = self.client.get(url)
+        with django_assert_num_queries(0):
+            cached = self.client.get(url)
+        assert cached.status_code == 200
+        assert cached.content == response.content
+        assert cached["ETag"] == response["ETag"]
+        assert cached["Last-Modified"] == response["Last-Modified"]
+
+    def test_not_modified(self, user):
+        """Tests that conditional requests for unchanged list get 304."""
+        url = reverse("api:image-list")
+        response = self.client.get(url)
+        not_modified = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        modified_since = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        assert modified_since.status_code == 304
+
+    def test_queries_are_cached_separately(self, user):
+        """Tests that different pages are different cache entries."""
+        url = reverse("api:image-list")
+        first = self.client.get(url, {"page_size": 1})
+        everything = self.client.get(url)
+        assert len(first.json()["results"]) == 1
+        assert len(everything.json()["results"]) == 3
+
+    def test_new_image_invalidates(self, user):
+        """Tests that saving an image changes the list."""
+        url = reverse("api:image-list")
+        response = self.client.get(url)
+        mixer.blend("api.Image", url=self.url, owner=user)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert changed.status_code == 200
+        assert len(changed.json()["results"]) == 4
+
+    def test_new_link_invalidates(self, user):
+        """Tests that expiring links change the list of image's owner."""
+        url = reverse("api:image-list")
+        self.client.get(url)
+        image = user.image_set.first()
+        mixer.blend(
+            "api.ExpiringLink", image=image, url=self.url, expiration_time=300
+        )
+        listed = {
+            item["name"]: item
+            for item in self.client.get(url).json()["results"]
+        }
+        assert "Expiring link" in listed[image.name]
+
+    def test_link_expiry_bounds_timeout(self, user, settings):
+        """Tests that list is not cached beyond its first link expiry."""
+        settings.IMAGE_LIST_CACHE_TIMEOUT = 3600
+        mixer.blend(
+            "api.ExpiringLink",
+            image=user.image_set.first(),
+            url=self.url,
+            expiration_time=300,
+        )
+        list_cache = get_list_cache()
+        response = self.client.get(reverse("api:image-list"))
+        assert response.status_code == 200
+        token = list_cache.version(user.pk)[0]
+        keys = [
+            key
+            for key in caches["default"]._cache
+            if f"imagelist:{user.pk}:{token}" in key
+        ]
+        assert len(keys) == 1
+        expires = caches["default"]._expire_info[keys[0]]
+        assert expires <= time.time() + 300
+
+    def test_locmem_refused_with_many_workers(self, settings):
+        """Tests refusing per process list cache outside of dev mode."""
+        settings.SERVER_MODE = "asgi"
+        with pytest.raises(ImproperlyConfigured):
+            get_list_cache()
+
+    def test_disabled(self, user, settings):
+        """Tests that list is rendered on every request when disabled."""
+        settings.IMAGE_LIST_CACHE = ""
+        response = self.client.get(reverse("api:image-list"))
+        assert response.status_code == 200
+        assert "ETag" not in response
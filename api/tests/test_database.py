@@ -0,0 +1,21 @@
+import pytest
+from django.db import connection
+
+
+@pytest.mark.django_db
+class TestSQLiteConfiguration:
+    """Tests for PRAGMAs set on new SQLite connections."""
+
+    def pragma(self, name: str) -> object:
+        """Returns value of the PRAGMA."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_busy_timeout(self, settings):
+        """Tests that writers wait SQLITE_BUSY_TIMEOUT for a lock."""
+        assert self.pragma("busy_timeout") == settings.SQLITE_BUSY_TIMEOUT
+
+    def test_synchronous(self):
+        """Tests that synchronous mode is NORMAL."""
+        assert self.pragma("synchronous") == 1
@@ -0,0 +1,173 @@
+import io
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from mixer.backend.django import mixer
+from PIL import Image as PillowImage
+from rest_framework.test import APIClient
+
+from api import serializers
+from api.dedup import dedup_stats, file_hash, upload_hash
+from api.models import Image
+from api.storage import StorageBackend
+
+
+class FakeStorage(StorageBackend):
+    """Storage which counts uploads."""
+
+    def __init__(self) -> None:
+        self.uploads = []
+
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        self.uploads.append(name)
+        return {"url": f"http://test.com/upload/{name}.png", "key": name}
+
+
+def make_png(name: str = "test.png", color: str = "red") -> object:
+    """Returns uploaded PNG file."""
+    content = io.BytesIO()
+    PillowImage.new("RGB", (10, 10), color).save(content, "PNG")
+    return SimpleUploadedFile(name, content.getvalue(), "image/png")
+
+
+class TestHashes:
+    """Tests for content hashes."""
+
+    def test_file_hash_is_stable(self):
+        """Tests that the same content has the same hash."""
+        assert file_hash(make_png("a.png")) == file_hash(make_png("b.png"))
+        assert file_hash(make_png()) != file_hash(make_png(color="blue"))
+
+    def test_upload_hash_includes_resize(self):
+        """Tests that resized upload is a different stored object."""
+        file = make_png()
+        assert upload_hash(file, {}) == file_hash(file)
+        assert upload_hash(file, {"size": 200}) != file_hash(file)
+
+
+@pytest.mark.django_db
+class TestDeduplication:
+    """Tests for reusing stored images."""
+
+    client = APIClient()
+
+    @pytest.fixture
+    def storage(self, monkeypatch) -> FakeStorage:
+        """Selects fake storage."""
+        storage = FakeStorage()
+        monkeypatch.setattr(serializers, "get_storage", lambda: storage)
+        return storage
+
+    def make_user(self) -> object:
+        """Creates user with original size permission."""
+        tier = mixer.blend(
+            "api.AccountTier",
+            name="Basic",
+            original_size=True,
+            fetch_url=False,
+        )
+        return mixer.blend("api.User", accountTier=tier)
+
+    def post(self, user: object, name: str, **kwargs) -> object:
+        """Uploads image as user."""
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            reverse("api:image-list"),
+            {"name": name, "image": make_png(**kwargs)},
+            format="multipart",
+        )
+        self.client.force_authenticate(user=None)
+        return response
+
+    def test_same_content_is_uploaded_once(self, storage):
+        """Tests that user's duplicated image reuses stored file."""
+        user = self.make_user()
+        self.post(user, "first")
+        response = self.post(user, "second")
+        second = Image.objects.get(name="second")
+        assert response.status_code == 201
+        assert storage.uploads == ["first"]
+        assert second.url == "http://test.com/upload/first.png"
+        assert second.storage_key == "first"
+        assert second.size > 0
+
+    def test_different_content_is_uploaded(self, storage):
+        """Tests that images with different content are uploaded."""
+        user = self.make_user()
+        self.post(user, "first")
+        self.post(user, "second", color="blue")
+        assert storage.uploads == ["first", "second"]
+
+    def test_owner_scope(self, storage):
+        """Tests that images of other users are not reused by default."""
+        self.post(self.make_user(), "first")
+        self.post(self.make_user(), "second")
+        assert storage.uploads == ["first", "second"]
+
+    def test_global_scope(self, storage, settings):
+        """Tests that images of other users are reused in global scope."""
+        settings.IMAGE_DEDUP_SCOPE = "global"
+        self.post(self.make_user(), "first")
+        self.post(self.make_user(), "second")
+        assert storage.uploads == ["first"]
+
+    def test_no_deduplication(self, storage, settings):
+        """Tests that deduplication can be turned off."""
+        settings.IMAGE_DEDUP_SCOPE = "none"
+        user = self.make_user()
+        self.post(user, "first")
+        self.post(user, "second")
+        assert storage.uploads == ["first", "second"]
+
+    def test_batch_uploads_same_content_once(self, storage):
+        """Tests that duplicated files of a batch are uploaded once."""
+        user = self.make_user()
+        self.post(user, "stored", color="blue")
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            reverse("api:image-batch"),
+            {
+                "images": [
+                    make_png("first.png"),
+                    make_png("second.png"),
+                    make_png("third.png", color="blue"),
+                ]
+            },
+            format="multipart",
+        )
+        self.client.force_authenticate(user=None)
+        keys = dict(Image.objects.values_list("name", "storage_key"))
+        assert response.status_code == 201
+        assert storage.uploads == ["stored", "first"]
+        assert keys == {
+            "stored": "stored",
+            "first": "first",
+            "second": "first",
+            "third": "stored",
+        }
+
+    def test_dedup_stats(self, storage):
+        """Tests counting saved uploads and bytes."""
+        user = self.make_user()
+        for name in ["first", "second", "third"]:
+            self.post(user, name)
+        self.post(user, "other", color="blue")
+        size = Image.objects.get(name="first").size
+        assert dedup_stats() == {
+            "images": 4,
+            "stored": 2,
+            "uploads_saved": 2,
+            "bytes_saved": 2 * size,
+        }
+
+    def test_dedup_stats_admin_view(self, storage, admin_client):
+        """Tests rendering dedup_stats admin view."""
+        user = self.make_user()
+        self.post(user, "first")
+        self.post(user, "second")
+        response = admin_client.get(reverse("admin:api_image_dedup_stats"))
+        assert response.status_code == 200
+        assert response.context["stats"]["uploads_saved"] == 1
@@ -0,0 +1,175 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+
+from api.deletion import delete_stored_files, schedule_deletion
+from api.links import get_link_cache
+from api.models import ExpiringLink, Image, StorageDeletion
+from api.storage import LocalStorage, StorageBackend
+from api.tests.test_thumbnails import make_image
+from api.thumbnails import get_thumbnail_engine
+
+
+class RecordingStorage(StorageBackend):
+    """Storage which records deleted keys, fails when told to."""
+
+    def __init__(self, broken: bool = False) -> None:
+        self.broken = broken
+        self.calls = []
+
+    def delete_many(self, keys: list) -> None:
+        if self.broken:
+            raise ConnectionError("timeout")
+        self.calls.append(keys)
+
+
+@pytest.mark.django_db
+class TestDeleteImages:
+    """Tests for image DELETE endpoints."""
+
+    client = APIClient()
+
+    @pytest.fixture
+    def user(self) -> object:
+        """Creates and authenticates user."""
+        user = mixer.blend("api.User")
+        self.client.force_authenticate(user=user)
+        yield user
+        self.client.force_authenticate(user=None)
+
+    def test_delete_image(self, user):
+        """Tests deleting image with its links, queuing its file."""
+        image = mixer.blend("api.Image", owner=user, storage_key="a/image")
+        mixer.blend("api.ExpiringLink", image=image, expiration_time=300)
+        response = self.client.delete(
+            reverse("api:image-detail", args=[image.pk])
+        )
+        assert response.status_code == 204
+        assert not Image.objects.exists()
+        assert not ExpiringLink.objects.exists()
+        assert list(
+            StorageDeletion.objects.values_list("storage_key", flat=True)
+        ) == ["a/image"]
+
+    def test_delete_image_of_other_user(self, user):
+        """Tests that other users' images are not deleted."""
+        image = mixer.blend("api.Image")
+        response = self.client.delete(
+            reverse("api:image-detail", args=[image.pk])
+        )
+        assert response.status_code == 404
+        assert Image.objects.exists()
+
+    def test_delete_batch(self, user, django_assert_max_num_queries):
+        """Tests deleting many images, queuing files with one query."""
+        images = [
+            mixer.blend("api.Image", owner=user, storage_key=f"key{index}")
+            for index in range(3)
+        ]
+        other = mixer.blend("api.Image")
+        ids = [image.pk for image in images] + [other.pk, 999]
+        with django_assert_max_num_queries(12):
+            response = self.client.delete(
+                reverse("api:image-batch"), {"ids": ids}, format="json"
+            )
+        assert response.status_code == 200
+        assert response.data == {
+            "deleted": [image.pk for image in images],
+            "not_found": [other.pk, 999],
+        }
+        assert list(Image.objects.all()) == [other]
+        assert set(
+            StorageDeletion.objects.values_list("storage_key", flat=True)
+        ) == {"key0", "key1", "key2"}
+
+    def test_delete_batch_limit(self, user, settings):
+        """Tests refusing to delete too many images at once."""
+        settings.BATCH_DELETE_MAX_IMAGES = 2
+        response = self.client.delete(
+            reverse("api:image-batch"), {"ids": [1, 2, 3]}, format="json"
+        )
+        assert response.status_code == 400
+
+    def test_link_cache_invalidated(self, user):
+        """Tests dropping links of deleted images from link cache."""
+        image = mixer.blend("api.Image", owner=user)
+        link = mixer.blend(
+            "api.ExpiringLink", image=image, expiration_time=300
+        )
+        assert get_link_cache().resolve(link.pk) is not None
+        self.client.delete(reverse("api:image-detail", args=[image.pk]))
+        assert get_link_cache().resolve(link.pk) is None
+
+    def test_delete_owner(self):
+        """Tests queuing files of images deleted with their owner."""
+        user = mixer.blend("api.User")
+        mixer.blend("api.Image", owner=user, storage_key="owned")
+        user.delete()
+        assert StorageDeletion.objects.get().storage_key == "owned"
+
+
+@pytest.fixture
+def local_storage(tmp_path, settings) -> LocalStorage:
+    """Selects LocalStorage keeping files in temporary directory."""
+    settings.IMAGE_STORAGE_BACKEND = "api.storage.LocalStorage"
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path)
+    settings.LOCAL_STORAGE_URL = "http://testserver/media/"
+    return LocalStorage()
+
+
+@pytest.mark.django_db
+class TestDeleteStoredFiles:
+    """Tests for deleting queued files from storage."""
+
+    def test_batches(self):
+        """Tests deleting files in batches, keeping referenced ones."""
+        mixer.blend("api.Image", storage_key="shared")
+        schedule_deletion(["a", "b", "shared", "c", ""])
+        storage = RecordingStorage()
+        assert delete_stored_files(storage, batch_size=2) == 3
+        assert storage.calls == [["a", "b"], ["c"]]
+        assert not StorageDeletion.objects.exists()
+
+    def test_retry(self, settings):
+        """Tests postponing failed deletions, giving up after retries."""
+        settings.STORAGE_CLEANUP_RETRIES = 1
+        settings.STORAGE_CLEANUP_RETRY_BACKOFF = 30
+        schedule_deletion(["a"])
+        storage = RecordingStorage(broken=True)
+        assert delete_stored_files(storage) == 0
+        deletion = StorageDeletion.objects.get()
+        assert deletion.attempts == 1
+        assert deletion.next_attempt_at > timezone.now() + timedelta(
+            seconds=25
+        )
+        assert delete_stored_files(storage) == 0
+        assert StorageDeletion.objects.get().attempts == 1
+        deletion.next_attempt_at = timezone.now()
+        deletion.save()
+        delete_stored_files(storage)
+        assert not StorageDeletion.objects.exists()
+
+    def test_local_thumbnails(self, local_storage):
+        """Tests deleting LocalStorage file with its thumbnails."""
+        key = local_storage.upload(make_image(), "folder", "name")["key"]
+        engine = get_thumbnail_engine()
+        engine.get(key, 200)
+        assert engine.cached(key, 200)
+        schedule_deletion([key])
+        assert delete_stored_files(LocalStorage()) == 1
+        assert engine.cached(key, 200) is None
+        assert engine.cache.size == 0
+        with pytest.raises(FileNotFoundError):
+            open(local_storage.path(key))
+
+    def test_command(self, settings):
+        """Tests deleting queued files by command."""
+        settings.IMAGE_STORAGE_BACKEND = "api.benchmarking.NullStorage"
+        schedule_deletion(["a"])
+        call_command("delete_stored_files")
+        assert not StorageDeletion.objects.exists()
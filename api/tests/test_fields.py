@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image as PillowImage
+from rest_framework.exceptions import ValidationError
+
+from api.fields import ImageHeaderField
+
+
+def make_image(
+    image_format: str = "PNG", size: tuple = (10, 10)
+) -> SimpleUploadedFile:
+    """Returns uploaded image file."""
+    content = io.BytesIO()
+    PillowImage.new("RGB", size).save(content, image_format)
+    return SimpleUploadedFile("test.img", content.getvalue())
+
+
+class TestImageHeaderField:
+    """Tests for ImageHeaderField."""
+
+    def test_valid_image(self):
+        """Tests that header of valid image is read and file rewound."""
+        file = ImageHeaderField().run_validation(make_image(size=(20, 10)))
+        assert file.image_format == "PNG"
+        assert file.image_size == (20, 10)
+        assert file.content_type == "image/png"
+        assert file.tell() == 0
+
+    def test_invalid_image(self):
+        """Tests that files which are not images are refused."""
+        file = SimpleUploadedFile("test.png", b"not an image")
+        with pytest.raises(ValidationError) as error:
+            ImageHeaderField().run_validation(file)
+        assert error.value.detail[0].code == "invalid_image"
+
+    def test_unsupported_format(self):
+        """Tests that images in not accepted formats are refused."""
+        with pytest.raises(ValidationError) as error:
+            ImageHeaderField().run_validation(make_image("GIF"))
+        assert error.value.detail[0].code == "invalid_format"
+
+    def test_too_many_pixels(self, settings):
+        """Tests that images above IMAGE_MAX_PIXELS are refused."""
+        settings.IMAGE_MAX_PIXELS = 99
+        with pytest.raises(ValidationError) as error:
+            ImageHeaderField().run_validation(make_image())
+        assert error.value.detail[0].code == "too_many_pixels"
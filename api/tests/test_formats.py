@@ -0,0 +1,277 @@
+import io
+import os
+
+import pytest
+from django.urls import reverse
+from mixer.backend.django import mixer
+from PIL import Image as PillowImage
+from rest_framework.test import APIClient
+
+from api import formats, storage
+from api.storage import LocalStorage, ThumbnailURLTemplate
+from api.thumbnails import transcode
+
+WEBP_ACCEPT = "image/webp,image/apng,image/*,*/*;q=0.8"
+AVIF_ACCEPT = "image/avif,image/webp,image/*,*/*;q=0.8"
+
+
+def make_png(size: tuple = (64, 64)) -> io.BytesIO:
+    """Returns PNG file object with a gradient."""
+    image = PillowImage.linear_gradient("L").resize(size).convert("RGB")
+    content = io.BytesIO()
+    image.save(content, "PNG")
+    content.seek(0)
+    content.name = "test.png"
+    return content
+
+
+@pytest.fixture
+def local_storage(tmp_path, settings) -> LocalStorage:
+    """Selects LocalStorage keeping files in temporary directory."""
+    settings.IMAGE_STORAGE_BACKEND = "api.storage.LocalStorage"
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path)
+    settings.LOCAL_STORAGE_URL = "http://testserver/media/"
+    return LocalStorage()
+
+
+@pytest.fixture
+def avif(monkeypatch) -> None:
+    """Pretends AVIF can be encoded."""
+    monkeypatch.setattr(
+        formats,
+        "available_formats",
+        lambda: frozenset(["JPEG", "PNG", "WEBP", "AVIF"]),
+    )
+
+
+class TestNegotiateFormat:
+    """Tests for format negotiation."""
+
+    @pytest.mark.parametrize(
+        "accept, expected",
+        [
+            (AVIF_ACCEPT, "AVIF"),
+            (WEBP_ACCEPT, "WEBP"),
+            ("image/avif;q=0,image/webp", "WEBP"),
+            ("image/*,*/*", "PNG"),
+            ("", "PNG"),
+        ],
+    )
+    def test_negotiate(self, avif, accept, expected):
+        """Tests picking the most compact explicitly accepted format."""
+        assert formats.negotiate_format(accept, "PNG") == expected
+
+    def test_avif_unavailable(self, monkeypatch):
+        """Tests that formats Pillow cannot encode are not negotiated."""
+        monkeypatch.setattr(
+            formats, "available_formats", lambda: frozenset(["PNG", "WEBP"])
+        )
+        assert formats.negotiate_format(AVIF_ACCEPT, "PNG") == "WEBP"
+        with pytest.raises(ValueError):
+            formats.parse_format("avif")
+
+    @pytest.mark.parametrize(
+        "extension, expected",
+        [("webp", "WEBP"), ("JPEG", "JPEG"), ("jpg", "JPEG"), ("png", "PNG")],
+    )
+    def test_parse_format(self, extension, expected):
+        """Tests reading formats from URLs."""
+        assert formats.parse_format(extension) == expected
+
+    def test_parse_unknown_format(self):
+        """Tests refusing formats which are not served."""
+        with pytest.raises(ValueError):
+            formats.parse_format("gif")
+
+
+class TestTranscode:
+    """Tests for transcoding images."""
+
+    def test_transcode(self):
+        """Tests encoding image in another format without scaling it."""
+        content = transcode(make_png(), "WEBP", 75)
+        with PillowImage.open(io.BytesIO(content)) as image:
+            assert image.format == "WEBP"
+            assert image.size == (64, 64)
+
+    def test_quality_presets(self):
+        """Tests that lower presets make smaller files."""
+        source = make_png((256, 256)).getvalue()
+        sizes = [
+            len(
+                transcode(
+                    io.BytesIO(source),
+                    "WEBP",
+                    formats.quality_for(preset, "WEBP"),
+                )
+            )
+            for preset in ("low", "best")
+        ]
+        assert sizes[0] < sizes[1]
+        with pytest.raises(ValueError):
+            formats.quality_for("ultra", "WEBP")
+
+
+class TestFormatURLs:
+    """Tests for format options in image URLs."""
+
+    def test_template_options(self):
+        """Tests adding format options to thumbnails and original."""
+        template = ThumbnailURLTemplate((200,), options="f_auto,q_auto:eco")
+        url = "http:test.com/upload/a"
+        assert template.render(url) == {
+            "Thumbnail 200px": "http:test.com/upload/w_200,h_200,"
+            "f_auto,q_auto:eco/a"
+        }
+        assert template.original(url) == (
+            "http:test.com/upload/f_auto,q_auto:eco/a"
+        )
+        assert ThumbnailURLTemplate((200,)).original(url) == url
+
+
+@pytest.mark.django_db
+class TestImageFormatOptions:
+    """Tests for image URLs built for account tiers."""
+
+    client = APIClient()
+
+    @pytest.fixture
+    def user(self) -> object:
+        """Creates user with eco quality preset and logs them in."""
+        tier = mixer.blend(
+            "api.AccountTier",
+            name="Premium",
+            original_size=True,
+            fetch_url=False,
+            image_quality="eco",
+        )
+        tier.thumbnail_sizes.add(mixer.blend("api.Thumbnail", size=200))
+        user = mixer.blend("api.User", accountTier=tier)
+        mixer.blend("api.Image", url="http://t.com/upload/a.png", owner=user)
+        self.client.force_authenticate(user=user)
+        yield user
+        self.client.force_authenticate(user=None)
+
+    def test_quality_preset(self, user):
+        """Tests that tier preset makes negotiated URLs."""
+        image = self.client.get(reverse("api:image-list")).json()["results"][0]
+        assert image["url"] == "http://t.com/upload/f_auto,q_auto:eco/a.png"
+        assert image["Thumbnail 200px"] == (
+            "http://t.com/upload/w_200,h_200,f_auto,q_auto:eco/a.png"
+        )
+
+    def test_requested_format(self, user):
+        """Tests that ?image_format= selects the format."""
+        response = self.client.get(
+            reverse("api:image-list"), {"image_format": "webp"}
+        )
+        image = response.json()["results"][0]
+        assert image["url"] == "http://t.com/upload/f_webp,q_auto:eco/a.png"
+
+    def test_unknown_format(self, user):
+        """Tests refusing formats which are not served."""
+        response = self.client.get(
+            reverse("api:image-list"), {"image_format": "gif"}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize(
+        "backend, status_code",
+        [
+            ("api.storage.CloudinaryStorage", 200),
+            ("api.storage.LocalStorage", 400),
+        ],
+    )
+    def test_storage_formats(
+        self, user, settings, monkeypatch, backend, status_code
+    ):
+        """Tests accepting formats the storage backend serves."""
+        settings.IMAGE_STORAGE_BACKEND = backend
+        monkeypatch.setattr(
+            storage, "available_formats", lambda: frozenset(["PNG", "WEBP"])
+        )
+        response = self.client.get(
+            reverse("api:image-list"), {"image_format": "avif"}
+        )
+        assert response.status_code == status_code
+
+
+@pytest.mark.django_db
+class TestServeVariants:
+    """Tests for serving images in negotiated formats."""
+
+    def get(self, client, key: str, data: dict = None, **extra) -> tuple:
+        """Requests media, returns response, decoded format and size."""
+        response = client.get(
+            reverse("media", kwargs={"key": key}), data, **extra
+        )
+        content = b"".join(response.streaming_content)
+        with PillowImage.open(io.BytesIO(content)) as image:
+            return response, image.format, image.size
+
+    def test_negotiated_original(self, local_storage, client):
+        """Tests transcoding original to format from Accept header."""
+        key = local_storage.upload(make_png(), "user", "a")["key"]
+        response, image_format, size = self.get(
+            client, f"f_auto,q_auto:eco/{key}", HTTP_ACCEPT=WEBP_ACCEPT
+        )
+        assert image_format == "WEBP"
+        assert size == (64, 64)
+        assert response["Content-Type"] == "image/webp"
+        assert "Accept" in response["Vary"]
+
+    def test_not_accepted(self, local_storage, client):
+        """Tests serving the original to clients without WebP support."""
+        key = local_storage.upload(make_png(), "user", "a")["key"]
+        response, image_format, _ = self.get(
+            client, f"f_auto/{key}", HTTP_ACCEPT="image/*"
+        )
+        assert image_format == "PNG"
+        assert response["Content-Type"] == "image/png"
+
+    def test_format_parameter(self, local_storage, client):
+        """Tests that ?format= overrides the transformation."""
+        mixer.blend("api.Thumbnail", size=32)
+        key = local_storage.upload(make_png(), "user", "a")["key"]
+        response, image_format, size = self.get(
+            client, f"w_32,h_32,f_auto/{key}", {"format": "jpeg"}
+        )
+        assert (image_format, size) == ("JPEG", (32, 32))
+        assert "Vary" not in response
+
+    def test_variants_are_cached(self, local_storage, client):
+        """Tests caching every format and quality of the image once."""
+        key = local_storage.upload(make_png(), "user", "a")["key"]
+        self.get(client, f"f_webp,q_auto:low/{key}")
+        self.get(client, f"f_webp,q_auto:low/{key}")
+        self.get(client, f"f_webp,q_auto:best/{key}")
+        cached = [
+            name
+            for name in os.listdir(
+                os.path.join(local_storage.root, "thumbnails")
+            )
+            if not name.startswith(".")
+        ]
+        assert len(cached) == 2
+        assert all(name.endswith(".webp") for name in cached)
+
+    @pytest.mark.parametrize(
+        "transformation",
+        [
+            "f_gif",
+            "q_high",
+            "q_80",
+            "f_avif,q_1",
+            "w_0,h_0",
+            "x_1",
+            "wh_1",
+            "f_webp,f_png",
+        ],
+    )
+    def test_invalid_transformation(
+        self, local_storage, client, transformation
+    ):
+        """Tests refusing invalid transformations."""
+        key = local_storage.upload(make_png(), "user", "a")["key"]
+        url = reverse("media", kwargs={"key": f"{transformation}/{key}"})
+        assert client.get(url).status_code == 404
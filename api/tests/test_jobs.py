@@ -0,0 +1,78 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from api.jobs import PeriodicJob, purge_expired_links
+from api.models import ExpiringLink
+
+
+def make_link(expired_seconds_ago: int) -> ExpiringLink:
+    """Creates link which expired given number of seconds ago."""
+    return mixer.blend(
+        "api.ExpiringLink",
+        created_time=timezone.now() - timedelta(seconds=expired_seconds_ago),
+        expiration_time=0,
+    )
+
+
+@pytest.mark.django_db
+class TestPurgeExpiredLinks:
+    """Tests for purging expired links."""
+
+    def test_purge_in_batches(self):
+        """Tests deleting all expired links in small batches."""
+        for _ in range(5):
+            make_link(expired_seconds_ago=10)
+        valid = mixer.blend("api.ExpiringLink", expiration_time=300)
+        assert purge_expired_links(batch_size=2) == 5
+        assert list(ExpiringLink.objects.all()) == [valid]
+
+    def test_purge_keeps_recently_expired(self):
+        """Tests keeping links expired within retention time."""
+        make_link(expired_seconds_ago=100)
+        recent = make_link(expired_seconds_ago=10)
+        assert purge_expired_links(retention=50) == 1
+        assert list(ExpiringLink.objects.all()) == [recent]
+
+    def test_command(self, capsys):
+        """Tests reporting number of purged links."""
+        make_link(expired_seconds_ago=10)
+        call_command("purge_expired_links", retention=0)
+        assert "Purged 1 expired links" in capsys.readouterr().out
+
+
+class TestPeriodicJob:
+    """Tests for PeriodicJob."""
+
+    def test_calls_function_periodically(self):
+        """Tests calling function until job is stopped."""
+        called = threading.Event()
+
+        def function() -> None:
+            called.set()
+
+        job = PeriodicJob(function, 0.01)
+        job.start()
+        assert called.wait(1)
+        job.stop()
+        job.join(1)
+        assert not job.is_alive()
+
+    def test_wake(self):
+        """Tests calling function when woken before the interval."""
+        called = threading.Event()
+
+        def function() -> None:
+            called.set()
+
+        job = PeriodicJob(function, 60)
+        job.start()
+        job.wake()
+        assert called.wait(1)
+        job.stop()
+        job.join(1)
+        assert not job.is_alive()
@@ -0,0 +1,169 @@
+import time
+from datetime import timedelta
+
+import pytest
+from django.core import signing
+from django.core.cache import caches
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from api.caching import LocalCache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.links import (
+    LinkCache,
+    get_link_cache,
+    resolve_signed_link,
+    sign_link,
+)
+
+
+@pytest.fixture
+def link_cache() -> LinkCache:
+    """Returns empty LinkCache without shared cache."""
+    return LinkCache(100, local_ttl=300, negative_ttl=300)
+
+
+class TestLocalCache:
+    """Tests for LocalCache."""
+
+    def test_evicts_least_recently_used(self):
+        """Tests evicting entries above max_entries."""
+        cache = LocalCache(2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        cache.get("a")
+        cache.set("c", 3, 60)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_expires_entries(self, monkeypatch):
+        """Tests dropping entries after their time to live."""
+        cache = LocalCache(2)
+        cache.set("a", 1, 10)
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+        assert cache.get("a") is None
+
+
+@pytest.mark.django_db
+class TestLinkCache:
+    """Tests for LinkCache."""
+
+    def test_resolve_queries_database_once(
+        self, link_cache, django_assert_num_queries
+    ):
+        """Tests that valid link is read from database once."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        with django_assert_num_queries(1):
+            first = link_cache.resolve(link.pk)
+            second = link_cache.resolve(link.pk)
+        assert first == second
+        assert first.url == link.url
+        assert not first.expired
+
+    def test_expired_link_is_negative_cached(
+        self, link_cache, django_assert_num_queries
+    ):
+        """Tests that expired link is answered from the cache."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        link.created_time = timezone.now() - timedelta(seconds=600)
+        link.save()
+        with django_assert_num_queries(1):
+            assert link_cache.resolve(link.pk).expired
+            assert link_cache.resolve(link.pk).expired
+
+    def test_missing_link(self, link_cache, django_assert_num_queries):
+        """Tests that missing link is answered from the cache."""
+        with django_assert_num_queries(1):
+            assert link_cache.resolve(1) is None
+            assert link_cache.resolve(1) is None
+
+    def test_shared_cache(self, django_assert_num_queries):
+        """Tests reading links cached by other processes."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        shared_cache = caches["default"]
+        LinkCache(100, 300, 300, shared_cache).resolve(link.pk)
+        with django_assert_num_queries(0):
+            resolved = LinkCache(100, 300, 300, shared_cache).resolve(link.pk)
+        shared_cache.clear()
+        assert resolved.url == link.url
+
+    def test_deleted_link_is_invalidated(self):
+        """Tests removing deleted link from the cache."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        pk = link.pk
+        assert get_link_cache().resolve(pk) is not None
+        link.delete()
+        assert get_link_cache().resolve(pk) is None
+
+
+@pytest.mark.django_db
+class TestSignedLink:
+    """Tests for signed expiring links."""
+
+    client = APIClient()
+
+    def test_resolve_without_queries(self, django_assert_num_queries):
+        """Tests validating signed link without database queries."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        token = sign_link(link)
+        with django_assert_num_queries(0):
+            resolved = resolve_signed_link(token)
+        assert resolved.url == link.url
+        assert not resolved.expired
+
+    def test_tampered_token(self):
+        """Tests refusing token with invalid signature."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        token = sign_link(link)
+        assert resolve_signed_link(token[:-1] + "x") is None
+
+    def test_deleted_link_is_revoked(self, settings):
+        """Tests refusing signed link of deleted ExpiringLink."""
+        settings.SIGNED_LINK_REVOCATION_CACHE = "default"
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        token = sign_link(link)
+        link.delete()
+        assert resolve_signed_link(token) is None
+        caches["default"].clear()
+
+    def test_revoked_after_clock_moved(self, settings, monkeypatch):
+        """Tests revoking token signed earlier than the link is deleted."""
+        settings.SIGNED_LINK_REVOCATION_CACHE = "default"
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        now = time.time()
+        monkeypatch.setattr(signing.time, "time", lambda: now - 10)
+        token = sign_link(link)
+        monkeypatch.setattr(signing.time, "time", lambda: now)
+        assert token != sign_link(link)
+        assert resolve_signed_link(token) is not None
+        link.delete()
+        assert resolve_signed_link(token) is None
+        caches["default"].clear()
+
+    def test_get_signed_link(self, django_assert_num_queries):
+        """Tests getting signed link."""
+        link = mixer.blend("api.ExpiringLink", expiration_time=300)
+        url = reverse(
+            "api:signedlink-detail", kwargs={"token": sign_link(link)}
+        )
+        with django_assert_num_queries(0):
+            response = self.client.get(url)
+        assert response.data == {"url": link.url}
+        assert response.status_code == 200
+
+    def test_get_expired_signed_link(self):
+        """Tests getting expired signed link."""
+        link = mixer.blend(
+            "api.ExpiringLink",
+            created_time=timezone.now() - timedelta(seconds=600),
+            expiration_time=300,
+        )
+        url = reverse(
+            "api:signedlink-detail", kwargs={"token": sign_link(link)}
+        )
+        response = self.client.get(url)
+        assert response.data == {"url": "This link has expired!"}
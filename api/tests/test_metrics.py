@@ -0,0 +1,134 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+
+from api import metrics
+from api.tests.test_batch import make_png
+
+
+class TestHistogram:
+    """Tests for metrics exposition."""
+
+    def test_histogram(self):
+        """Tests cumulative buckets, sum and count of histogram."""
+        histogram = metrics.Histogram("test", "Test.", ("view",), (1, 5))
+        for value in (0.5, 3, 3, 10):
+            histogram.observe(value, 'a"b')
+        assert histogram.samples() == [
+            'test_bucket{view="a\\"b",le="1"} 1',
+            'test_bucket{view="a\\"b",le="5"} 3',
+            'test_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_sum{view="a\\"b"} 16.5',
+            'test_count{view="a\\"b"} 4',
+        ]
+
+    def test_counter(self):
+        """Tests counter exposition."""
+        counter = metrics.Counter("test", "Test.")
+        counter.inc()
+        counter.inc(2)
+        assert counter.samples() == ["test_total 3"]
+
+    def test_nested_sections(self):
+        """Tests that nested timers of one section are counted once."""
+        serialize = metrics.timed("serialize")(lambda depth: depth)
+        nested = metrics.timed("serialize")(
+            lambda: [serialize(depth) for depth in range(3)]
+        )
+        request = metrics.RequestMetrics()
+        token = metrics.current_request.set(request)
+        try:
+            nested()
+        finally:
+            metrics.current_request.reset(token)
+        assert request.sections["serialize"][1] == 1
+
+
+@pytest.mark.django_db
+class TestMetricsMiddleware:
+    """Tests for request metrics."""
+
+    @pytest.fixture
+    def client(self, settings, tmp_path) -> APIClient:
+        """Enables metrics, returns client of a user with an image."""
+        settings.METRICS_ENABLED = True
+        settings.METRICS_SERVER_TIMING = True
+        settings.IMAGE_STORAGE_BACKEND = "api.storage.LocalStorage"
+        settings.LOCAL_STORAGE_ROOT = str(tmp_path)
+        settings.THUMBNAIL_PRERENDER = False
+        tier = mixer.blend(
+            "api.AccountTier",
+            original_size=True,
+            fetch_url=False,
+            image_quality="",
+        )
+        user = mixer.blend("api.User", accountTier=tier)
+        mixer.blend("api.Image", url="http://t.com/upload/a.png", owner=user)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def test_server_timing(self, client):
+        """Tests that database and serialization time are reported."""
+        response = client.get(reverse("api:image-list"))
+        timing = response["Server-Timing"]
+        assert timing.startswith("total;dur=")
+        assert "db;dur=" in timing and 'queries"' in timing
+        assert "serialize;dur=" in timing
+
+    def test_upload_timing(self, client):
+        """Tests that uploads and image validation are reported."""
+        response = client.post(
+            reverse("api:image-list"),
+            {
+                "name": "first",
+                "image": SimpleUploadedFile(
+                    "first.png", make_png("first"), "image/png"
+                ),
+            },
+            format="multipart",
+        )
+        assert response.status_code == 201
+        assert "upload;dur=" in response["Server-Timing"]
+        assert "validate;dur=" in response["Server-Timing"]
+        exposition = client.get(reverse("metrics")).content.decode()
+        assert (
+            "imageapi_storage_upload_duration_seconds_count"
+            '{backend="LocalStorage"}'
+        ) in exposition
+
+    def test_exposition(self, client):
+        """Tests that requests are exposed in Prometheus text format."""
+        client.get(reverse("api:image-list"))
+        response = client.get(reverse("metrics"))
+        assert response["Content-Type"].startswith("text/plain")
+        exposition = response.content.decode()
+        assert (
+            "# TYPE imageapi_request_duration_seconds histogram" in exposition
+        )
+        assert (
+            'imageapi_request_duration_seconds_bucket{view="api:image-list",'
+            'method="GET",status="200",le="+Inf"}'
+        ) in exposition
+        assert 'imageapi_request_db_queries_count{view="api:image-list"}' in (
+            exposition
+        )
+
+    def test_token(self, client, settings):
+        """Tests that METRICS_TOKEN protects the endpoint."""
+        settings.METRICS_TOKEN = "secret"
+        assert client.get(reverse("metrics")).status_code == 401
+        response = client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+        assert response.status_code == 200
+
+    def test_disabled(self, settings):
+        """Tests that disabled metrics add no header nor endpoint."""
+        settings.METRICS_ENABLED = False
+        client = APIClient()
+        response = client.get(reverse("api:image-list"))
+        assert "Server-Timing" not in response
+        assert client.get(reverse("metrics")).status_code == 404
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from mixer.backend.django import mixer
 import pytest
 
@@ -31,6 +33,21 @@ class TestExpiringLinkModel:
         test_expiring_link = mixer.blend("api.ExpiringLink", name="test_link")
         assert test_expiring_link.name == "test_link"
 
+    def test_expiring_link_expires_at(self):
+        """Tests computing expiry date and time on save."""
+        test_expiring_link = mixer.blend(
+            "api.ExpiringLink", expiration_time=300
+        )
+        assert test_expiring_link.expires_at == (
+            test_expiring_link.created_time + timedelta(seconds=300)
+        )
+        test_expiring_link.expiration_time = 600
+        test_expiring_link.save(update_fields=["expiration_time"])
+        test_expiring_link.refresh_from_db()
+        assert test_expiring_link.expires_at == (
+            test_expiring_link.created_time + timedelta(seconds=600)
+        )
+
     def test_expiring_link_get_url(self):
         """Tests get_url() model method."""
         test_expiring_link = mixer.blend("api.ExpiringLink")
@@ -67,7 +67,7 @@ class TestImageSerializer:
             ImageSerializer():
                 name = CharField(max_length=256, validators=[<UniqueValidator(queryset=Image.objects.all())>])
                 url = URLField(read_only=True)
-                image = ImageField(allow_empty_file=False, validators=[<django.core.validators.FileExtensionValidator object>], write_only=True)
+                image = ImageHeaderField(allow_empty_file=False, validators=[<django.core.validators.FileExtensionValidator object>], write_only=True)
             """
         )
         assert repr(ImageSerializer()) == expected
@@ -85,7 +85,7 @@ class TestImageLinkSerializer:
             ImageLinkSerializer():
                 name = CharField(max_length=256, validators=[<UniqueValidator(queryset=Image.objects.all())>])
                 url = URLField(read_only=True)
-                image = ImageField(allow_empty_file=False, validators=[<django.core.validators.FileExtensionValidator object>], write_only=True)
+                image = ImageHeaderField(allow_empty_file=False, validators=[<django.core.validators.FileExtensionValidator object>], write_only=True)
                 link_expiry_time = IntegerField(required=False, validators=[<django.core.validators.MaxValueValidator object>, <django.core.validators.MinValueValidator object>], write_only=True)
             """
         )
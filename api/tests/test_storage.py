@@ -0,0 +1,201 @@
+import hashlib
+import io
+import os
+
+import cloudinary.uploader
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image as PillowImage
+
+from api.storage import (
+    CloudinaryStorage,
+    LocalStorage,
+    ThumbnailURLTemplate,
+    get_url_template,
+)
+
+
+def make_png(size: tuple = (10, 10), color: str = "red") -> io.BytesIO:
+    """Returns PNG file object."""
+    content = io.BytesIO()
+    PillowImage.new("RGB", size, color).save(content, "PNG")
+    content.seek(0)
+    content.name = "test.png"
+    return content
+
+
+@pytest.fixture
+def local_storage(tmp_path, settings) -> LocalStorage:
+    """Selects LocalStorage keeping files in temporary directory."""
+    settings.IMAGE_STORAGE_BACKEND = "api.storage.LocalStorage"
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path)
+    settings.LOCAL_STORAGE_URL = "http://testserver/media/"
+    return LocalStorage()
+
+
+class TestCloudinaryStorage:
+    """Tests for CloudinaryStorage."""
+
+    def test_url_for_size(self):
+        """Tests adding resize transformation to the URL."""
+        url = CloudinaryStorage().url_for_size("http:test.com/upload/a", 200)
+        assert url == "http:test.com/upload/w_200,h_200/a"
+
+    @pytest.mark.parametrize(
+        "file_size, method", [(10, "upload"), (11, "upload_large")]
+    )
+    def test_big_files_are_chunked(
+        self, file_size, method, settings, monkeypatch
+    ):
+        """Tests that files above CLOUDINARY_CHUNK_SIZE are chunked."""
+        settings.CLOUDINARY_CHUNK_SIZE = 10
+        calls = []
+
+        def upload(file, **options):
+            calls.append(options)
+            return {"url": "http://test.com/upload/a", "public_id": "a"}
+
+        monkeypatch.setattr(cloudinary.uploader, method, upload)
+        file = SimpleUploadedFile("a.png", b"a" * file_size)
+        output = CloudinaryStorage().upload(file, "user", "a")
+        assert output == {"url": "http://test.com/upload/a", "key": "a"}
+        assert len(calls) == 1
+
+    @pytest.mark.parametrize(
+        "scope, size, public_id, overwrite",
+        [
+            ("owner", None, "{digest}", False),
+            ("global", 200, "{digest}_200", False),
+            ("none", None, "a", True),
+        ],
+    )
+    def test_public_id(
+        self, scope, size, public_id, overwrite, settings, monkeypatch
+    ):
+        """Tests naming files shared by deduplicated images by content."""
+        settings.IMAGE_DEDUP_SCOPE = scope
+        calls = []
+
+        def upload(file, **options):
+            calls.append(options)
+            return {"url": "http://test.com/upload/a", "public_id": "a"}
+
+        monkeypatch.setattr(cloudinary.uploader, "upload", upload)
+        file = make_png()
+        digest = hashlib.sha256(file.getvalue()).hexdigest()
+        CloudinaryStorage().upload(file, "user", "a", size)
+        assert calls[0]["public_id"] == public_id.format(digest=digest)
+        assert calls[0]["overwrite"] is overwrite
+
+
+class TestThumbnailURLTemplate:
+    """Tests for ThumbnailURLTemplate."""
+
+    def test_render(self):
+        """Tests building URLs of all sizes."""
+        template = ThumbnailURLTemplate((200, 400))
+        assert template.render("http:test.com/upload/a") == {
+            "Thumbnail 200px": "http:test.com/upload/w_200,h_200/a",
+            "Thumbnail 400px": "http:test.com/upload/w_400,h_400/a",
+        }
+
+    def test_render_transformation(self):
+        """Tests adding custom transformation."""
+        template = ThumbnailURLTemplate((200,), "w_{size},h_{size},f_webp")
+        assert template.render("http:test.com/upload/a") == {
+            "Thumbnail 200px": "http:test.com/upload/w_200,h_200,f_webp/a"
+        }
+
+    def test_templates_are_shared(self):
+        """Tests that template is compiled once for the same sizes."""
+        assert get_url_template((200, 400)) is get_url_template((200, 400))
+
+
+class TestLocalStorage:
+    """Tests for LocalStorage."""
+
+    def test_upload_is_content_addressed(self, local_storage):
+        """Tests that identical files are stored under the same key."""
+        first = local_storage.upload(make_png(), "user", "first")
+        second = local_storage.upload(make_png(), "other", "second")
+        third = local_storage.upload(make_png(color="blue"), "user", "third")
+        assert first == second
+        assert first["key"] != third["key"]
+        assert first["url"] == f"http://testserver/media/upload/{first['key']}"
+        assert first["key"].endswith(".png")
+
+    def test_upload_resized(self, local_storage):
+        """Tests storing image scaled to given size."""
+        output = local_storage.upload(make_png((400, 300)), "user", "a", 200)
+        with PillowImage.open(local_storage.path(output["key"])) as image:
+            assert image.size == (200, 200)
+
+    def test_upload_many(self, local_storage):
+        """Tests storing many files at once."""
+        items = [
+            {"file": make_png(color=color), "folder": "user", "name": color}
+            for color in ["red", "green", "blue"]
+        ]
+        outputs = local_storage.upload_many(items, parallelism=2)
+        assert len({output["key"] for output in outputs}) == 3
+
+    def test_upload_leaves_file_open(self, local_storage):
+        """Tests that the passed file object can be used again."""
+        file = make_png()
+        first = local_storage.upload(file, "user", "a")
+        assert not file.closed
+        assert local_storage.upload(file, "user", "b") == first
+
+    def test_failed_upload_removes_temporary_file(
+        self, local_storage, monkeypatch
+    ):
+        """Tests that no temporary file is left when copying fails."""
+        file = make_png()
+
+        def read(*args) -> bytes:
+            raise OSError("Disk failure")
+
+        monkeypatch.setattr(file, "read", read)
+        with pytest.raises(OSError):
+            local_storage.upload(file, "user", "a")
+        assert not os.listdir(local_storage.root)
+        assert not file.closed
+
+    def test_delete(self, local_storage):
+        """Tests removing stored file."""
+        output = local_storage.upload(make_png(), "user", "a")
+        local_storage.delete(output["key"])
+        local_storage.delete(output["key"])
+        assert not os.path.exists(local_storage.path(output["key"]))
+
+    def test_path_outside_root(self, local_storage):
+        """Tests refusing keys which point outside storage root."""
+        with pytest.raises(ValueError):
+            local_storage.path("../secret")
+
+
+class TestServeMedia:
+    """Tests for serve_media view."""
+
+    def test_serve_file(self, local_storage, client):
+        """Tests sending stored file."""
+        output = local_storage.upload(make_png(), "user", "a")
+        response = client.get(reverse("media", kwargs={"key": output["key"]}))
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/png"
+        assert b"".join(response.streaming_content) == make_png().read()
+
+    def test_serve_file_with_sendfile(self, local_storage, client, settings):
+        """Tests delegating sending the file to web server."""
+        settings.LOCAL_STORAGE_SENDFILE_HEADER = "X-Sendfile"
+        output = local_storage.upload(make_png(), "user", "a")
+        response = client.get(reverse("media", kwargs={"key": output["key"]}))
+        assert response.status_code == 200
+        assert response["X-Sendfile"] == local_storage.path(output["key"])
+        assert response.content == b""
+
+    def test_serve_missing_file(self, local_storage, client):
+        """Tests requesting file which is not stored."""
+        response = client.get(reverse("media", kwargs={"key": "aa/missing"}))
+        assert response.status_code == 404
@@ -0,0 +1,215 @@
+import pytest
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APIClient
+
+from api import serializers, throttling
+from api.models import User
+from api.tests.test_batch import FakeStorage, make_png
+
+
+class Clock:
+    """Replaces time module in api.throttling with settable time."""
+
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+    """Tests for take_token()."""
+
+    @pytest.fixture(
+        params=[
+            throttling.LocalCounterStore,
+            lambda: throttling.CacheCounterStore(caches["default"]),
+        ]
+    )
+    def store(self, request) -> object:
+        """Returns counter store."""
+        return request.param()
+
+    def test_burst_and_refill(self, store, monkeypatch):
+        """Tests that full bucket allows burst and refills over time."""
+        clock = Clock(1000000.0)
+        monkeypatch.setattr(throttling, "time", clock)
+        key = f"bucket:{id(store)}"
+        assert [throttling.take_token(store, key, 1, 3) for _ in range(3)] == [
+            0,
+            0,
+            0,
+        ]
+        assert throttling.take_token(store, key, 1, 3) == 1
+        clock.now += 0.5
+        assert throttling.take_token(store, key, 1, 3) == 0.5
+        clock.now += 0.5
+        assert throttling.take_token(store, key, 1, 3) == 0
+        clock.now += 60
+        assert [throttling.take_token(store, key, 1, 3) for _ in range(4)] == [
+            0,
+            0,
+            0,
+            1,
+        ]
+
+    def test_counter_store(self, store):
+        """Tests adding to counters."""
+        assert store.incr("counter:a", 5, 60) == 5
+        assert store.incr("counter:a", -2, 60) == 3
+        assert store.incr("counter:b", 1, 60) == 1
+        store.touch("counter:a", 120)
+        assert store.incr("counter:a", 1, 60) == 4
+
+
+@pytest.mark.parametrize(
+    "cache_name, warned",
+    [("", True), ("default", True), ("redis", False)],
+)
+def test_check_counter_store(settings, caplog, cache_name, warned):
+    """Tests warning about counters not shared by processes."""
+    settings.CACHES = {
+        **settings.CACHES,
+        "redis": {
+            "BACKEND": "api.cache_backends.RedisCache",
+            "LOCATION": "redis://localhost:6379/0",
+            "OPTIONS": {"CLIENT_CLASS": "api.tests.test_caching.FakeRedis"},
+        },
+    }
+    settings.THROTTLE_CACHE = cache_name
+    settings.SERVER_MODE = "wsgi"
+    throttling.check_counter_store()
+    assert bool(caplog.records) is warned
+    caplog.clear()
+    settings.SERVER_MODE = "dev"
+    throttling.check_counter_store()
+    assert not caplog.records
+
+
+@pytest.mark.django_db
+class TestTierLimits:
+    """Tests for limits of account tiers."""
+
+    client = APIClient()
+
+    @pytest.fixture
+    def tier(self, monkeypatch, settings) -> object:
+        """Creates tier and logged in user, selects fake storage."""
+        settings.THROTTLE_CACHE = ""
+        settings.IMAGE_LIST_CACHE = ""
+        monkeypatch.setattr(serializers, "get_storage", FakeStorage)
+        tier = mixer.blend(
+            "api.AccountTier", original_size=True, fetch_url=False
+        )
+        user = mixer.blend("api.User", accountTier=tier)
+        self.client.force_authenticate(user=user)
+        yield tier
+        self.client.force_authenticate(user=None)
+
+    def upload(self, name: str) -> object:
+        """Uploads an image."""
+        return self.client.post(
+            reverse("api:image-list"),
+            {
+                "name": name,
+                "image": SimpleUploadedFile(
+                    f"{name}.png", make_png(name), "image/png"
+                ),
+            },
+            format="multipart",
+        )
+
+    def test_request_rate(self, tier):
+        """Tests that requests above the rate get 429 with Retry-After."""
+        tier.requests_per_minute = 2
+        tier.save()
+        url = reverse("api:image-list")
+        assert self.client.get(url).status_code == 200
+        assert self.client.get(url).status_code == 200
+        response = self.client.get(url)
+        assert response.status_code == 429
+        assert 0 < int(response["Retry-After"]) <= 30
+
+    def test_concurrent_uploads(self, tier, settings):
+        """Tests that uploads above the limit are rejected."""
+        tier.concurrent_uploads = 0
+        tier.save()
+        response = self.upload("first")
+        assert response.status_code == 429
+        assert response["Retry-After"] == str(
+            settings.THROTTLE_UPLOAD_RETRY_AFTER
+        )
+
+    def test_upload_slot_released(self, tier):
+        """Tests that finished uploads free their slots."""
+        tier.concurrent_uploads = 1
+        tier.save()
+        assert self.upload("first").status_code == 201
+        assert self.upload("second").status_code == 201
+
+    def test_daily_quota(self, tier):
+        """Tests that uploads above daily quota are rejected."""
+        tier.daily_upload_bytes = len(make_png("first")) + 10
+        tier.save()
+        assert self.upload("first").status_code == 201
+        response = self.upload("second")
+        assert response.status_code == 429
+        assert response.json()["detail"].startswith(
+            "Daily upload quota exceeded."
+        )
+        assert 0 < int(response["Retry-After"]) <= 24 * 3600
+
+    def test_batch_quota(self, tier):
+        """Tests that batch uploads are charged to the quota."""
+        tier.daily_upload_bytes = 10
+        tier.save()
+        response = self.client.post(
+            reverse("api:image-batch"),
+            {
+                "images": [
+                    SimpleUploadedFile(
+                        f"{name}.png", make_png(name), "image/png"
+                    )
+                    for name in ("a", "b")
+                ]
+            },
+            format="multipart",
+        )
+        assert response.status_code == 429
+
+    def test_expired_slot_counter(self, tier, settings, monkeypatch):
+        """Tests that slot counter expiring during upload stays at zero."""
+        clock = Clock(1000.0)
+        monkeypatch.setattr(throttling, "time", clock)
+        tier.concurrent_uploads = 1
+        tier.save()
+        user = User.objects.get(accountTier=tier)
+        with throttling.upload_limits(user, []):
+            clock.now += settings.THROTTLE_UPLOAD_SLOT_TIMEOUT + 1
+        with throttling.upload_limits(user, []):
+            with pytest.raises(Throttled):
+                with throttling.upload_limits(user, []):
+                    pass
+
+    def test_failed_upload_refunds_quota(self, tier):
+        """Tests giving quota of failed uploads back."""
+        tier.daily_upload_bytes = len(make_png("first")) + 10
+        tier.save()
+        user = User.objects.get(accountTier=tier)
+        file = SimpleUploadedFile("a.png", make_png("first"), "image/png")
+        with pytest.raises(ConnectionError):
+            with throttling.upload_limits(user, [file]):
+                raise ConnectionError("timeout")
+        assert self.upload("first").status_code == 201
+
+    def test_unlimited_tier(self, tier):
+        """Tests that tiers without limits are not throttled."""
+        url = reverse("api:image-list")
+        assert all(self.client.get(url).status_code == 200 for _ in range(5))
@@ -0,0 +1,190 @@
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from mixer.backend.django import mixer
+from PIL import Image as PillowImage
+
+from api import thumbnails
+from api.storage import LocalStorage
+from api.thumbnails import (
+    DiskLRUCache,
+    ThumbnailEngine,
+    render_thumbnail,
+    render_thumbnails,
+)
+
+
+def make_image(size: tuple = (800, 600), image_format: str = "JPEG"):
+    """Returns image file object."""
+    content = io.BytesIO()
+    PillowImage.new("RGB", size, "red").save(content, image_format)
+    content.seek(0)
+    content.name = f"test.{thumbnails.FORMATS[image_format]}"
+    return content
+
+
+@pytest.fixture
+def local_storage(tmp_path, settings) -> LocalStorage:
+    """Selects LocalStorage keeping files in temporary directory."""
+    settings.IMAGE_STORAGE_BACKEND = "api.storage.LocalStorage"
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path)
+    settings.LOCAL_STORAGE_URL = "http://testserver/media/"
+    return LocalStorage()
+
+
+class TestRenderThumbnail:
+    """Tests for render_thumbnail."""
+
+    @pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+    def test_render(self, image_format):
+        """Tests scaling image to thumbnail size."""
+        content = render_thumbnail(make_image(image_format=image_format), 200)
+        with PillowImage.open(io.BytesIO(content)) as thumbnail:
+            assert thumbnail.size == (200, 200)
+            assert thumbnail.format == image_format
+
+    def test_render_many_sizes(self):
+        """Tests rendering every size in one pass."""
+        rendered = render_thumbnails(make_image(), [200, 400, 100])
+        for size, content in rendered.items():
+            with PillowImage.open(io.BytesIO(content)) as thumbnail:
+                assert thumbnail.size == (size, size)
+        assert sorted(rendered) == [100, 200, 400]
+
+
+class TestDiskLRUCache:
+    """Tests for DiskLRUCache."""
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Tests removing least recently used files above size limit."""
+        cache = DiskLRUCache(tmp_path, max_bytes=20)
+        cache.put("a", b"0123456789")
+        cache.put("b", b"0123456789")
+        cache.get("a")
+        cache.put("c", b"0123456789")
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.size == 20
+
+    def test_loads_existing_files(self, tmp_path):
+        """Tests reusing files cached by previous process."""
+        DiskLRUCache(tmp_path, max_bytes=20).put("a", b"0123456789")
+        cache = DiskLRUCache(tmp_path, max_bytes=20)
+        assert cache.get("a") is not None
+        assert cache.size == 10
+
+    def test_shared_directory(self, tmp_path):
+        """Tests caches of two processes sharing one directory."""
+        first = DiskLRUCache(tmp_path, max_bytes=15, rescan_interval=0)
+        first.put("a", b"0123456789")
+        second = DiskLRUCache(tmp_path, max_bytes=15, rescan_interval=0)
+        second.put("b", b"0123456789")
+        assert first.get("a") is None
+        assert first.size == 0
+        assert first.delete(("b",)) == 1
+        assert second.get("b") is None
+        assert second.size == 0
+
+
+class TestThumbnailEngine:
+    """Tests for ThumbnailEngine."""
+
+    def test_concurrent_requests_render_once(
+        self, local_storage, tmp_path, monkeypatch
+    ):
+        """Tests that concurrent requests wait for a single render."""
+        renders = []
+
+        def slow_render(*args) -> bytes:
+            renders.append(args)
+            time.sleep(0.1)
+            return b"thumbnail"
+
+        monkeypatch.setattr(thumbnails, "render_thumbnail", slow_render)
+        key = local_storage.upload(make_image(), "user", "a")["key"]
+        engine = ThumbnailEngine(
+            local_storage, DiskLRUCache(tmp_path / "cache", 1024)
+        )
+        paths = []
+        threads = [
+            threading.Thread(target=lambda: paths.append(engine.get(key, 200)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(renders) == 1
+        assert len(set(paths)) == 1
+        assert len(paths) == 5
+
+    def test_prerender(self, local_storage, tmp_path):
+        """Tests rendering and caching all missing sizes."""
+        key = local_storage.upload(make_image(), "user", "a")["key"]
+        engine = ThumbnailEngine(
+            local_storage, DiskLRUCache(tmp_path / "cache", 2**20)
+        )
+        engine.get(key, 200)
+        with ThreadPoolExecutor() as executor:
+            future = engine.prerender(key, [200, 400], executor=executor)
+            assert future.result() == [400]
+            assert engine.prerender(key, [200, 400], executor) is None
+        assert engine.cached(key, 400) is not None
+
+    def test_renders_file_removed_by_other_process(
+        self, local_storage, tmp_path
+    ):
+        """Tests rendering again thumbnail evicted by another process."""
+        key = local_storage.upload(make_image(), "user", "a")["key"]
+        engine = ThumbnailEngine(
+            local_storage, DiskLRUCache(tmp_path / "cache", 2**20)
+        )
+        os.remove(engine.get(key, 200))
+        assert engine.cached(key, 200) is None
+        assert os.path.isfile(engine.get(key, 200))
+
+
+@pytest.mark.django_db
+class TestBackfillThumbnails:
+    """Tests for backfill_thumbnails command."""
+
+    def test_backfill(self, local_storage, capsys):
+        """Tests rendering thumbnails of existing images."""
+        thumbnail = mixer.blend("api.Thumbnail", size=100)
+        tier = mixer.blend("api.AccountTier", name="Premium")
+        tier.thumbnail_sizes.add(thumbnail)
+        key = local_storage.upload(make_image(), "user", "a")["key"]
+        mixer.blend("api.Image", storage_key=key, owner__accountTier=tier)
+        call_command("backfill_thumbnails", workers=1)
+        engine = thumbnails.get_thumbnail_engine()
+        assert engine.cached(key, 100) is not None
+        assert "1 images, 1 thumbnails" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+class TestServeThumbnail:
+    """Tests for serving thumbnails of LocalStorage images."""
+
+    def test_serve_thumbnail(self, local_storage, client):
+        """Tests rendering thumbnail on first request."""
+        mixer.blend("api.Thumbnail", size=200)
+        key = local_storage.upload(make_image(), "user", "a")["key"]
+        url = reverse("media", kwargs={"key": f"w_200,h_200/{key}"})
+        response = client.get(url)
+        content = b"".join(response.streaming_content)
+        with PillowImage.open(io.BytesIO(content)) as thumbnail:
+            assert thumbnail.size == (200, 200)
+        assert response.status_code == 200
+
+    def test_serve_unknown_size(self, local_storage, client):
+        """Tests refusing sizes which are not Thumbnail sizes."""
+        key = local_storage.upload(make_image(), "user", "a")["key"]
+        url = reverse("media", kwargs={"key": f"w_300,h_300/{key}"})
+        assert client.get(url).status_code == 404
@@ -0,0 +1,104 @@
+import pytest
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+
+from api.tiers import TierInfo, get_tier_cache
+
+
+@pytest.fixture
+def tier() -> object:
+    """Creates tier with two thumbnail sizes."""
+    tier = mixer.blend(
+        "api.AccountTier",
+        name="Premium",
+        original_size=True,
+        fetch_url=False,
+        image_quality="",
+    )
+    tier.thumbnail_sizes.add(
+        mixer.blend("api.Thumbnail", size=400),
+        mixer.blend("api.Thumbnail", size=200),
+    )
+    return tier
+
+
+@pytest.mark.django_db
+class TestTierCache:
+    """Tests for TierCache."""
+
+    def test_get(self, tier, django_assert_num_queries):
+        """Tests that tier is read from database once."""
+        get_tier_cache().get(tier.pk)
+        with django_assert_num_queries(0):
+            info = get_tier_cache().get(tier.pk)
+        assert info == TierInfo(tier.pk, "Premium", True, False, (200, 400))
+
+    def test_missing_tier(self):
+        """Tests that missing tier and user without tier get None."""
+        user = mixer.blend("api.User", accountTier=None)
+        assert get_tier_cache().get(0) is None
+        assert get_tier_cache().for_user(user) is None
+
+    def test_tier_change_invalidates(self, tier):
+        """Tests that saving tier drops cached permissions."""
+        get_tier_cache().get(tier.pk)
+        tier.fetch_url = True
+        tier.save()
+        assert get_tier_cache().get(tier.pk).fetch_url
+
+    def test_thumbnail_sizes_change_invalidates(self, tier):
+        """Tests that adding, removing and editing thumbnails drops cache."""
+        get_tier_cache().get(tier.pk)
+        thumbnail = mixer.blend("api.Thumbnail", size=100)
+        tier.thumbnail_sizes.add(thumbnail)
+        assert get_tier_cache().get(tier.pk).thumbnail_sizes == (
+            100,
+            200,
+            400,
+        )
+        thumbnail.size = 300
+        thumbnail.save()
+        assert get_tier_cache().get(tier.pk).thumbnail_sizes == (
+            200,
+            300,
+            400,
+        )
+        tier.thumbnail_sizes.remove(thumbnail)
+        assert get_tier_cache().get(tier.pk).thumbnail_sizes == (200, 400)
+        assert get_tier_cache().thumbnail_sizes() == {200, 300, 400}
+
+    def test_list_images_without_tier_queries(
+        self, tier, django_assert_num_queries, settings
+    ):
+        """Tests that hot requests do not query tier data."""
+        settings.IMAGE_LIST_CACHE = ""
+        client = APIClient()
+        user = mixer.blend("api.User", accountTier=tier)
+        mixer.cycle(3).blend(
+            "api.Image", url="http://t.com/upload/a", owner=user
+        )
+        client.force_authenticate(user=user)
+        url = reverse("api:image-list")
+        client.get(url)
+        with django_assert_num_queries(1):
+            response = client.get(url)
+        assert response.status_code == 200
+        assert "Thumbnail 400px" in response.data["results"][0]
+
+    def test_locmem_timeout(self, settings, tmp_path):
+        """Tests keeping tiers in per-process cache for local TTL only."""
+        settings.TIER_CACHE_LOCAL_TTL = 60
+        settings.TIER_CACHE_TIMEOUT = 3600
+        assert get_tier_cache().timeout == 60
+        settings.CACHES = {
+            **settings.CACHES,
+            "shared": {
+                "BACKEND": (
+                    "django.core.cache.backends.filebased.FileBasedCache"
+                ),
+                "LOCATION": str(tmp_path),
+            },
+        }
+        settings.TIER_CACHE = "shared"
+        assert get_tier_cache().timeout == 3600
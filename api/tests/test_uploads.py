@@ -0,0 +1,264 @@
+import io
+import os
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import mixer
+from PIL import Image as PillowImage
+from rest_framework.test import APIClient
+
+from api import serializers
+from api.links import get_link_cache
+from api.models import Image
+from api.storage import StorageBackend
+from api.uploads import (
+    SpooledFileUploadHandler,
+    UploadQueue,
+    UploadQueueFull,
+)
+
+
+class FakeStorage(StorageBackend):
+    """Storage which pretends to store files in the cloud."""
+
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.attempts = 0
+
+    def upload(
+        self, file: object, folder: str, name: str, size: int = None
+    ) -> dict:
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError()
+        return {"url": f"http://test.com/upload/{name}.png", "key": name}
+
+
+def make_png(name: str = "test.png") -> SimpleUploadedFile:
+    """Returns uploaded PNG file."""
+    content = io.BytesIO()
+    PillowImage.new("RGB", (10, 10)).save(content, "PNG")
+    return SimpleUploadedFile(name, content.getvalue(), "image/png")
+
+
+@pytest.fixture
+def spooled_file(tmp_path) -> str:
+    """Creates spooled file."""
+    path = tmp_path / "spooled.png"
+    path.write_bytes(b"image")
+    return str(path)
+
+
+class TestSpooledFileUploadHandler:
+    """Tests for SpooledFileUploadHandler."""
+
+    def receive(self, chunks: list) -> object:
+        """Streams chunks through the handler, returns received file."""
+        handler = SpooledFileUploadHandler()
+        handler.new_file("image", "test.png", "image/png", None, None)
+        start = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, start)
+            start += len(chunk)
+        return handler.file_complete(start)
+
+    def test_small_file_stays_in_memory(self, settings):
+        """Tests that file below FILE_UPLOAD_MAX_MEMORY_SIZE is in memory."""
+        settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 100
+        file = self.receive([b"a" * 50])
+        assert not file.file._rolled
+        assert file.size == 50
+        assert file.read() == b"a" * 50
+
+    def test_big_file_is_spooled_to_disk(self, settings):
+        """Tests that file above FILE_UPLOAD_MAX_MEMORY_SIZE is on disk."""
+        settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 100
+        file = self.receive([b"a" * 80, b"b" * 80])
+        assert file.file._rolled
+        assert file.size == 160
+        assert file.read() == b"a" * 80 + b"b" * 80
+
+
+@pytest.mark.django_db(transaction=True)
+class TestUploadQueue:
+    """Tests for UploadQueue."""
+
+    def test_upload_marks_image_ready(self, spooled_file):
+        """Tests that finished upload fills in url of pending image."""
+        image = mixer.blend("api.Image", url="", status=Image.PENDING)
+        queue = UploadQueue(FakeStorage(), max_workers=1)
+        options = {"folder": "user", "name": "a"}
+        url = queue.submit(image.pk, spooled_file, options).result()
+        image.refresh_from_db()
+        assert url == "http://test.com/upload/a.png"
+        assert image.url == url
+        assert image.storage_key == "a"
+        assert image.status == Image.READY
+
+    def test_upload_is_retried(self, spooled_file):
+        """Tests that failed upload is retried."""
+        storage = FakeStorage(failures=2)
+        image = mixer.blend("api.Image", url="", status=Image.PENDING)
+        queue = UploadQueue(storage, retries=2, backoff=0)
+        options = {"folder": "user", "name": "a"}
+        queue.submit(image.pk, spooled_file, options).result()
+        image.refresh_from_db()
+        assert storage.attempts == 3
+        assert image.status == Image.READY
+
+    def test_upload_failure_marks_image_failed(self, spooled_file):
+        """Tests that image is marked failed after last retry."""
+        image = mixer.blend("api.Image", url="", status=Image.PENDING)
+        queue = UploadQueue(FakeStorage(failures=2), retries=1, backoff=0)
+        options = {"folder": "user", "name": "a"}
+        with pytest.raises(ConnectionError):
+            queue.submit(image.pk, spooled_file, options).result()
+        image.refresh_from_db()
+        assert image.status == Image.FAILED
+
+    def test_upload_invalidates_links(self, spooled_file):
+        """Tests dropping links resolved while the image was pending."""
+        image = mixer.blend("api.Image", url="", status=Image.PENDING)
+        link = mixer.blend(
+            "api.ExpiringLink", image=image, url="", expiration_time=300
+        )
+        assert get_link_cache().resolve(link.pk).url == ""
+        queue = UploadQueue(FakeStorage(), max_workers=1)
+        options = {"folder": "user", "name": "a"}
+        url = queue.submit(image.pk, spooled_file, options).result()
+        assert get_link_cache().resolve(link.pk).url == url
+
+    def test_full_queue_rejects_upload(self, spooled_file):
+        """Tests that queue refuses jobs above max_pending."""
+        queue = UploadQueue(FakeStorage(), max_pending=0)
+        with pytest.raises(UploadQueueFull):
+            queue.submit(1, spooled_file, {})
+
+
+@pytest.mark.django_db
+def test_fail_stale_uploads(settings, tmp_path):
+    """Tests failing images whose uploads were lost."""
+    settings.UPLOAD_SPOOL_DIR = str(tmp_path)
+    created_time = timezone.now() - timedelta(hours=2)
+    stale = mixer.blend(
+        "api.Image", status=Image.PENDING, created_time=created_time
+    )
+    pending = mixer.blend("api.Image", status=Image.PENDING)
+    ready = mixer.blend("api.Image", created_time=created_time)
+    old_file, new_file = tmp_path / "old.png", tmp_path / "new.png"
+    old_file.write_bytes(b"image")
+    new_file.write_bytes(b"image")
+    os.utime(old_file, (created_time.timestamp(),) * 2)
+    call_command("fail_stale_uploads", older_than=3600)
+    assert Image.objects.get(pk=stale.pk).status == Image.FAILED
+    assert Image.objects.get(pk=pending.pk).status == Image.PENDING
+    assert Image.objects.get(pk=ready.pk).status == Image.READY
+    assert os.listdir(tmp_path) == ["new.png"]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncUpload:
+    """Tests for uploading images in the background."""
+
+    client = APIClient()
+
+    def test_post_image_returns_accepted(
+        self, settings, tmp_path, monkeypatch
+    ):
+        """Tests that POST responds before the upload is finished."""
+        settings.UPLOAD_ASYNC = True
+        settings.UPLOAD_SPOOL_DIR = str(tmp_path)
+        queue = UploadQueue(FakeStorage(), max_workers=1)
+        monkeypatch.setattr(serializers, "get_upload_queue", lambda: queue)
+        tier = mixer.blend(
+            "api.AccountTier",
+            name="Basic",
+            original_size=True,
+            fetch_url=False,
+        )
+        user = mixer.blend("api.User", accountTier=tier)
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            reverse("api:image-list"),
+            {"name": "test", "image": make_png()},
+            format="multipart",
+        )
+        queue.shutdown()
+        self.client.force_authenticate(user=None)
+        image = Image.objects.get(name="test")
+        assert response.status_code == 202
+        assert response.data["status"] == Image.PENDING
+        assert response["Location"].endswith(
+            reverse("api:image-detail", kwargs={"pk": image.pk})
+        )
+        assert image.status == Image.READY
+        assert image.url == "http://test.com/upload/test.png"
+
+    def test_full_queue_keeps_name_free(self, settings, tmp_path, monkeypatch):
+        """Tests that upload refused by full queue leaves nothing behind."""
+        settings.UPLOAD_ASYNC = True
+        settings.UPLOAD_SPOOL_DIR = str(tmp_path)
+        queue = UploadQueue(FakeStorage(), max_pending=0)
+        monkeypatch.setattr(serializers, "get_upload_queue", lambda: queue)
+        tier = mixer.blend(
+            "api.AccountTier", original_size=True, fetch_url=False
+        )
+        self.client.force_authenticate(
+            user=mixer.blend("api.User", accountTier=tier)
+        )
+        response = self.client.post(
+            reverse("api:image-list"),
+            {"name": "test", "image": make_png()},
+            format="multipart",
+        )
+        self.client.force_authenticate(user=None)
+        assert response.status_code == 503
+        assert not Image.objects.exists()
+        assert os.listdir(tmp_path) == []
+
+    def test_upload_holds_slot(self, settings, tmp_path, monkeypatch):
+        """Tests that queued uploads count as running uploads."""
+        settings.UPLOAD_ASYNC = True
+        settings.UPLOAD_SPOOL_DIR = str(tmp_path)
+        settings.THROTTLE_CACHE = ""
+        started = threading.Event()
+        finish = threading.Event()
+
+        class SlowStorage(FakeStorage):
+            def upload(self, *args, **kwargs) -> dict:
+                started.set()
+                finish.wait(5)
+                return super(SlowStorage, self).upload(*args, **kwargs)
+
+        queue = UploadQueue(SlowStorage(), max_workers=1)
+        monkeypatch.setattr(serializers, "get_upload_queue", lambda: queue)
+        tier = mixer.blend(
+            "api.AccountTier",
+            original_size=True,
+            fetch_url=False,
+            concurrent_uploads=1,
+        )
+        self.client.force_authenticate(
+            user=mixer.blend("api.User", accountTier=tier)
+        )
+
+        def upload(name: str) -> int:
+            return self.client.post(
+                reverse("api:image-list"),
+                {"name": name, "image": make_png()},
+                format="multipart",
+            ).status_code
+
+        assert upload("first") == 202
+        assert started.wait(5)
+        assert upload("second") == 429
+        finish.set()
+        queue.shutdown()
+        # Content of "first" is stored already, so it is not queued again.
+        assert upload("third") == 201
+        self.client.force_authenticate(user=None)
@@ -88,7 +88,7 @@ class TestImageViewSet:
             response.data["detail"]
             == "Authentication credentials were not provided."  # noqa
         )
-        assert response.status_code == 403
+        assert response.status_code == 401
 
     def test_get_image_basic_user(self, dummy_basic_user):
         """Tests getting an image for basic user."""
@@ -133,3 +133,97 @@ class TestImageViewSet:
             "Thumbnail 400px": self.url_400_px,
         }
         assert response.status_code == 200
+
+    def test_list_images_query_count(
+        self, dummy_enterprise_user, django_assert_num_queries
+    ):
+        """Tests that listing images runs a constant number of queries."""
+        self.client.force_authenticate(user=dummy_enterprise_user)
+        images = mixer.cycle(20).blend(
+            "api.Image", url=self.url, owner=dummy_enterprise_user
+        )
+        for image in images:
+            mixer.blend(
+                "api.ExpiringLink",
+                image=image,
+                url=self.url,
+                expiration_time=300,
+            )
+        url = reverse("api:image-list")
+        with django_assert_num_queries(4):
+            response = self.client.get(url)
+        self.client.force_authenticate(user=None)
+        assert len(response.data["results"]) == 20
+        assert all(
+            "Expiring link" in image for image in response.data["results"]
+        )
+        assert response.status_code == 200
+
+    def test_list_images_pagination(self, dummy_basic_user):
+        """Tests walking user's images with cursor pagination."""
+        self.client.force_authenticate(user=dummy_basic_user)
+        images = mixer.cycle(5).blend(
+            "api.Image", url=self.url, owner=dummy_basic_user
+        )
+        url = reverse("api:image-list")
+        response = self.client.get(url, {"page_size": 3})
+        next_response = self.client.get(response.data["next"])
+        self.client.force_authenticate(user=None)
+        names = [
+            image["name"]
+            for image in response.data["results"]
+            + next_response.data["results"]
+        ]
+        assert names == [image.name for image in images]
+        assert next_response.data["next"] is None
+
+    def test_list_images_fields(self, dummy_enterprise_user):
+        """Tests limiting listed images to requested fields."""
+        self.client.force_authenticate(user=dummy_enterprise_user)
+        image = mixer.blend(
+            "api.Image", url=self.url, owner=dummy_enterprise_user
+        )
+        mixer.blend("api.ExpiringLink", image=image, url=self.url)
+        url = reverse("api:image-list")
+        response = self.client.get(url, {"fields": "name,thumbnails"})
+        self.client.force_authenticate(user=None)
+        assert response.data["results"] == [
+            {
+                "name": image.name,
+                "Thumbnail 200px": self.url_200_px,
+                "Thumbnail 400px": self.url_400_px,
+            }
+        ]
+
+    def test_get_image_signed_link(self, dummy_enterprise_user, settings):
+        """Tests getting an image with signed expiring link."""
+        settings.EXPIRING_LINK_MODE = "signed"
+        self.client.force_authenticate(user=dummy_enterprise_user)
+        image = mixer.blend(
+            "api.Image", url=self.url, owner=dummy_enterprise_user
+        )
+        mixer.blend(
+            "api.ExpiringLink", image=image, url=self.url, expiration_time=300
+        )
+        url = reverse("api:image-detail", kwargs={"pk": image.pk})
+        response = self.client.get(url)
+        self.client.force_authenticate(user=None)
+        link_response = self.client.get(response.data["Expiring link"])
+        assert "/api/link/" in response.data["Expiring link"]
+        assert link_response.data == {"url": self.url}
+
+    def test_get_image_newest_valid_link(self, dummy_enterprise_user):
+        """Tests that image shows its newest link which has not expired."""
+        self.client.force_authenticate(user=dummy_enterprise_user)
+        image = mixer.blend(
+            "api.Image", url=self.url, owner=dummy_enterprise_user
+        )
+        newest = mixer.blend(
+            "api.ExpiringLink", image=image, expiration_time=3000
+        )
+        mixer.blend("api.ExpiringLink", image=image, expiration_time=300)
+        mixer.blend("api.ExpiringLink", image=image, expiration_time=-300)
+        url = reverse("api:image-detail", kwargs={"pk": image.pk})
+        response = self.client.get(url)
+        self.client.force_authenticate(user=None)
+        assert response.data["Expiring link"].endswith(newest.get_url())
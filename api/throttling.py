@@ -0,0 +1,361 @@
+import contextvars
+import datetime
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import exceptions, throttling
+
+from .cache_backends import RedisCache
+from .tiers import get_tier_cache
+
+logger = logging.getLogger(__name__)
+
+BUCKET_TIMEOUT = 24 * 3600
+
+
+class LocalCounterStore:
+    """
+    In-process counters with time to live, used when THROTTLE_CACHE is
+    not set. Limits are then enforced per process.
+
+    Args:
+        max_entries(int): Optional; Number of counters above which expired
+                          ones are removed.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, delta: int, timeout: int) -> int:
+        """
+        Atomically adds delta to the counter.
+
+        Args:
+            key(str): Counter's key.
+            delta(int): Added value, may be negative.
+            timeout(int): Time to live of a new counter in seconds.
+
+        Returns:
+            int: New value of the counter.
+        """
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._counters.get(key, (0, 0))
+            if expires <= now:
+                value, expires = 0, now + timeout
+            value += delta
+            self._counters[key] = (value, expires)
+            if len(self._counters) > self.max_entries:
+                self._counters = {
+                    key: entry
+                    for key, entry in self._counters.items()
+                    if entry[1] > now
+                }
+            return value
+
+    def touch(self, key: str, timeout: int) -> None:
+        """
+        Sets time to live of an existing counter.
+
+        Args:
+            key(str): Counter's key.
+            timeout(int): Time to live in seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._counters.get(key, (0, 0))
+            if expires > now:
+                self._counters[key] = (value, now + timeout)
+
+
+class CacheCounterStore:
+    """
+    Counters kept in a Django cache shared by processes. incr() is atomic
+    with backends which implement it atomically, e.g. locmem or redis.
+    Database and file caches read and write the value in separate steps,
+    so concurrent requests can exceed the limits.
+
+    Args:
+        cache(object): Django cache.
+    """
+
+    def __init__(self, cache: object) -> None:
+        self.cache = cache
+
+    def incr(self, key: str, delta: int, timeout: int) -> int:
+        """
+        Atomically adds delta to the counter.
+
+        Args:
+            key(str): Counter's key.
+            delta(int): Added value, may be negative.
+            timeout(int): Time to live of a new counter in seconds.
+
+        Returns:
+            int: New value of the counter.
+        """
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            self.cache.add(key, delta, timeout)
+            return delta
+
+    def touch(self, key: str, timeout: int) -> None:
+        """
+        Sets time to live of an existing counter, which incr() does not
+        refresh.
+
+        Args:
+            key(str): Counter's key.
+            timeout(int): Time to live in seconds.
+        """
+        self.cache.touch(key, timeout)
+
+
+@lru_cache(maxsize=None)
+def get_counter_store() -> LocalCounterStore or CacheCounterStore:
+    """Returns counter store configured in settings."""
+    if not settings.THROTTLE_CACHE:
+        return LocalCounterStore()
+    return CacheCounterStore(caches[settings.THROTTLE_CACHE])
+
+
+def check_counter_store() -> None:
+    """
+    Warns outside of "dev" SERVER_MODE when limits of account tiers are
+    counted per process, so every worker allows the whole limit, or in
+    a cache without atomic incr().
+    """
+    if settings.SERVER_MODE == "dev":
+        return
+    cache = getattr(get_counter_store(), "cache", None)
+    if cache is None or isinstance(cache, LocMemCache):
+        logger.warning(
+            "Account tier limits are counted per process, set "
+            "THROTTLE_CACHE to a redis cache to count them in all processes."
+        )
+    elif not isinstance(cache, RedisCache):
+        logger.warning(
+            "THROTTLE_CACHE cache has no atomic incr(), concurrent requests "
+            "can exceed account tier limits, use a redis cache."
+        )
+
+
+@receiver(setting_changed)
+def reset_counter_store(setting: str, **kwargs) -> None:
+    """Drops cached counter store when its settings change."""
+    if setting == "THROTTLE_CACHE" or setting == "CACHES":
+        get_counter_store.cache_clear()
+
+
+def take_token(store: object, key: str, rate: float, capacity: int) -> float:
+    """
+    Takes a token from token bucket refilled with rate tokens per second
+    and holding at most capacity tokens.
+
+    The counter keeps the time in milliseconds at which the bucket will be
+    full again, so taking a token is an atomic increment. When that time
+    has passed the bucket is full and the counter is moved up to now by
+    a second increment; concurrent requests of an idle user may move it
+    further, which only makes the limit stricter for a moment.
+
+    Args:
+        store(object): Counter store.
+        key(str): Bucket's key.
+        rate(float): Tokens added per second.
+        capacity(int): Size of the bucket.
+
+    Returns:
+        float: 0 when the token was taken, else seconds until it can be.
+    """
+    now = int(time.time() * 1000)
+    interval = max(round(1000 / rate), 1)
+    full_at = store.incr(key, interval, BUCKET_TIMEOUT)
+    if full_at - interval < now:
+        full_at = store.incr(key, now + interval - full_at, BUCKET_TIMEOUT)
+    excess = full_at - now - capacity * interval
+    if excess <= 0:
+        return 0
+    store.incr(key, -interval, BUCKET_TIMEOUT)
+    return excess / 1000
+
+
+class TierRateThrottle(throttling.BaseThrottle):
+    """
+    Limits requests of every user to requests_per_minute of the user's
+    account tier, allowing bursts of one minute's worth of requests.
+    """
+
+    def allow_request(self, request: object, view: object) -> bool:
+        """Takes a token from user's bucket."""
+        self.retry_after = None
+        if not request.user.is_authenticated:
+            return True
+        tier = get_tier_cache().for_user(request.user)
+        if tier is None or tier.requests_per_minute is None:
+            return True
+        self.retry_after = take_token(
+            get_counter_store(),
+            f"throttle:rate:{request.user.pk}",
+            tier.requests_per_minute / 60,
+            tier.requests_per_minute,
+        )
+        return not self.retry_after
+
+    def wait(self) -> float or None:
+        """Returns seconds until the next request is allowed."""
+        return self.retry_after
+
+
+def seconds_to_midnight() -> int:
+    """Returns seconds until the next day (UTC) starts."""
+    now = datetime.datetime.utcnow()
+    tomorrow = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time()
+    )
+    return math.ceil((tomorrow - now).total_seconds())
+
+
+class UploadCharge:
+    """
+    Daily quota and concurrent upload slot taken by upload_limits().
+
+    Args:
+        store(object): Counter store.
+        quota_key(str): Key of the daily quota counter or None.
+        size(int): Charged bytes.
+        slot_key(str): Key of the upload slot counter or None.
+    """
+
+    def __init__(
+        self, store: object, quota_key: str, size: int, slot_key: str
+    ) -> None:
+        self.store = store
+        self.quota_key = quota_key
+        self.size = size
+        self.slot_key = slot_key
+        self.held = False
+
+    def release(self, failed: bool = False) -> None:
+        """
+        Frees the upload slot, gives the quota back if upload failed.
+        Calls after the first one do nothing.
+
+        Args:
+            failed(bool): Optional; Whether the upload failed.
+        """
+        if failed and self.quota_key:
+            self.store.incr(self.quota_key, -self.size, 2 * BUCKET_TIMEOUT)
+        if self.slot_key:
+            release_slot(
+                self.store,
+                self.slot_key,
+                settings.THROTTLE_UPLOAD_SLOT_TIMEOUT,
+            )
+        self.quota_key = self.slot_key = None
+
+
+# Charge of the running upload_limits() block, None outside of it.
+current_charge = contextvars.ContextVar("current_charge", default=None)
+
+
+@contextmanager
+def upload_limits(user: object, files: list) -> None:
+    """
+    Charges files to user's daily upload quota and holds one of user's
+    concurrent upload slots until the block exits, or until uploads
+    finish in the background if hold_upload_limits() was called. The
+    quota is given back when the block raises.
+
+    Args:
+        user(object): Uploading user.
+        files(list): Uploaded files.
+
+    Raises:
+        Throttled: Quota is exceeded or all upload slots are taken.
+    """
+    tier = get_tier_cache().for_user(user)
+    if tier is None:
+        yield
+        return
+    store = get_counter_store()
+    charge = UploadCharge(store, None, sum(file.size for file in files), None)
+    timeout = settings.THROTTLE_UPLOAD_SLOT_TIMEOUT
+    token = current_charge.set(charge)
+    try:
+        if tier.daily_upload_bytes is not None:
+            charge.quota_key = (
+                f"throttle:bytes:{user.pk}:{datetime.datetime.utcnow():%F}"
+            )
+            used = store.incr(
+                charge.quota_key, charge.size, 2 * BUCKET_TIMEOUT
+            )
+            if used > tier.daily_upload_bytes:
+                raise exceptions.Throttled(
+                    seconds_to_midnight(), "Daily upload quota exceeded."
+                )
+        if tier.concurrent_uploads is not None:
+            slot_key = f"throttle:uploads:{user.pk}"
+            if store.incr(slot_key, 1, timeout) > tier.concurrent_uploads:
+                release_slot(store, slot_key, timeout)
+                raise exceptions.Throttled(
+                    settings.THROTTLE_UPLOAD_RETRY_AFTER,
+                    "Too many uploads running at once.",
+                )
+            charge.slot_key = slot_key
+            store.touch(slot_key, timeout)
+        yield
+    except BaseException:
+        if not charge.held:
+            charge.release(failed=True)
+        raise
+    else:
+        if not charge.held:
+            charge.release()
+    finally:
+        current_charge.reset(token)
+
+
+def hold_upload_limits() -> callable or None:
+    """
+    Keeps quota and upload slot of the running upload_limits() block
+    taken after the block exits, for an upload finished in the
+    background.
+
+    Returns:
+        callable: UploadCharge.release() to call when the upload finishes
+                  or None outside of upload_limits().
+    """
+    charge = current_charge.get()
+    if charge is None:
+        return None
+    charge.held = True
+    return charge.release
+
+
+def release_slot(store: object, key: str, timeout: int) -> None:
+    """
+    Frees one of user's upload slots. A counter which expired during
+    the upload would go below zero and allow an extra upload, so it is
+    moved back to zero.
+
+    Args:
+        store(object): Counter store.
+        key(str): Slot counter's key.
+        timeout(int): Time to live of the counter in seconds.
+    """
+    value = store.incr(key, -1, timeout)
+    if value < 0:
+        store.incr(key, -value, timeout)
@@ -0,0 +1,472 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from PIL import Image as PillowImage
+
+from .formats import FORMATS, encode_options
+from .storage import LocalStorage, get_storage
+
+
+def render_thumbnail(
+    source: object, size: int, image_format: str = None, quality: int = None
+) -> bytes:
+    """
+    Scales image to size x size pixels.
+
+    JPEG files are decoded at the smallest scale which is still bigger
+    than the thumbnail (Image.draft()) and other images are shrunk with
+    Image.reduce() before the final resampling.
+
+    Args:
+        source(object): Path or file object of the image.
+        size(int): Thumbnail size in pixels.
+        image_format(str): Optional; Pillow format name of the thumbnail,
+                           defaults to the format of the source image.
+        quality(int): Optional; Encoder quality.
+
+    Returns:
+        bytes: Encoded thumbnail.
+    """
+    return render_thumbnails(source, [size], image_format, quality)[size]
+
+
+def render_thumbnails(
+    source: object,
+    sizes: list,
+    image_format: str = None,
+    quality: int = None,
+) -> dict:
+    """
+    Scales image to every size x size thumbnail in one decode pass.
+
+    The image is decoded once at the scale of the largest thumbnail and
+    every next, smaller thumbnail is scaled down from the previous one.
+
+    Args:
+        source(object): Path or file object of the image.
+        sizes(list): Thumbnail sizes in pixels.
+        image_format(str): Optional; Pillow format name of the thumbnails,
+                           defaults to the format of the source image.
+        quality(int): Optional; Encoder quality.
+
+    Returns:
+        dict: Encoded thumbnail for every size.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    with PillowImage.open(source) as image:
+        image_format = image_format or image.format
+        image.draft("RGB", (sizes[0], sizes[0]))
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        factor = (
+            max(image.width // sizes[0], 1),
+            max(image.height // sizes[0], 1),
+        )
+        thumbnail = image.reduce(factor) if factor != (1, 1) else image
+        thumbnail.load()
+    if image_format == "JPEG" and thumbnail.mode not in ("RGB", "L"):
+        thumbnail = thumbnail.convert("RGB")
+    thumbnails = {}
+    for size in sizes:
+        thumbnail = thumbnail.resize((size, size), PillowImage.LANCZOS)
+        content = io.BytesIO()
+        thumbnail.save(
+            content, image_format, **encode_options(image_format, quality)
+        )
+        thumbnails[size] = content.getvalue()
+    return thumbnails
+
+
+def transcode(source: object, image_format: str, quality: int = None):
+    """
+    Encodes image in another format without scaling it.
+
+    Args:
+        source(object): Path or file object of the image.
+        image_format(str): Pillow format name of the result.
+        quality(int): Optional; Encoder quality.
+
+    Returns:
+        bytes: Encoded image.
+    """
+    with PillowImage.open(source) as image:
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        content = io.BytesIO()
+        image.save(
+            content, image_format, **encode_options(image_format, quality)
+        )
+    return content.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_process_pool() -> ProcessPoolExecutor:
+    """Returns process pool rendering thumbnails outside request threads."""
+    return ProcessPoolExecutor(
+        max_workers=settings.THUMBNAIL_WORKERS or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+class DiskLRUCache:
+    """
+    Size bounded cache of files on disk, evicts least recently used ones.
+
+    The directory may be shared by many processes, so the disk is the
+    source of truth: files are touched when they are used, files missing
+    on disk are dropped from the in-process index, the index is rebuilt
+    from the directory every rescan_interval seconds and before evicting,
+    and deleted files are found by listing the directory.
+
+    Args:
+        root(str): Directory with cached files.
+        max_bytes(int): Maximal summary size of cached files.
+        rescan_interval(float): Optional; Seconds after which the index is
+                                rebuilt from the directory on next put().
+    """
+
+    def __init__(
+        self, root: str, max_bytes: int, rescan_interval: float = 60.0
+    ) -> None:
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            self._scan()
+
+    def _scan(self) -> None:
+        """Rebuilds the index from the directory, oldest files first."""
+        files = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        self._entries = OrderedDict(
+            (name, file_size) for _, name, file_size in sorted(files)
+        )
+        self.size = sum(self._entries.values())
+        self._scanned = time.monotonic()
+
+    def path(self, name: str) -> str:
+        """Returns path of the cached file."""
+        return os.path.join(self.root, name)
+
+    def get(self, name: str) -> str or None:
+        """
+        Returns path of the cached file and marks it as recently used,
+        also for other processes sharing the directory.
+
+        Args:
+            name(str): File name.
+
+        Returns:
+            str: Path to the file or None if it is not cached.
+        """
+        path = self.path(name)
+        try:
+            now = time.time_ns()
+            os.utime(path, ns=(now, now))
+            file_size = os.path.getsize(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._entries.pop(name, 0)
+            return None
+        with self._lock:
+            self.size += file_size - self._entries.pop(name, 0)
+            self._entries[name] = file_size
+        return path
+
+    def put(self, name: str, content: bytes) -> str:
+        """
+        Stores file in the cache, evicts least recently used files
+        when cache is full.
+
+        Args:
+            name(str): File name.
+            content(bytes): File content.
+
+        Returns:
+            str: Path to the file.
+        """
+        fd, temporary_path = tempfile.mkstemp(dir=self.root, prefix=".")
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        now = time.time_ns()
+        os.utime(temporary_path, ns=(now, now))
+        os.replace(temporary_path, self.path(name))
+        with self._lock:
+            self.size += len(content) - self._entries.pop(name, 0)
+            self._entries[name] = len(content)
+            if (
+                self.size > self.max_bytes
+                or time.monotonic() - self._scanned > self.rescan_interval
+            ):
+                self._scan()
+                self._entries.move_to_end(name)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                evicted, evicted_size = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                try:
+                    os.remove(self.path(evicted))
+                except FileNotFoundError:
+                    pass
+        return self.path(name)
+
+    def delete(self, prefixes: tuple) -> int:
+        """
+        Removes cached files with names starting with any of the prefixes,
+        including files cached by other processes.
+
+        Args:
+            prefixes(tuple): File name prefixes.
+
+        Returns:
+            int: Number of removed files.
+        """
+        removed = 0
+        with os.scandir(self.root) as entries:
+            names = [
+                entry.name
+                for entry in entries
+                if entry.name.startswith(prefixes)
+            ]
+        for name in names:
+            try:
+                os.remove(self.path(name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self.size -= self._entries.pop(name, 0)
+        return removed
+
+
+class ThumbnailEngine:
+    """
+    Renders thumbnails and transcoded variants of images stored by
+    LocalStorage on first request and keeps them in DiskLRUCache keyed by
+    (content hash, size, format, quality).
+    Concurrent requests for the same missing thumbnail wait for a single
+    render.
+
+    Args:
+        storage(object): LocalStorage with source images.
+        cache(object): DiskLRUCache for rendered thumbnails.
+    """
+
+    def __init__(self, storage: LocalStorage, cache: DiskLRUCache) -> None:
+        self.storage = storage
+        self.cache = cache
+        self._renders = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_name(
+        key: str, size: int, image_format: str = None, quality: int = None
+    ) -> str:
+        """
+        Returns cache file name of the thumbnail.
+
+        Args:
+            key(str): Storage key of the source image.
+            size(int): Thumbnail size in pixels, None for full size.
+            image_format(str): Optional; Pillow format name of the thumbnail.
+            quality(int): Optional; Encoder quality.
+
+        Returns:
+            str: File name made of content hash, size, quality and format.
+        """
+        content_hash, extension = os.path.splitext(os.path.basename(key))
+        if image_format:
+            extension = "." + FORMATS[image_format]
+        name = f"{content_hash}_{size or 'full'}"
+        if quality is not None:
+            name += f"_q{quality}"
+        return name + extension
+
+    def cached(
+        self,
+        key: str,
+        size: int,
+        image_format: str = None,
+        quality: int = None,
+    ) -> str or None:
+        """
+        Returns path of the thumbnail if it is already rendered.
+
+        Args:
+            key(str): Storage key of the source image.
+            size(int): Thumbnail size in pixels, None for full size.
+            image_format(str): Optional; Pillow format name of the thumbnail.
+            quality(int): Optional; Encoder quality.
+
+        Returns:
+            str: Path to the thumbnail or None.
+        """
+        return self.cache.get(
+            self.cache_name(key, size, image_format, quality)
+        )
+
+    def get(
+        self,
+        key: str,
+        size: int,
+        image_format: str = None,
+        quality: int = None,
+    ) -> str:
+        """
+        Returns path of the thumbnail, renders it if it is not cached.
+        Without size the image is only transcoded to image_format.
+
+        Args:
+            key(str): Storage key of the source image.
+            size(int): Thumbnail size in pixels, None for full size.
+            image_format(str): Optional; Pillow format name of the thumbnail.
+            quality(int): Optional; Encoder quality.
+
+        Returns:
+            str: Path to the thumbnail.
+        """
+        name = self.cache_name(key, size, image_format, quality)
+        path = self.cache.get(name)
+        if path is not None:
+            return path
+        with self._lock:
+            future = self._renders.get(name)
+            owner = future is None
+            if owner:
+                future = self._renders[name] = Future()
+        if not owner:
+            return future.result()
+        try:
+            if size:
+                content = render_thumbnail(
+                    self.storage.path(key), size, image_format, quality
+                )
+            else:
+                content = transcode(
+                    self.storage.path(key), image_format, quality
+                )
+            future.set_result(self.cache.put(name, content))
+        except Exception as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._renders[name]
+        return future.result()
+
+    def delete(self, keys: list) -> int:
+        """
+        Removes all cached thumbnails and variants of the images.
+
+        Args:
+            keys(list): Storage keys of the source images.
+
+        Returns:
+            int: Number of removed files.
+        """
+        if not keys:
+            return 0
+        return self.cache.delete(
+            tuple(
+                os.path.splitext(os.path.basename(key))[0] + "_"
+                for key in keys
+            )
+        )
+
+    def prerender(
+        self, key: str, sizes: list, executor: object = None
+    ) -> Future or None:
+        """
+        Renders all missing thumbnails of the image in one decode pass
+        in the process pool and stores them in the cache.
+
+        Args:
+            key(str): Storage key of the source image.
+            sizes(list): Thumbnail sizes in pixels.
+            executor(object): Optional; Executor running the render,
+                              defaults to get_process_pool().
+
+        Returns:
+            Future: Resolved with list of rendered sizes, None if all
+                    thumbnails are already cached.
+        """
+        missing = [size for size in sizes if self.cached(key, size) is None]
+        if not missing:
+            return None
+        executor = executor or get_process_pool()
+        future = executor.submit(
+            render_thumbnails, self.storage.path(key), missing
+        )
+        result = Future()
+
+        def store(rendered: Future) -> None:
+            try:
+                for size, content in rendered.result().items():
+                    self.cache.put(self.cache_name(key, size), content)
+                result.set_result(sorted(rendered.result()))
+            except Exception as error:
+                result.set_exception(error)
+
+        future.add_done_callback(store)
+        return result
+
+
+def prerender_thumbnails(key: str, sizes: list) -> Future or None:
+    """
+    Starts rendering thumbnails of just uploaded LocalStorage image, when
+    THUMBNAIL_PRERENDER setting is enabled.
+
+    Args:
+        key(str): Storage key of the image.
+        sizes(list): Thumbnail sizes in pixels.
+
+    Returns:
+        Future: Resolved when thumbnails are cached or None.
+    """
+    if not (
+        settings.THUMBNAIL_PRERENDER
+        and sizes
+        and isinstance(get_storage(), LocalStorage)
+    ):
+        return None
+    return get_thumbnail_engine().prerender(key, sizes)
+
+
+@lru_cache(maxsize=None)
+def get_thumbnail_engine() -> ThumbnailEngine:
+    """Returns ThumbnailEngine for images stored by LocalStorage."""
+    storage = get_storage()
+    cache = DiskLRUCache(
+        os.path.join(storage.root, "thumbnails"),
+        settings.THUMBNAIL_CACHE_MAX_BYTES,
+    )
+    return ThumbnailEngine(storage, cache)
+
+
+@receiver(setting_changed)
+def reset_thumbnail_engine(setting: str, **kwargs) -> None:
+    """Drops cached engine when storage or thumbnail settings change."""
+    if setting.startswith(("IMAGE_STORAGE", "LOCAL_STORAGE", "THUMBNAIL")):
+        get_thumbnail_engine.cache_clear()
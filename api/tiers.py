@@ -0,0 +1,178 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .caching import LocalCache
+from .models import AccountTier, Thumbnail
+
+MISSING = "missing"
+
+
+class TierInfo(
+    namedtuple(
+        "TierInfo",
+        [
+            "id",
+            "name",
+            "original_size",
+            "fetch_url",
+            "thumbnail_sizes",
+            "requests_per_minute",
+            "concurrent_uploads",
+            "daily_upload_bytes",
+            "image_quality",
+        ],
+        defaults=(None, None, None, ""),
+    )
+):
+    """
+    Permissions and limits of an account tier.
+
+    Attributes:
+        id (int): AccountTier object's id.
+        name (str): AccountTier's name.
+        original_size (bool): Permission to store original size images.
+        fetch_url (bool): Permission to make expiring links.
+        thumbnail_sizes (tuple): Available thumbnail sizes, ascending.
+        requests_per_minute (int): Request rate limit or None.
+        concurrent_uploads (int): Concurrent uploads limit or None.
+        daily_upload_bytes (int): Daily upload quota or None.
+        image_quality (str): Quality preset of served images, empty to
+            serve them in uploaded format.
+    """
+
+
+class TierCache:
+    """
+    Caches account tier permissions in an in-process LRU and in a shared
+    Django cache.
+
+    Shared cache keys contain version which is bumped on every change of
+    AccountTier and Thumbnail objects, so stale entries are never read.
+    The in-process copies are dropped right away in the process which
+    made the change and after local_ttl seconds in other processes.
+
+    Args:
+        shared_cache(object): Django cache shared by processes.
+        local_ttl(float): Time to live of in-process entries.
+        timeout(int): Time to live of shared cache entries.
+    """
+
+    version_key = "accounttier:version"
+
+    def __init__(
+        self, shared_cache: object, local_ttl: float, timeout: int
+    ) -> None:
+        self.shared_cache = shared_cache
+        self.local = LocalCache(1024)
+        self.local_ttl = local_ttl
+        self.timeout = timeout
+
+    def version(self) -> int:
+        """Returns current version of cached tier data."""
+        return self.shared_cache.get_or_set(self.version_key, 1, None)
+
+    def cached(self, name: object, load: callable) -> object:
+        """Returns cached value, loads and caches it if it is missing."""
+        value = self.local.get(name)
+        if value is not None:
+            return value
+        key = f"accounttier:{self.version()}:{name}"
+        value = self.shared_cache.get(key)
+        if value is None:
+            value = load()
+            self.shared_cache.set(key, value, self.timeout)
+        self.local.set(name, value, self.local_ttl)
+        return value
+
+    def load(self, tier_id: int) -> TierInfo or str:
+        """Reads tier and its thumbnail sizes from database."""
+        tier = (
+            AccountTier.objects.filter(pk=tier_id)
+            .prefetch_related("thumbnail_sizes")
+            .first()
+        )
+        if tier is None:
+            return MISSING
+        sizes = {thumbnail.size for thumbnail in tier.thumbnail_sizes.all()}
+        return TierInfo(
+            tier.pk,
+            tier.name,
+            tier.original_size,
+            tier.fetch_url,
+            tuple(sorted(sizes)),
+            tier.requests_per_minute,
+            tier.concurrent_uploads,
+            tier.daily_upload_bytes,
+            tier.image_quality,
+        )
+
+    def get(self, tier_id: int or None) -> TierInfo or None:
+        """
+        Returns permissions of the account tier.
+
+        Args:
+            tier_id(int): AccountTier object's id.
+
+        Returns:
+            TierInfo: Tier permissions or None if tier does not exist.
+        """
+        if tier_id is None:
+            return None
+        tier = self.cached(tier_id, lambda: self.load(tier_id))
+        return None if tier == MISSING else tier
+
+    def for_user(self, user: object) -> TierInfo or None:
+        """
+        Returns permissions of user's account tier.
+
+        Args:
+            user(object): User object.
+
+        Returns:
+            TierInfo: Tier permissions or None if user has no tier.
+        """
+        return self.get(user.accountTier_id)
+
+    def thumbnail_sizes(self) -> frozenset:
+        """Returns all thumbnail sizes defined in any account tier."""
+        return self.cached(
+            "thumbnail_sizes",
+            lambda: frozenset(
+                Thumbnail.objects.values_list("size", flat=True)
+            ),
+        )
+
+    def invalidate(self) -> None:
+        """Drops all cached tier data."""
+        try:
+            self.shared_cache.incr(self.version_key)
+        except ValueError:
+            self.shared_cache.set(self.version_key, 2, None)
+        self.local.clear()
+
+
+@lru_cache(maxsize=None)
+def get_tier_cache() -> TierCache:
+    """
+    Returns TierCache configured in settings. Per-process locmem cache
+    keeps entries only for TIER_CACHE_LOCAL_TTL seconds, as other
+    processes never see the version bumped by invalidate().
+    """
+    cache = caches[settings.TIER_CACHE]
+    timeout = settings.TIER_CACHE_TIMEOUT
+    if isinstance(cache, LocMemCache):
+        timeout = min(timeout, settings.TIER_CACHE_LOCAL_TTL)
+    return TierCache(cache, settings.TIER_CACHE_LOCAL_TTL, timeout)
+
+
+@receiver(setting_changed)
+def reset_tier_cache(setting: str, **kwargs) -> None:
+    """Drops cached TierCache when its settings change."""
+    if setting.startswith("TIER_CACHE") or setting == "CACHES":
+        get_tier_cache.cache_clear()
@@ -0,0 +1,284 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .deletion import schedule_deletion
+from .links import get_link_cache
+from .list_cache import invalidate_image_lists
+from .models import ExpiringLink, Image
+from .storage import StorageBackend, get_storage
+from .thumbnails import prerender_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+class UploadQueueFull(APIException):
+    """Raised when there is no room for another pending upload."""
+
+    status_code = 503
+    default_detail = "Upload queue is full, try again later."
+    default_code = "upload_queue_full"
+
+
+class SpooledUploadedFile(UploadedFile):
+    """
+    Uploaded file kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE bytes
+    and rolled over to a temporary file on disk when it grows bigger.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        content_type: str,
+        size: int,
+        charset: str,
+        content_type_extra: dict = None,
+    ) -> None:
+        file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+            dir=settings.FILE_UPLOAD_TEMP_DIR,
+        )
+        super(SpooledUploadedFile, self).__init__(
+            file, name, content_type, size, charset, content_type_extra
+        )
+
+
+class SpooledFileUploadHandler(FileUploadHandler):
+    """
+    Streams every uploaded file chunk by chunk into SpooledUploadedFile,
+    so memory used by an upload is bounded whatever its size is. Content
+    is hashed on the way, the file gets content_hash attribute.
+    """
+
+    def new_file(self, *args, **kwargs) -> None:
+        """Creates file receiving the upload."""
+        super(SpooledFileUploadHandler, self).new_file(*args, **kwargs)
+        self.file = SpooledUploadedFile(
+            self.file_name,
+            self.content_type,
+            0,
+            self.charset,
+            self.content_type_extra,
+        )
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> None:
+        """Writes received chunk to the file and hashes it."""
+        self.file.write(raw_data)
+        self.digest.update(raw_data)
+
+    def file_complete(self, file_size: int) -> UploadedFile:
+        """Rewinds complete file and returns it."""
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_hash = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self) -> None:
+        """Drops partially received file."""
+        if hasattr(self, "file"):
+            self.file.close()
+
+
+def spool_file(uploaded_file: object) -> str:
+    """
+    Writes uploaded file to the spool directory chunk by chunk.
+
+    Args:
+        uploaded_file(object): File sent by the user.
+
+    Returns:
+        str: Path to the spooled file.
+    """
+    os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+    suffix = os.path.splitext(uploaded_file.name)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=settings.UPLOAD_SPOOL_DIR)
+    with os.fdopen(fd, "wb") as spooled:
+        for chunk in uploaded_file.chunks():
+            spooled.write(chunk)
+    return path
+
+
+class UploadQueue:
+    """
+    Bounded pool of background workers which upload pending images.
+
+    Each job uploads a spooled file, retrying failed attempts with
+    exponential backoff, then fills in url of the Image object and of its
+    expiring links and marks it as ready (or failed).
+
+    Args:
+        storage(object): StorageBackend the files are uploaded to.
+        max_workers(int): Number of concurrent uploads.
+        max_pending(int): Number of jobs which can wait or run at once.
+        retries(int): Number of retries after failed upload.
+        backoff(float): Delay before first retry in seconds, doubled
+                        after each next attempt.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        max_workers: int = 4,
+        max_pending: int = 64,
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> None:
+        self.storage = storage
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="upload"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(
+        self,
+        image_id: int,
+        path: str,
+        options: dict,
+        thumbnail_sizes: list = (),
+    ) -> Future:
+        """
+        Schedules upload of spooled file for Image object.
+
+        Args:
+            image_id(int): Pending Image object's id.
+            path(str): Path to the spooled file.
+            options(dict): Options passed to StorageBackend.upload().
+            thumbnail_sizes(list): Optional; Thumbnail sizes rendered
+                                   after the upload.
+
+        Raises:
+            UploadQueueFull: If max_pending jobs are already queued.
+
+        Returns:
+            Future: Resolved with the uploaded file's url.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise UploadQueueFull()
+        future = self._executor.submit(
+            self._run, image_id, path, options, thumbnail_sizes
+        )
+        future.add_done_callback(lambda future: self._slots.release())
+        return future
+
+    def _upload(self, path: str, options: dict) -> dict:
+        """Uploads file, retries with exponential backoff on errors."""
+        for attempt in range(self.retries + 1):
+            try:
+                return self.storage.upload(path, **options)
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                logger.warning("Upload of %s failed, retrying", path)
+                time.sleep(self.backoff * 2**attempt)
+
+    def _run(
+        self, image_id: int, path: str, options: dict, thumbnail_sizes: list
+    ) -> str:
+        """Uploads spooled file and updates Image object with its url."""
+        try:
+            output = self._upload(path, options)
+        except Exception:
+            logger.exception("Upload of image %s failed", image_id)
+            Image.objects.filter(pk=image_id).update(status=Image.FAILED)
+            raise
+        else:
+            updated = Image.objects.filter(pk=image_id).update(
+                url=output["url"],
+                storage_key=output["key"],
+                status=Image.READY,
+            )
+            if not updated:
+                # Image was deleted while its file was uploading.
+                schedule_deletion([output["key"]])
+                return output["url"]
+            link_ids = list(
+                ExpiringLink.objects.filter(image_id=image_id).values_list(
+                    "pk", flat=True
+                )
+            )
+            ExpiringLink.objects.filter(pk__in=link_ids).update(
+                url=output["url"]
+            )
+            # update() sends no post_save, links resolved while the image
+            # was pending would keep empty url in the link cache.
+            link_cache = get_link_cache()
+            for pk in link_ids:
+                link_cache.invalidate(pk)
+            prerender_thumbnails(output["key"], thumbnail_sizes)
+            return output["url"]
+        finally:
+            os.remove(path)
+            invalidate_image_lists(image_ids=[image_id])
+            close_old_connections()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops accepting jobs, optionally waits for running ones."""
+        self._executor.shutdown(wait=wait)
+
+
+_upload_queue = None
+_upload_queue_lock = threading.Lock()
+
+
+def get_upload_queue() -> UploadQueue:
+    """Returns process wide UploadQueue configured in settings."""
+    global _upload_queue
+    with _upload_queue_lock:
+        if _upload_queue is None:
+            _upload_queue = UploadQueue(
+                get_storage(),
+                max_workers=settings.UPLOAD_WORKERS,
+                max_pending=settings.UPLOAD_MAX_PENDING,
+                retries=settings.UPLOAD_RETRIES,
+                backoff=settings.UPLOAD_RETRY_BACKOFF,
+            )
+    return _upload_queue
+
+
+def fail_stale_uploads(older_than: int) -> int:
+    """
+    Marks images pending for more than older_than seconds as failed and
+    removes spooled files of that age. Their uploads were lost with the
+    process running them, e.g. when a web worker was restarted.
+
+    Args:
+        older_than(int): Age in seconds, longer than any upload with
+                         all its retries can take.
+
+    Returns:
+        int: Number of failed images.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    image_ids = list(
+        Image.objects.filter(
+            status=Image.PENDING, created_time__lt=cutoff
+        ).values_list("pk", flat=True)
+    )
+    failed = Image.objects.filter(
+        pk__in=image_ids, status=Image.PENDING
+    ).update(status=Image.FAILED)
+    invalidate_image_lists(image_ids=image_ids)
+    if os.path.isdir(settings.UPLOAD_SPOOL_DIR):
+        with os.scandir(settings.UPLOAD_SPOOL_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < cutoff.timestamp():
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+    return failed
@@ -1,9 +1,10 @@
 """Stores urls"""
 
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api import views
+from api import async_views, views
 
 router = DefaultRouter()
 router.register(r"image", views.ImageViewSet, basename="image")
@@ -13,6 +14,21 @@ router.register(
 
 app_name = "api"
 
-urlpatterns = [
+urlpatterns = []
+if settings.ASYNC_VIEWS:
+    urlpatterns += [
+        path("image/", async_views.image_list),
+        path(
+            "expiringlink/<int:pk>/",
+            async_views.expiring_link_detail,
+        ),
+    ]
+
+urlpatterns += [
     path("", include(router.urls)),
+    path(
+        "link/<str:token>/",
+        views.SignedLinkView.as_view(),
+        name="signedlink-detail",
+    ),
 ]
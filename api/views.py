@@ -1,19 +1,44 @@
-from datetime import datetime, timedelta
+import hmac
+import mimetypes
+import os
+import re
 
-import pytz
 from django.conf import settings
 from django.db.models.query import QuerySet
-from django.shortcuts import get_object_or_404
-from rest_framework import viewsets
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import ExpiringLink, Image
+from .formats import (
+    MIME_TYPES,
+    format_of,
+    negotiate_format,
+    parse_format,
+    quality_for,
+)
+from .links import get_link_cache, resolve_signed_link
+from .list_cache import get_list_cache
+from .metrics import registry
+from .models import Image
+from .pagination import ImageCursorPagination
+from .resolvers import ImageResolver
 from .serializers import (
+    BatchDeleteSerializer,
+    BatchUploadSerializer,
     ExpiringLinkSerializer,
     ImageLinkSerializer,
     ImageSerializer,
 )
+from .storage import LocalStorage, get_storage
+from .thumbnails import get_thumbnail_engine
+from .throttling import TierRateThrottle, upload_limits
+from .tiers import get_tier_cache
+
+TRANSFORMATION = re.compile(r"^(?P<options>[a-z]_[^/]*)/(?P<key>.+)$")
 
 
 class ImageViewSet(viewsets.ModelViewSet):
@@ -21,15 +46,104 @@ class ImageViewSet(viewsets.ModelViewSet):
 
     permission_classes = [IsAuthenticated]
     queryset = Image.objects.all()
-    http_method_names = ["get", "post", "head"]
+    pagination_class = ImageCursorPagination
+    throttle_classes = [TierRateThrottle]
+    http_method_names = ["get", "post", "delete", "head"]
 
     def get_queryset(self) -> QuerySet:
         """Returns Image objects of requested user."""
         return Image.objects.filter(owner=self.request.user)
 
+    def list(self, request, *args, **kwargs) -> HttpResponse:
+        """
+        Lists user's images. Rendered JSON responses are cached per user
+        with ETag and Last-Modified headers, conditional requests for
+        unchanged lists get 304 Not Modified without serialization.
+        """
+        list_cache = get_list_cache()
+        if list_cache is None or request.accepted_renderer.format != "json":
+            return super(ImageViewSet, self).list(request, *args, **kwargs)
+        key, changed = list_cache.key(request)
+        entry = list_cache.get(key)
+        if entry is None:
+            response = self.finalize_response(
+                request,
+                super(ImageViewSet, self).list(request, *args, **kwargs),
+                *args,
+                **kwargs,
+            )
+            response.render()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = list_cache.set(
+                key,
+                changed,
+                response,
+                ImageResolver.for_request(request).links_valid_until(),
+            )
+        else:
+            response = HttpResponse(
+                entry.content, content_type=entry.content_type
+            )
+        for header, value in entry.headers().items():
+            response[header] = value
+        return get_conditional_response(
+            request,
+            etag=entry.etag,
+            last_modified=entry.last_modified,
+            response=response,
+        )
+
+    def create(self, request, *args, **kwargs) -> Response:
+        """
+        Creates Image object, responds with 202 Accepted and status URL
+        when the upload is still running in the background.
+        """
+        response = super(ImageViewSet, self).create(request, *args, **kwargs)
+        if "status_url" in response.data:
+            response.status_code = status.HTTP_202_ACCEPTED
+            response["Location"] = response.data["status_url"]
+        return response
+
+    def perform_create(self, serializer: ImageSerializer) -> None:
+        """Uploads the image within limits of user's account tier."""
+        with upload_limits(
+            self.request.user, [serializer.validated_data["image"]]
+        ):
+            serializer.save()
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request) -> Response:
+        """
+        Uploads many images at once, responds with result for every image,
+        201 Created if all of them were created, 207 Multi-Status if not.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with upload_limits(request.user, serializer.validated_data["files"]):
+            results = serializer.save()
+        if all(result["status"] == "created" for result in results):
+            return Response(results, status=status.HTTP_201_CREATED)
+        return Response(results, status=status.HTTP_207_MULTI_STATUS)
+
+    @batch.mapping.delete
+    def delete_batch(self, request) -> Response:
+        """
+        Deletes many images at once, responds with ids of deleted images
+        and of images which were not found.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
     def get_serializer_class(self):
         """Returns serializer based on request user account tier settings."""
-        if self.request.user.accountTier.fetch_url:
+        if self.action == "batch":
+            return BatchUploadSerializer
+        if self.action == "delete_batch":
+            return BatchDeleteSerializer
+        resolver = ImageResolver.for_request(self.request)
+        if resolver.account_tier.fetch_url:
             return ImageLinkSerializer
         return ImageSerializer
 
@@ -37,15 +151,216 @@ class ImageViewSet(viewsets.ModelViewSet):
 class ExpiringLinkViewSet(viewsets.ViewSet):
     """Viewset for ExpiringLink."""
 
+    lookup_value_regex = r"\d+"
+
     def retrieve(self, request, pk: int) -> Response:
         """Checks link expiration time, returns data if it is valid."""
-        queryset = ExpiringLink.objects.all()
-        expiring_link = get_object_or_404(queryset, pk=pk)
-        timezone = pytz.timezone(settings.TIME_ZONE)
-        expiration_time = expiring_link.created_time + timedelta(
-            seconds=expiring_link.expiration_time
-        )
-        if (expiration_time) < datetime.now(tz=timezone):
+        expiring_link = get_link_cache().resolve(int(pk))
+        if expiring_link is None:
+            raise Http404()
+        if expiring_link.expired:
             return Response({"url": "This link has expired!"})
         serializer = ExpiringLinkSerializer(expiring_link)
         return Response(serializer.data)
+
+
+class SignedLinkView(APIView):
+    """
+    View for signed expiring links, validates them without any database
+    or session lookup.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request, token: str) -> Response:
+        """Checks link signature and expiration time, returns its data."""
+        expiring_link = resolve_signed_link(token)
+        if expiring_link is None:
+            raise Http404()
+        if expiring_link.expired:
+            return Response({"url": "This link has expired!"})
+        serializer = ExpiringLinkSerializer(expiring_link)
+        return Response(serializer.data)
+
+
+def parse_transformation(key: str) -> tuple:
+    """
+    Splits Cloudinary style transformation, e.g.
+    "w_200,h_200,f_auto,q_auto:eco/", off the requested key.
+
+    Args:
+        key(str): Requested key.
+
+    Returns:
+        tuple: Dict of transformation values by option letter and
+               storage key.
+
+    Raises:
+        ValueError: Transformation is invalid.
+    """
+    transformation = TRANSFORMATION.match(key)
+    if transformation is None:
+        return {}, key
+    options = {}
+    for option in transformation["options"].split(","):
+        name, _, value = option.partition("_")
+        if name not in {"w", "h", "f", "q"} or not value or name in options:
+            raise ValueError(f"Invalid transformation: {option}")
+        options[name] = value
+    return options, transformation["key"]
+
+
+def parse_quality(value: str, image_format: str) -> int or None:
+    """
+    Returns encoder quality of "auto" or "auto:{preset}" value. Numeric
+    qualities are refused, so anonymous requests can make only a few
+    variants of every image.
+
+    Args:
+        value(str): Value of q_ option.
+        image_format(str): Pillow format name of the output.
+
+    Returns:
+        int: Quality or None when the format has no quality setting.
+    """
+    auto, _, preset = value.partition(":")
+    if auto != "auto":
+        raise ValueError(f"Invalid quality: {value}")
+    return quality_for(preset or settings.IMAGE_DEFAULT_QUALITY, image_format)
+
+
+def media_variant(request, key: str, options: dict) -> tuple:
+    """
+    Returns variant of the stored image requested by transformation
+    options and by ?format= query parameter, which overrides f_ option.
+    "auto" format is negotiated from Accept header.
+
+    Args:
+        request(object): Media request.
+        key(str): Storage key of the image.
+        options(dict): Values returned by parse_transformation().
+
+    Returns:
+        tuple: Size (None for full size), Pillow format name (None to keep
+               the format), quality (None for encoder default) and whether
+               the format was negotiated.
+    """
+    size = None
+    if "w" in options or "h" in options:
+        if options.get("w") != options.get("h"):
+            raise ValueError("Thumbnails have to be square.")
+        size = int(options["w"])
+        if size <= 0:
+            raise ValueError("Invalid thumbnail size.")
+    source_format = format_of(key)
+    requested = request.GET.get("format") or options.get("f")
+    negotiated = requested == "auto"
+    image_format = None
+    if negotiated:
+        image_format = negotiate_format(
+            request.META.get("HTTP_ACCEPT", ""), source_format
+        )
+    elif requested:
+        image_format = parse_format(requested)
+    if image_format == source_format and "q" not in options:
+        image_format = None
+    quality = None
+    if image_format or "q" in options:
+        image_format = image_format or source_format
+        quality = parse_quality(options.get("q", "auto"), image_format)
+    return size, image_format, quality, negotiated
+
+
+def variant_path(
+    storage: LocalStorage,
+    key: str,
+    size: int,
+    image_format: str = None,
+    quality: int = None,
+) -> str:
+    """
+    Returns path of the thumbnail or transcoded image, renders it on first
+    request.
+
+    Args:
+        storage(object): LocalStorage with the source image.
+        key(str): Storage key of the source image.
+        size(int): Thumbnail size in pixels, None for full size.
+        image_format(str): Optional; Pillow format name of the variant.
+        quality(int): Optional; Encoder quality.
+
+    Returns:
+        str: Path to the variant.
+    """
+    engine = get_thumbnail_engine()
+    path = engine.cached(key, size, image_format, quality)
+    if path is not None:
+        return path
+    if not os.path.isfile(storage.path(key)):
+        raise Http404()
+    if size and size not in get_tier_cache().thumbnail_sizes():
+        raise Http404()
+    return engine.get(key, size, image_format, quality)
+
+
+def serve_media(request, key: str) -> HttpResponse:
+    """
+    Serves image file stored by LocalStorage or its variant when the key
+    starts with a transformation: "w_{size},h_{size}" makes a thumbnail,
+    "f_{format}" (or ?format=) transcodes it, "f_auto" picks the format
+    from Accept header and "q_auto:{preset}" sets its quality. If
+    LOCAL_STORAGE_SENDFILE_HEADER is set, only the header is returned and
+    web server sends the file.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise Http404()
+    try:
+        options, key = parse_transformation(key)
+        size, image_format, quality, negotiated = media_variant(
+            request, key, options
+        )
+        if size or image_format:
+            path = variant_path(storage, key, size, image_format, quality)
+        else:
+            path = storage.path(key)
+    except ValueError:
+        raise Http404()
+    if not os.path.isfile(path):
+        raise Http404()
+    content_type = MIME_TYPES.get(format_of(path))
+    content_type = content_type or mimetypes.guess_type(path)[0]
+    header = settings.LOCAL_STORAGE_SENDFILE_HEADER
+    if header == "X-Accel-Redirect":
+        response = HttpResponse(content_type=content_type)
+        response[header] = settings.LOCAL_STORAGE_SENDFILE_PREFIX + (
+            os.path.relpath(path, storage.root).replace(os.sep, "/")
+        )
+    elif header:
+        response = HttpResponse(content_type=content_type)
+        response[header] = path
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    if negotiated:
+        patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def serve_metrics(request) -> HttpResponse:
+    """
+    Exposes metrics of this process in Prometheus text format. If
+    METRICS_TOKEN is set, requests have to send it in
+    "Authorization: Bearer {token}" header.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+        header = request.META.get("HTTP_AUTHORIZATION", "").encode()
+        if not hmac.compare_digest(header, expected):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )
@@ -9,8 +9,10 @@ https://docs.djangoproject.com/en/3.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
+
 # Load enviromental variables
 import os
+import tempfile
 from pathlib import Path
 
 import cloudinary
@@ -18,6 +20,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """Returns boolean value of an environmental variable."""
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +60,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -85,12 +94,35 @@ os.environ["DJANGO_SETTINGS_MODULE"] = "configuration.settings"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DATABASE_ENGINE is "sqlite" or "postgresql". PostgreSQL connections are
+# kept open for DATABASE_CONN_MAX_AGE seconds, set DATABASE_POOLER when
+# connecting through a transaction pooler like PgBouncer. SQLite databases
+# use SQLITE_JOURNAL_MODE journal, SQLITE_SYNCHRONOUS mode and writers wait
+# up to SQLITE_BUSY_TIMEOUT milliseconds for a lock.
+DATABASE_ENGINE = os.getenv("DATABASE_ENGINE", "sqlite")
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DATABASE_NAME", "imageapi"),
+            "USER": os.getenv("DATABASE_USER", "postgres"),
+            "PASSWORD": os.getenv("DATABASE_PASSWORD", ""),
+            "HOST": os.getenv("DATABASE_HOST", "localhost"),
+            "PORT": os.getenv("DATABASE_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.getenv("DATABASE_CONN_MAX_AGE", 60)),
+            "DISABLE_SERVER_SIDE_CURSORS": env_bool("DATABASE_POOLER"),
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+        }
+    }
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
 
 
 # Password validation
@@ -138,12 +170,264 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        "api.authentication.APITokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
 }
 
 AUTH_USER_MODEL = "api.User"
 
+# Serving
+# SERVER_MODE is "dev" (runserver), "wsgi" (gunicorn with WEB_WORKERS sync
+# workers) or "asgi" (gunicorn with WEB_WORKERS uvicorn workers), see
+# docker-entrypoint.sh. With ASYNC_VIEWS enabled (default in "asgi" mode)
+# image list and expiring links are served by async views, while other views
+# run one at a time per worker in the thread kept for synchronous code.
+SERVER_MODE = os.getenv("SERVER_MODE", "dev")
+ASYNC_VIEWS = env_bool("ASYNC_VIEWS", SERVER_MODE == "asgi")
+
+# Caches
+# CACHE_BACKEND is "locmem", "file", "database" (table made by
+# createcachetable), "redis" (needs redis package) or "dummy". CACHE_LOCATION
+# is the name, directory, table or server URL of the cache.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "BACKEND": {
+            "locmem": "django.core.cache.backends.locmem.LocMemCache",
+            "file": "django.core.cache.backends.filebased.FileBasedCache",
+            "database": "django.core.cache.backends.db.DatabaseCache",
+            "redis": "api.cache_backends.RedisCache",
+            "dummy": "django.core.cache.backends.dummy.DummyCache",
+        }[CACHE_BACKEND],
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            {
+                "file": os.path.join(tempfile.gettempdir(), "imageapi-cache"),
+                "database": "cache_table",
+                "redis": "redis://localhost:6379/0",
+            }.get(CACHE_BACKEND, "imageapi"),
+        ),
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", 300)),
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "imageapi"),
+    }
+}
+
+# Image list pagination
+IMAGE_PAGE_SIZE = int(os.getenv("IMAGE_PAGE_SIZE", 50))
+IMAGE_MAX_PAGE_SIZE = int(os.getenv("IMAGE_MAX_PAGE_SIZE", 500))
+# Rendered image lists are cached in IMAGE_LIST_CACHE cache for at most
+# IMAGE_LIST_CACHE_TIMEOUT seconds, set it to an empty value to disable it.
+# The cache has to be shared by all processes, so with "locmem"
+# CACHE_BACKEND, which gunicorn workers cannot share, lists are cached by
+# default only in "dev" SERVER_MODE.
+IMAGE_LIST_CACHE = os.getenv(
+    "IMAGE_LIST_CACHE",
+    "default"
+    if CACHE_BACKEND in ("file", "database", "redis") or SERVER_MODE == "dev"
+    else "",
+)
+IMAGE_LIST_CACHE_TIMEOUT = int(os.getenv("IMAGE_LIST_CACHE_TIMEOUT", 300))
+
+# Image storage
+# "api.storage.CloudinaryStorage" or "api.storage.LocalStorage" which keeps
+# files in LOCAL_STORAGE_ROOT served at LOCAL_STORAGE_URL. When the web
+# server supports it, set LOCAL_STORAGE_SENDFILE_HEADER to "X-Sendfile" or
+# to "X-Accel-Redirect" (nginx, paths prefixed with
+# LOCAL_STORAGE_SENDFILE_PREFIX) to let it send the files.
+IMAGE_STORAGE_BACKEND = os.getenv(
+    "IMAGE_STORAGE_BACKEND", "api.storage.CloudinaryStorage"
+)
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", BASE_DIR / "media")
+LOCAL_STORAGE_URL = os.getenv(
+    "LOCAL_STORAGE_URL", "http://localhost:8000/media/"
+)
+LOCAL_STORAGE_SENDFILE_HEADER = os.getenv("LOCAL_STORAGE_SENDFILE_HEADER")
+LOCAL_STORAGE_SENDFILE_PREFIX = os.getenv(
+    "LOCAL_STORAGE_SENDFILE_PREFIX", "/protected/"
+)
+# Thumbnails of LocalStorage images are rendered on first request and kept
+# in LOCAL_STORAGE_ROOT/thumbnails, which is limited to given size.
+THUMBNAIL_CACHE_MAX_BYTES = int(
+    os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+)
+# With THUMBNAIL_PRERENDER enabled thumbnails are rendered right after
+# upload by THUMBNAIL_WORKERS processes (number of CPU cores if not set).
+THUMBNAIL_PRERENDER = env_bool("THUMBNAIL_PRERENDER", True)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 0))
+
+# Image formats
+# LocalStorage images are transcoded to WebP or AVIF (needs Pillow 11.2 or
+# pillow-avif-plugin) for clients accepting them. Quality of every
+# AccountTier.image_quality preset per format, IMAGE_DEFAULT_QUALITY is used
+# when URL has no preset. IMAGE_WEBP_METHOD (0-6) and IMAGE_AVIF_SPEED
+# (0-10) trade encoding time for size.
+IMAGE_QUALITY_PRESETS = {
+    "low": {"JPEG": 50, "WEBP": 45, "AVIF": 35},
+    "eco": {"JPEG": 65, "WEBP": 60, "AVIF": 45},
+    "good": {"JPEG": 80, "WEBP": 75, "AVIF": 60},
+    "best": {"JPEG": 92, "WEBP": 90, "AVIF": 80},
+}
+IMAGE_DEFAULT_QUALITY = os.getenv("IMAGE_DEFAULT_QUALITY", "good")
+IMAGE_WEBP_METHOD = int(os.getenv("IMAGE_WEBP_METHOD", 4))
+IMAGE_AVIF_SPEED = int(os.getenv("IMAGE_AVIF_SPEED", 6))
+
+# Batch uploads
+# At most BATCH_UPLOAD_MAX_FILES images are uploaded in one request,
+# BATCH_UPLOAD_PARALLELISM of them at once. Files extracted from a ZIP
+# archive can have at most BATCH_UPLOAD_MAX_ARCHIVE_SIZE bytes in total.
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 500))
+BATCH_UPLOAD_PARALLELISM = int(os.getenv("BATCH_UPLOAD_PARALLELISM", 8))
+BATCH_UPLOAD_MAX_ARCHIVE_SIZE = int(
+    os.getenv("BATCH_UPLOAD_MAX_ARCHIVE_SIZE", 512 * 1024 * 1024)
+)
+
+# Upload streaming
+# Uploaded files are kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE bytes
+# and spooled to FILE_UPLOAD_TEMP_DIR above it. Only image headers are read
+# during validation, images with more than IMAGE_MAX_PIXELS pixels are
+# refused. Cloudinary uploads bigger than CLOUDINARY_CHUNK_SIZE are chunked.
+FILE_UPLOAD_HANDLERS = ["api.uploads.SpooledFileUploadHandler"]
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv("FILE_UPLOAD_MAX_MEMORY_SIZE", 2621440)
+)
+FILE_UPLOAD_TEMP_DIR = os.getenv("FILE_UPLOAD_TEMP_DIR")
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 50000000))
+CLOUDINARY_CHUNK_SIZE = int(
+    os.getenv("CLOUDINARY_CHUNK_SIZE", 20 * 1024 * 1024)
+)
+# Uploads with content already stored are not uploaded again, the stored
+# file is reused. IMAGE_DEDUP_SCOPE is "owner" (only the user's own images
+# are reused), "global" (images of all users) or "none".
+IMAGE_DEDUP_SCOPE = os.getenv("IMAGE_DEDUP_SCOPE", "owner")
+
+# API tokens
+# Tokens made by issue_api_token command are valid for API_TOKEN_MAX_AGE
+# seconds. Ids, usernames, tiers and password fingerprints of users they
+# authenticate are cached in-process
+# (API_TOKEN_PRINCIPAL_CACHE_SIZE entries, for API_TOKEN_PRINCIPAL_LOCAL_TTL
+# seconds) and, if set, in the API_TOKEN_PRINCIPAL_CACHE cache for
+# API_TOKEN_PRINCIPAL_TIMEOUT seconds.
+API_TOKEN_MAX_AGE = int(os.getenv("API_TOKEN_MAX_AGE", 30 * 24 * 3600))
+API_TOKEN_PRINCIPAL_CACHE = os.getenv("API_TOKEN_PRINCIPAL_CACHE", "default")
+API_TOKEN_PRINCIPAL_CACHE_SIZE = int(
+    os.getenv("API_TOKEN_PRINCIPAL_CACHE_SIZE", 10000)
+)
+API_TOKEN_PRINCIPAL_LOCAL_TTL = int(
+    os.getenv("API_TOKEN_PRINCIPAL_LOCAL_TTL", 30)
+)
+API_TOKEN_PRINCIPAL_TIMEOUT = int(
+    os.getenv("API_TOKEN_PRINCIPAL_TIMEOUT", 300)
+)
+
+# Throttling
+# Request rate, concurrent uploads and daily upload quota limits of account
+# tiers are counted in THROTTLE_CACHE cache, which should be shared by all
+# processes and have atomic incr() (locmem in one process, redis), or
+# in-process when it is empty. Outside of "dev" SERVER_MODE a warning is
+# logged at startup when the counters are not kept in a redis cache, as
+# each worker then allows the whole limit. Rejected uploads are retried after
+# THROTTLE_UPLOAD_RETRY_AFTER seconds, upload slots of crashed requests are
+# freed after THROTTLE_UPLOAD_SLOT_TIMEOUT seconds.
+THROTTLE_CACHE = os.getenv("THROTTLE_CACHE", "default")
+THROTTLE_UPLOAD_RETRY_AFTER = int(os.getenv("THROTTLE_UPLOAD_RETRY_AFTER", 5))
+THROTTLE_UPLOAD_SLOT_TIMEOUT = int(
+    os.getenv("THROTTLE_UPLOAD_SLOT_TIMEOUT", 3600)
+)
+
+# Account tiers
+# Tier permissions and thumbnail sizes are cached in TIER_CACHE cache (for
+# TIER_CACHE_TIMEOUT seconds) and in-process for TIER_CACHE_LOCAL_TTL
+# seconds, which limits how long other processes can use edited tiers. A
+# locmem TIER_CACHE is not shared by processes, so its entries are kept only
+# for TIER_CACHE_LOCAL_TTL seconds too.
+TIER_CACHE = os.getenv("TIER_CACHE", "default")
+TIER_CACHE_LOCAL_TTL = int(os.getenv("TIER_CACHE_LOCAL_TTL", 60))
+TIER_CACHE_TIMEOUT = int(os.getenv("TIER_CACHE_TIMEOUT", 3600))
+
+# Expiring links
+# With EXPIRING_LINK_MODE set to "signed" users get links signed with
+# SECRET_KEY which are validated without database queries. Deleted links
+# are revoked in SIGNED_LINK_REVOCATION_CACHE cache, if it is set.
+EXPIRING_LINK_MODE = os.getenv("EXPIRING_LINK_MODE", "database")
+SIGNED_LINK_REVOCATION_CACHE = os.getenv("SIGNED_LINK_REVOCATION_CACHE")
+# Resolved links are cached in-process (EXPIRING_LINK_CACHE_SIZE entries, for
+# at most EXPIRING_LINK_CACHE_LOCAL_TTL seconds) and, if set, in the
+# EXPIRING_LINK_SHARED_CACHE cache. Expired and missing links are cached for
+# EXPIRING_LINK_NEGATIVE_TTL seconds.
+EXPIRING_LINK_CACHE_SIZE = int(os.getenv("EXPIRING_LINK_CACHE_SIZE", 10000))
+EXPIRING_LINK_CACHE_LOCAL_TTL = int(
+    os.getenv("EXPIRING_LINK_CACHE_LOCAL_TTL", 300)
+)
+EXPIRING_LINK_NEGATIVE_TTL = int(os.getenv("EXPIRING_LINK_NEGATIVE_TTL", 300))
+EXPIRING_LINK_SHARED_CACHE = os.getenv("EXPIRING_LINK_SHARED_CACHE")
+# Links expired for more than EXPIRED_LINK_RETENTION seconds are deleted by
+# purge_expired_links command and, if EXPIRED_LINK_PURGE_INTERVAL is set, by
+# the web process every EXPIRED_LINK_PURGE_INTERVAL seconds.
+EXPIRED_LINK_RETENTION = int(os.getenv("EXPIRED_LINK_RETENTION", 86400))
+EXPIRED_LINK_PURGE_BATCH_SIZE = int(
+    os.getenv("EXPIRED_LINK_PURGE_BATCH_SIZE", 1000)
+)
+EXPIRED_LINK_PURGE_INTERVAL = int(os.getenv("EXPIRED_LINK_PURGE_INTERVAL", 0))
+
+# Uploads
+# With UPLOAD_ASYNC enabled images are stored in UPLOAD_SPOOL_DIR and
+# uploaded by a pool of UPLOAD_WORKERS background threads. Images pending
+# for more than UPLOAD_STALE_AFTER seconds, whose uploads were lost with a
+# restarted process, are marked failed by fail_stale_uploads command.
+UPLOAD_ASYNC = env_bool("UPLOAD_ASYNC")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+UPLOAD_MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", 64))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", 3))
+UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", 1.0))
+UPLOAD_SPOOL_DIR = os.getenv(
+    "UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "imageapi-spool")
+)
+UPLOAD_STALE_AFTER = int(os.getenv("UPLOAD_STALE_AFTER", 3600))
+
+# Image deletion
+# Deleted images' files are queued and removed from storage in batches of
+# STORAGE_CLEANUP_BATCH_SIZE by delete_stored_files command and, with
+# STORAGE_CLEANUP_WORKER enabled, by the web process right after deletion
+# and every STORAGE_CLEANUP_INTERVAL seconds. Failed deletions are retried
+# STORAGE_CLEANUP_RETRIES times, after STORAGE_CLEANUP_RETRY_BACKOFF seconds
+# doubled on every attempt. At most BATCH_DELETE_MAX_IMAGES images are
+# deleted in one request.
+STORAGE_CLEANUP_WORKER = env_bool("STORAGE_CLEANUP_WORKER", True)
+STORAGE_CLEANUP_BATCH_SIZE = int(os.getenv("STORAGE_CLEANUP_BATCH_SIZE", 100))
+STORAGE_CLEANUP_INTERVAL = int(os.getenv("STORAGE_CLEANUP_INTERVAL", 60))
+STORAGE_CLEANUP_RETRIES = int(os.getenv("STORAGE_CLEANUP_RETRIES", 5))
+STORAGE_CLEANUP_RETRY_BACKOFF = int(
+    os.getenv("STORAGE_CLEANUP_RETRY_BACKOFF", 30)
+)
+BATCH_DELETE_MAX_IMAGES = int(os.getenv("BATCH_DELETE_MAX_IMAGES", 1000))
+
+# Admin
+# Admin changelists count at most ADMIN_COUNT_LIMIT objects, bigger tables
+# show estimated counts. Searches match owners among the first
+# ADMIN_SEARCH_MAX_OWNERS users with the username prefix. Background admin
+# actions process ADMIN_ACTION_BATCH_SIZE objects per statement.
+ADMIN_COUNT_LIMIT = int(os.getenv("ADMIN_COUNT_LIMIT", 10000))
+ADMIN_SEARCH_MAX_OWNERS = int(os.getenv("ADMIN_SEARCH_MAX_OWNERS", 100))
+ADMIN_ACTION_BATCH_SIZE = int(os.getenv("ADMIN_ACTION_BATCH_SIZE", 1000))
+
+# Metrics
+# With METRICS_ENABLED every request's latency, database queries, storage
+# uploads, image validation and serialization are measured and exposed at
+# /metrics in Prometheus text format (per process), for requests with
+# "Authorization: Bearer <METRICS_TOKEN>" if it is set.
+# METRICS_SERVER_TIMING adds the measurements to Server-Timing header.
+METRICS_ENABLED = env_bool("METRICS_ENABLED")
+METRICS_SERVER_TIMING = env_bool("METRICS_SERVER_TIMING")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_LATENCY_BUCKETS = tuple(
+    float(bucket)
+    for bucket in os.getenv(
+        "METRICS_LATENCY_BUCKETS",
+        "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10",
+    ).split(",")
+)
+
 cloudinary.config(
     cloud_name=os.getenv("CLOUD_NAME"),
     api_key=os.getenv("API_KEY"),
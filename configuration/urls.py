@@ -16,8 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import serve_media, serve_metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    path("media/upload/<path:key>", serve_media, name="media"),
+    path("metrics", serve_metrics, name="metrics"),
     path("", include("rest_framework.urls")),
 ]
@@ -2,5 +2,26 @@
 python manage.py makemigrations --noinput
 python manage.py migrate
 python manage.py createcachetable
+python manage.py fail_stale_uploads
 python manage.py shell < "utils/create_superuser.py"
-python manage.py runserver 0.0.0.0:8000
+
+# SERVER_MODE: "dev" (runserver), "wsgi" or "asgi" (gunicorn with
+# WEB_WORKERS sync or uvicorn workers).
+case "${SERVER_MODE:-dev}" in
+    wsgi)
+        exec gunicorn configuration.wsgi:application \
+            --bind 0.0.0.0:8000 \
+            --workers "${WEB_WORKERS:-4}" \
+            --timeout "${WEB_TIMEOUT:-60}"
+        ;;
+    asgi)
+        exec gunicorn configuration.asgi:application \
+            --worker-class uvicorn.workers.UvicornWorker \
+            --bind 0.0.0.0:8000 \
+            --workers "${WEB_WORKERS:-4}" \
+            --timeout "${WEB_TIMEOUT:-60}"
+        ;;
+    *)
+        exec python manage.py runserver 0.0.0.0:8000
+        ;;
+esac
@@ -0,0 +1,180 @@
+"""
+Load test comparing serving modes of the API.
+
+Starts the application with runserver ("dev"), gunicorn with sync workers
+("wsgi") and gunicorn with uvicorn workers and async views ("asgi"), then
+sends concurrent requests to the image list and to an expiring link and
+prints requests per second and latency percentiles of every mode.
+
+Usage:
+    python utils/loadtest.py --duration 10 --concurrency 32 --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "configuration.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.benchmarking import summarize  # noqa: E402
+
+SEED = """
+import json
+from django.contrib.sessions.backends.db import SessionStore
+from api.models import AccountTier, ExpiringLink, Image, Thumbnail, User
+
+tier, _ = AccountTier.objects.get_or_create(
+    name="Load test", defaults={"original_size": True, "fetch_url": True}
+)
+for size in (200, 400):
+    tier.thumbnail_sizes.add(Thumbnail.objects.get_or_create(size=size)[0])
+user, _ = User.objects.get_or_create(
+    username="loadtest", defaults={"accountTier": tier}
+)
+url = "http://res.cloudinary.com/demo/image/upload/loadtest/{}.png"
+for index in range(%(images)d):
+    image, _ = Image.objects.get_or_create(
+        name=f"loadtest{index}",
+        defaults={"owner": user, "url": url.format(index)},
+    )
+link = ExpiringLink.objects.create(
+    image=image, url=image.url, expiration_time=30000
+)
+session = SessionStore()
+session["_auth_user_id"] = str(user.pk)
+session["_auth_user_backend"] = "django.contrib.auth.backends.ModelBackend"
+session["_auth_user_hash"] = user.get_session_auth_hash()
+session.create()
+print(json.dumps({"session": session.session_key, "link": link.pk}))
+"""
+
+
+def server_command(mode: str, port: int, workers: int) -> list:
+    """Returns command starting the server in given mode."""
+    bind = f"127.0.0.1:{port}"
+    if mode == "dev":
+        return [sys.executable, "manage.py", "runserver", bind, "--noreload"]
+    command = [sys.executable, "-m", "gunicorn", "--bind", bind]
+    command += ["--workers", str(workers)]
+    if mode == "asgi":
+        command += ["--worker-class", "uvicorn.workers.UvicornWorker"]
+        return command + ["configuration.asgi:application"]
+    return command + ["configuration.wsgi:application"]
+
+
+def fetch(url: str, session: str) -> int:
+    """Sends GET request, returns response status."""
+    request = urllib.request.Request(url)
+    request.add_header("Cookie", f"sessionid={session}")
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def wait_until_ready(url: str, session: str, timeout: float = 30) -> None:
+    """Polls url until the server responds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            fetch(url, session)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start: {url}")
+
+
+def load(url: str, session: str, duration: float, concurrency: int) -> dict:
+    """Sends requests from concurrent threads for duration seconds."""
+    samples, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker() -> None:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status = fetch(url, session)
+            except OSError as error:
+                status = str(error)
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append(elapsed)
+                if status != 200:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(samples, time.perf_counter() - started)
+    result["errors"] = len(errors)
+    return result
+
+
+def main() -> None:
+    """Runs load test of every requested serving mode."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", nargs="+", default=["dev", "wsgi", "asgi"])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    seed = subprocess.run(
+        [sys.executable, "manage.py", "shell", "-c", SEED % vars(args)],
+        cwd=BASE_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    data = json.loads(seed.stdout.strip().splitlines()[-1])
+    base_url = f"http://127.0.0.1:{args.port}"
+    endpoints = {
+        "image_list": f"{base_url}/api/image/",
+        "expiring_link": f"{base_url}/api/expiringlink/{data['link']}/",
+    }
+    results = {}
+    for mode in args.modes:
+        env = dict(os.environ, SERVER_MODE=mode)
+        server = subprocess.Popen(
+            server_command(mode, args.port, args.workers),
+            cwd=BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(endpoints["expiring_link"], data["session"])
+            results[mode] = {
+                name: load(
+                    url, data["session"], args.duration, args.concurrency
+                )
+                for name, url in endpoints.items()
+            }
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()